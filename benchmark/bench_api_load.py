@@ -0,0 +1,261 @@
+# нагрузочный прогон API: приложение в процессе через httpx, засеянная sqlite-база, геокодер-заглушка
+# по gazetteer.csv вместо nominatim. Запросы заранее генерируются из --seed по смеси --mix и
+# раздаются --concurrency клиентам; на выходе JSON с req/s и p50/p95/p99 по каждому маршруту —
+# его удобно сравнивать между коммитами
+#   python benchmark/bench_api_load.py [--rows 100000] [--requests 3000] [--concurrency 32] [--mix browse]
+#                                      [--seed 1] [--output report.json]
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERS = 1000
+FAVOURITES_PER_USER = 20
+CITIES = ("Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург")
+
+# доли запросов по видам
+MIXES = {
+    "browse": {"listing": 30, "search": 30, "user_listing": 10, "favourites": 10, "predict": 10, "user": 10},
+    "search": {"search": 60, "listing": 15, "predict": 15, "favourites": 10},
+    "write": {"listing": 25, "search": 25, "create_estate": 15, "add_favourite": 15, "favourites": 10, "user": 10}
+}
+
+
+class StubGeocoder:
+
+    def __init__(self, path=os.path.join(ROOT, "gazetteer.csv"), delay=0.0):
+        from geo_cache import normalize_city
+
+        self.normalize = normalize_city
+        self.delay = delay
+        with open(path, encoding="utf-8", newline="") as gazetteer:
+            self.cities = {
+                normalize_city(row["city"]): (float(row["latitude"]), float(row["longitude"]))
+                for row in csv.DictReader(gazetteer)
+            }
+
+    async def geocode(self, city):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.cities.get(self.normalize(city))
+
+    async def close(self):
+        pass
+
+
+def seed_favourites(path, rows, users, per_user, rng):
+    from database_config import Favourites
+
+    engine = create_engine(f"sqlite:///{path}")
+    Favourites.__table__.create(engine, checkfirst=True)
+    favourites = {
+        (user_id, estate_id)
+        for user_id in range(1, users + 1)
+        for estate_id in rng.sample(range(1, rows + 1), min(per_user, rows))
+    }
+    with engine.begin() as connection:
+        connection.execute(insert(Favourites.__table__), [
+            {"user_id": user_id, "estate_id": estate_id} for user_id, estate_id in sorted(favourites)
+        ])
+    return favourites
+
+
+def where_body(rng):
+    rooms_from = rng.randint(1, 3)
+    price_from = rng.choice((1, 2, 3, 5))
+    return {
+        "city": rng.choice(CITIES), "priceFrom": str(price_from * 1000000),
+        "priceTo": str(price_from * 1000000 * rng.choice((2, 3))), "totalAreaFrom": "", "totalAreaTo": "",
+        "kitchenAreaFrom": "", "kitchenAreaTo": "", "levelsFrom": "", "levelsTo": "", "levelFrom": "",
+        "levelTo": "", "numberOfRoomsFrom": rooms_from, "numberOfRoomsTo": rooms_from + rng.randint(0, 2),
+        "houseType": rng.choice((-1, 1, 2)), "objectType": rng.choice((-1, 1))
+    }
+
+
+def predict_body(rng):
+    rooms = rng.randint(1, 4)
+    return {
+        "city": rng.choice(CITIES), "houseType": rng.randint(0, 5), "objectType": rng.choice((1, 11)),
+        "totalAreaFrom": str(rng.choice((30, 45, 60, 80))), "totalAreaTo": "", "kitchenAreaFrom": "",
+        "kitchenAreaTo": "", "levelFrom": "", "levelTo": "", "levelsFrom": "", "levelsTo": "",
+        "numberOfRoomsFrom": str(rooms), "numberOfRoomsTo": str(rooms)
+    }
+
+
+def estate_body(rng, mail):
+    return {
+        "price": rng.randint(2, 30) * 500000, "city": rng.choice(CITIES), "year": 2023, "month": rng.randint(1, 12),
+        "day": rng.randint(1, 28), "time": "12:00:00", "user_mail": mail, "houseType": rng.randint(0, 5),
+        "objectType": rng.choice((1, 11)), "levels": 9, "level": rng.randint(1, 9),
+        "numberOfRooms": rng.randint(1, 4), "totalArea": rng.randint(25, 120), "kitchenArea": rng.randint(5, 20)
+    }
+
+
+# новая закладка: пара (user_id, estate_id), которой нет ни в засеянных, ни в уже выданных —
+# повтор упал бы на первичном ключе; user{i}@mail.ru — это user_id i + 1, как в seed бенчмарка
+def new_favourite(rng, rows, taken):
+    while True:
+        user, estate_id = rng.randrange(USERS), rng.randint(1, rows)
+        if (user + 1, estate_id) not in taken:
+            taken.add((user + 1, estate_id))
+            return f"user{user}@mail.ru", estate_id
+
+
+# (вид, метод, путь, параметры, тело)
+def make_request(kind, rng, rows, taken):
+    mail = f"user{rng.randrange(USERS)}@mail.ru"
+    limit = rng.choice((10, 20, 50))
+
+    if kind == "listing":
+        offset = rng.choice((0, 0, 0, rng.randrange(0, 2000)))
+        return "GET", "/api/estate/all", {"limit": limit, "offset": offset}, None
+    if kind == "search":
+        return "POST", "/api/estate/where", {"limit": limit}, where_body(rng)
+    if kind == "user_listing":
+        return "GET", "/api/estate/user", {"mail": mail, "limit": limit}, None
+    if kind == "favourites":
+        return "GET", "/api/favourites", {"mail": mail, "limit": limit}, None
+    if kind == "predict":
+        return "POST", "/api/prediction", None, predict_body(rng)
+    if kind == "user":
+        return "GET", f"/api/users/{mail}", None, None
+    if kind == "create_estate":
+        return "POST", "/api/estate/user", None, estate_body(rng, mail)
+    if kind == "add_favourite":
+        mail, estate_id = new_favourite(rng, rows, taken)
+        return "POST", "/api/favourites", {"user_mail": mail, "estate_id": estate_id}, None
+    raise ValueError(kind)
+
+
+# taken — занятые пары закладок, пополняется выданными add_favourite
+def make_requests(mix, count, rows, seed, taken):
+    rng = random.Random(seed)
+    kinds, weights = zip(*sorted(MIXES[mix].items()))
+    return [(kind, *make_request(kind, rng, rows, taken)) for kind in rng.choices(kinds, weights, k=count)]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summary(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "errors": sum(count for code, count in statuses.items() if int(code) >= 500),
+        "statuses": dict(sorted(statuses.items())),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2)
+    }
+
+
+async def drive(client, requests, concurrency):
+    queue = iter(requests)
+    results = {}
+
+    async def worker():
+        for kind, method, path, params, body in queue:
+            started = time.perf_counter()
+            # исключение из приложения прошло бы сквозь httpx и оборвало прогон — считаем его как 500
+            try:
+                status = str((await client.request(method, path, params=params, json=body)).status_code)
+            except Exception:
+                status = "500"
+            latency = time.perf_counter() - started
+
+            latencies, statuses = results.setdefault(kind, ([], {}))
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--geocode-delay-ms", type=float, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.setdefault("REST_LOG_PATH", os.path.join(directory, "rest.log"))
+
+    from benchmark.bench_async_db import prepare
+
+    prepare(args.rows)
+    taken = seed_favourites(
+        os.environ["DATABASE_URL"][len("sqlite:///"):], args.rows, USERS, FAVOURITES_PER_USER, random.Random(args.seed)
+    )
+
+    import httpx
+    import diplom_server
+
+    diplom_server.geocoder = StubGeocoder(delay=args.geocode_delay_ms / 1000)
+    await diplom_server.app.router.startup()
+
+    client = httpx.AsyncClient(app=diplom_server.app, base_url="http://bench", timeout=None)
+    await drive(client, make_requests(args.mix, args.warmup, args.rows, args.seed + 1, taken), args.concurrency)
+    results, elapsed = await drive(
+        client, make_requests(args.mix, args.requests, args.rows, args.seed, taken), args.concurrency
+    )
+    await client.aclose()
+    await diplom_server.app.router.shutdown()
+
+    all_latencies = [latency for latencies, _ in results.values() for latency in latencies]
+    all_statuses = {}
+    for _, statuses in results.values():
+        for code, count in statuses.items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "rows": args.rows, "requests": args.requests, "concurrency": args.concurrency, "mix": args.mix,
+            "seed": args.seed, "geocode_delay_ms": args.geocode_delay_ms,
+            "search_engine": diplom_server.ESTATE_SEARCH_ENGINE
+        },
+        "total": summary(all_latencies, all_statuses, elapsed),
+        "endpoints": {
+            kind: summary(latencies, statuses, elapsed) for kind, (latencies, statuses) in sorted(results.items())
+        }
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
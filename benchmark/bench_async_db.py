@@ -0,0 +1,151 @@
+# нагрузка на обработчики с базой: засеянная sqlite-база, приложение в процессе через httpx,
+# запросы пачками по concurrency штук. Рядом те же SELECT страницы и COUNT(*) через синхронную
+# Session прямо в корутине (как было до AsyncSession) и через AsyncSession — видно, что
+# синхронные вызовы выстраивают цикл событий в очередь, а асинхронные — нет.
+# sqlite работает внутри процесса, поэтому сетевую задержку до MySQL изображает лишний
+# SELECT bench_latency(ms): функция спит в потоке драйвера, как спал бы сетевой вызов
+#   python benchmark/bench_async_db.py [--rows 200000] [--requests 256] [--concurrency 1,4,16,64] [--latency-ms 20]
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import MetaData, create_engine, event, func, select, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USER_MAIL = "user7@mail.ru"
+
+
+def prepare(rows):
+    path = os.path.join(tempfile.mkdtemp(), "bench_async.db")
+
+    # приложение читает адрес базы из окружения при импорте database_config
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+
+    from benchmark.bench_listing_index import old_schema, seed
+    from migrations import add_geo_cell, add_listed_at
+
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA journal_mode=WAL"))
+
+    metadata = MetaData()
+    table = old_schema(metadata)
+    metadata.create_all(engine)
+    seed(engine, table, rows)
+
+    add_listed_at.migrate(bind=engine, log=lambda message: None)
+    add_geo_cell.migrate(bind=engine, log=lambda message: None)
+
+
+def sleep_ms(milliseconds):
+    time.sleep(milliseconds / 1000)
+    return milliseconds
+
+
+def register_latency(engine):
+    event.listen(engine, "connect", lambda connection, _: connection.create_function("bench_latency", 1, sleep_ms))
+
+
+# насколько опаздывает asyncio.sleep(interval): все, что дольше, цикл был чем-то занят
+async def loop_lag(stop, interval=0.001):
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+async def run(call, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+
+    latencies.sort()
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 2)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    prepare(args.rows)
+
+    import httpx
+    import diplom_server
+    from database_config import AsyncSessionLocal, Estate, SessionLocal, async_engine, engine
+
+    register_latency(engine)
+    register_latency(async_engine.sync_engine)
+    round_trip = text("SELECT bench_latency(:ms)").bindparams(ms=args.latency_ms)
+
+    page = select(Estate).where(Estate.rooms >= 2).order_by(Estate.listed_at, Estate.estate_id).limit(50)
+    count = select(func.count()).select_from(Estate).where(Estate.rooms >= 2)
+
+    async def blocking_session(i):
+        with SessionLocal() as session:
+            session.execute(round_trip)
+            session.execute(page).scalars().all()
+            session.execute(count).scalar()
+
+    async def async_session(i):
+        async with AsyncSessionLocal() as session:
+            await session.execute(round_trip)
+            (await session.execute(page)).scalars().all()
+            await session.scalar(count)
+
+    client = httpx.AsyncClient(app=diplom_server.app, base_url="http://bench")
+
+    async def app_requests(i):
+        if i % 3 == 0:
+            response = await client.get("/api/estate/all", params={"limit": 50, "count": "exact"})
+        elif i % 3 == 1:
+            response = await client.get("/api/estate/user", params={"mail": USER_MAIL, "limit": 50})
+        else:
+            response = await client.get(f"/api/users/{USER_MAIL}")
+        response.raise_for_status()
+
+    report = {"rows": args.rows, "requests": args.requests, "latency_ms": args.latency_ms}
+    for name, call in (("sync_session_in_loop", blocking_session), ("async_session", async_session),
+                       ("app", app_requests)):
+        await call(0)
+        report[name] = {
+            str(concurrency): await run(call, args.requests, concurrency)
+            for concurrency in map(int, args.concurrency.split(","))
+        }
+
+    await client.aclose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
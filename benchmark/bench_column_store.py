@@ -0,0 +1,117 @@
+# /api/estate/where на засеянной sqlite-базе: фильтры и total в SQL против EstateColumnStore,
+# который считает маски по колонкам numpy и достает из базы только строки страницы
+#   python benchmark/bench_column_store.py [--rows 800000] [--db bench_columns.db]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import MetaData, create_engine, event, func, select
+from sqlalchemy.orm import Session
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark.bench_listing_index import old_schema, seed
+from database_config import Estate, EstateFomTo
+from estate_columns import EstateColumnStore
+from estate_paging import ESTATE_ORDER
+from geo_index import radius_filters
+from migrations import add_geo_cell, add_listed_at
+
+PAGE_SIZE = 50
+RADIUS_KM = 45.0
+
+
+def conditions(**values):
+    names = (
+        "latitude", "longitude", "building_type", "object_type", "price_from", "price_to", "level_from", "level_to",
+        "levels_from", "levels_to", "rooms_from", "rooms_to", "area_from", "area_to",
+        "kitchen_area_from", "kitchen_area_to"
+    )
+    return EstateFomTo(*[values.get(name) for name in names])
+
+
+# те же условия, что строит EstateAPI.filter_query
+CASES = {
+    "no_filters": (conditions(), []),
+    "price_rooms": (
+        conditions(price_from=3.0, price_to=6.0, rooms_from=2, rooms_to=3),
+        [Estate.price >= 3.0, Estate.price <= 6.0, Estate.rooms >= 2, Estate.rooms <= 3]
+    ),
+    "type_area_levels": (
+        conditions(object_type=1, building_type=2, area_from=40.0, area_to=80.0, levels_from=5),
+        [Estate.object_type == 1, Estate.building_type == 2, Estate.area >= 40.0, Estate.area <= 80.0,
+         Estate.levels >= 5]
+    ),
+    "moscow_radius_rooms": (
+        conditions(latitude=55.75, longitude=37.62, rooms_from=1, rooms_to=2, kitchen_area_from=8.0),
+        [Estate.rooms >= 1, Estate.rooms <= 2, Estate.kitchen_area >= 8.0] + radius_filters(55.75, 37.62, RADIUS_KM)
+    )
+}
+
+
+def sql_page(session, filters):
+    items = session.execute(select(Estate).where(*filters).order_by(*ESTATE_ORDER).limit(PAGE_SIZE)).scalars().all()
+    total = session.execute(select(func.count()).select_from(Estate).where(*filters)).scalar()
+    return [estate.estate_id for estate in items], total
+
+
+def memory_page(session, store, estate_from_to):
+    estate_ids, total = store.search(estate_from_to, RADIUS_KM, limit=PAGE_SIZE)
+    rows = {estate.estate_id: estate for estate in session.query(Estate).filter(Estate.estate_id.in_(estate_ids))}
+    return [rows[estate_id].estate_id for estate_id in estate_ids], total
+
+
+def measure(page, rounds):
+    page()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        page()
+    return round((time.perf_counter() - started) / rounds * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=800_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_columns.db")
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA journal_mode=WAL"))
+
+    metadata = MetaData()
+    table = old_schema(metadata)
+    metadata.create_all(engine)
+    seed(engine, table, args.rows)
+    add_listed_at.migrate(bind=engine, log=lambda message: None)
+    add_geo_cell.migrate(bind=engine, log=lambda message: None)
+
+    store = EstateColumnStore(engine, refresh_interval=float("inf"))
+    started = time.perf_counter()
+    store.load()
+    load_seconds = time.perf_counter() - started
+
+    sql_ms, memory_ms, same_pages = {}, {}, {}
+    with Session(engine) as session:
+        for name, (estate_from_to, filters) in CASES.items():
+            same_pages[name] = sql_page(session, filters) == memory_page(session, store, estate_from_to)
+            sql_ms[name] = measure(lambda: sql_page(session, filters), args.rounds)
+            memory_ms[name] = measure(lambda: memory_page(session, store, estate_from_to), args.rounds)
+
+    print(json.dumps({
+        "rows": args.rows,
+        "load_s": round(load_seconds, 2),
+        "store": store.stats(),
+        "same_pages": same_pages,
+        "sql_ms": sql_ms,
+        "memory_ms": memory_ms
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# /api/estate/facets на засеянной sqlite-базе: query_facets (один сгруппированный проход и выборка медианы)
+# против прежнего варианта из пяти выборок — агрегат, медиана и GROUP BY на каждый счетчик,
+# каждая из которых заново проходит отфильтрованные строки
+#   python benchmark/bench_facets.py [--rows 300000] [--rounds 5] [--db bench_facets.db]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import case, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark.generate_dataset import DatabaseWriter, generate
+from database_config import Estate
+from estate_facets import AREA_BUCKETS, COUNTED_COLUMNS, FACET_COLUMNS, PRICE_BUCKETS, bucket_condition, query_facets
+
+CASES = {
+    "no_filters": [],
+    "price_rooms": [Estate.price >= 3.0, Estate.price <= 6.0, Estate.rooms >= 2, Estate.rooms <= 3],
+    "type_area": [Estate.object_type == 1, Estate.area >= 40.0, Estate.area <= 80.0]
+}
+
+
+async def separate_queries(session, statement):
+    rows = statement.with_only_columns(*[getattr(Estate, name) for name in FACET_COLUMNS]).order_by(None).subquery()
+    price, area = rows.c.price, rows.c.area
+
+    aggregates = (await session.execute(select(
+        func.count(),
+        func.count(price),
+        func.min(price),
+        func.max(price),
+        *[func.sum(case((bucket_condition(price, PRICE_BUCKETS, i), 1), else_=0)) for i in range(len(PRICE_BUCKETS))],
+        *[func.sum(case((bucket_condition(area, AREA_BUCKETS, i), 1), else_=0)) for i in range(len(AREA_BUCKETS))]
+    ))).one()
+    priced = aggregates[1]
+    if priced:
+        await session.execute(
+            select(price).where(price.isnot(None)).order_by(price).offset((priced - 1) // 2).limit(2 - priced % 2)
+        )
+    for name in COUNTED_COLUMNS:
+        column = rows.c[name]
+        await session.execute(select(column, func.count()).where(column.isnot(None)).group_by(column))
+
+
+async def measure(engine, facets, filters, rounds):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    async with AsyncSession(engine) as session:
+        statement = select(Estate).where(*filters)
+        await facets(session, statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await facets(session, statement)
+        elapsed = time.perf_counter() - started
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    return {"ms": round(elapsed / rounds * 1000, 2), "queries": len(statements) // rounds}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_facets.db")
+    if not os.path.exists(path):
+        generate(DatabaseWriter(f"sqlite:///{path}"), 1000, args.rows, 0, seed=1, log=lambda message: None)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    report = {}
+    for name, filters in CASES.items():
+        report[name] = {
+            "one_pass": await measure(engine, query_facets, filters, args.rounds),
+            "separate_queries": await measure(engine, separate_queries, filters, args.rounds)
+        }
+    await engine.dispose()
+
+    print(json.dumps({"rows": args.rows, "cases": report}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
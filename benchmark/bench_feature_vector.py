@@ -0,0 +1,61 @@
+# стоимость сборки признаков одного запроса /api/prediction:
+# старый путь через два pd.DataFrame против FeatureSchema
+#   python benchmark/bench_feature_vector.py [--rounds 20000]
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from feature_vector import DEFAULT_FEATURE_NAMES, INTEGER_FEATURES, FeatureSchema
+
+ROW_FROM = {
+    "latitude": 55.7504461, "longitude": 37.6174943, "region": 4355.334007490706,
+    "building_type": 3, "level": 6.189537216596486, "levels": 11.371798225728519,
+    "rooms": 1, "area": 30, "kitchen_area": 10.462786904018218, "object_type": 0.7055776250755261,
+    "year": 2019.3724843617772, "month": 6.628343097815816, "day": 16.179484811442926
+}
+ROW_TO = dict(ROW_FROM, rooms=3, area=90)
+
+
+def pandas_features():
+    import pandas as pd
+
+    frames = []
+    for row in (ROW_FROM, ROW_TO):
+        frames.append(pd.DataFrame(
+            np.array(
+                [[int(row[name])] if name in INTEGER_FEATURES else [float(row[name])]
+                 for name in DEFAULT_FEATURE_NAMES]
+            ).transpose(),
+            columns=list(DEFAULT_FEATURE_NAMES)
+        ))
+    return np.concatenate([frame.values for frame in frames])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    schema = FeatureSchema()
+    assert np.array_equal(schema.build([ROW_FROM, ROW_TO]), pandas_features().astype(np.float32))
+
+    report = {
+        "pandas_us": timeit.timeit(pandas_features, number=args.rounds) / args.rounds * 1_000_000,
+        "feature_schema_us": timeit.timeit(
+            lambda: schema.build([ROW_FROM, ROW_TO]), number=args.rounds
+        ) / args.rounds * 1_000_000
+    }
+    report["saved_us"] = report["pandas_us"] - report["feature_schema_us"]
+
+    print(json.dumps({key: round(value, 2) for key, value in report.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# выдача объявлений до и после migrations/add_listed_at.py на засеянной sqlite-базе:
+# сортировка по year, month, day, time без индексов против listed_at с составными индексами
+#   python benchmark/bench_listing_index.py [--rows 1000000] [--db bench_listing.db]
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import time as day_time
+
+from sqlalchemy import Column, MetaData, Table, and_, create_engine, event, insert, select
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database_config import Estate, User
+from migrations.add_listed_at import migrate
+
+OLD_ORDER = ("year", "month", "day", "time", "estate_id")
+NEW_ORDER = ("listed_at", "estate_id")
+
+
+def old_schema(metadata):
+    User.__table__.to_metadata(metadata)
+    return Table(
+        Estate.__tablename__,
+        metadata,
+        *[
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in Estate.__table__.columns if column.name not in ("listed_at", "geo_cell")
+        ]
+    )
+
+
+def seed(engine, table, rows, users=1000, chunk=50000):
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), [{"user_mail": f"user{i}@mail.ru"} for i in range(users)])
+
+    for start in range(0, rows, chunk):
+        batch = []
+        for _ in range(min(chunk, rows - start)):
+            latitude, longitude = rng.choice(((55.75, 37.62), (59.94, 30.32), (55.03, 82.92), (56.84, 60.61)))
+            batch.append({
+                "price": round(rng.lognormvariate(1.3, 0.6), 2),
+                "year": rng.randint(2018, 2021),
+                "month": rng.randint(1, 12),
+                "day": rng.randint(1, 28),
+                "time": day_time(rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59)),
+                "latitude": latitude + rng.gauss(0, 0.2),
+                "longitude": longitude + rng.gauss(0, 0.3),
+                "region": rng.randint(1, 10000),
+                "building_type": rng.randint(0, 5),
+                "level": rng.randint(1, 25),
+                "levels": rng.randint(1, 30),
+                "rooms": rng.randint(-1, 5),
+                "area": round(rng.uniform(15, 150), 1),
+                "kitchen_area": round(rng.uniform(3, 30), 1),
+                "object_type": rng.choice((1, 11)),
+                "user_id": rng.randint(1, users)
+            })
+        with engine.begin() as connection:
+            connection.execute(insert(table), batch)
+
+
+def listing_queries(table, order):
+    order_by = [table.c[name] for name in order]
+    return {
+        "all_first_page": select(table).order_by(*order_by).limit(50),
+        "all_offset_10000": select(table).order_by(*order_by).limit(50).offset(10000),
+        "where_type_rooms_geo": select(table).where(and_(
+            table.c.object_type == 1,
+            table.c.building_type == 2,
+            table.c.rooms.between(2, 3),
+            table.c.latitude.between(55.35, 56.15),
+            table.c.longitude.between(37.22, 38.02)
+        )).order_by(*order_by).limit(50),
+        "user_first_page": select(table).where(table.c.user_id == 7).order_by(*order_by).limit(50)
+    }
+
+
+def measure(engine, queries, rounds):
+    timings = {}
+    with engine.connect() as connection:
+        for name, query in queries.items():
+            connection.execute(query).fetchall()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                connection.execute(query).fetchall()
+            timings[name] = round((time.perf_counter() - started) / rounds * 1000, 3)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_listing.db")
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA journal_mode=WAL"))
+
+    metadata = MetaData()
+    table = old_schema(metadata)
+    metadata.create_all(engine)
+
+    started = time.perf_counter()
+    seed(engine, table, args.rows)
+    seed_seconds = time.perf_counter() - started
+
+    before = measure(engine, listing_queries(table, OLD_ORDER), args.rounds)
+
+    started = time.perf_counter()
+    migrate(bind=engine, log=lambda message: None)
+    migrate_seconds = time.perf_counter() - started
+
+    table = Table(Estate.__tablename__, MetaData(), autoload_with=engine)
+    after = measure(engine, listing_queries(table, NEW_ORDER), args.rounds)
+
+    print(json.dumps({
+        "rows": args.rows,
+        "seed_s": round(seed_seconds, 1),
+        "migrate_s": round(migrate_seconds, 1),
+        "before_ms": before,
+        "after_ms": after
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# процессорное время на страницу /api/estate/all: как было (ORM Estate -> create_page ->
+# проверка EstatePage[EstateIn] и jsonable_encoder в FastAPI -> JSONResponse) против
+# EstatePageResponse (кортежи колонок EstateIn -> orjson). Заодно проверяет, что байты ответа совпадают
+#   python benchmark/bench_page_json.py [--rows 50000] [--limits 100,1000] [--pages 50]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def prepare(rows):
+    path = os.path.join(tempfile.mkdtemp(), "bench_pages.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    os.environ.setdefault("REST_LOG_PATH", os.path.join(os.path.dirname(path), "rest.log"))
+
+    from benchmark.generate_dataset import DatabaseWriter, generate
+
+    generate(DatabaseWriter(os.environ["DATABASE_URL"]), 1000, rows, 0, log=lambda message: None)
+
+
+async def measure(call, pages):
+    body = await call(0)
+    started_cpu, started = time.process_time(), time.perf_counter()
+    for page in range(pages):
+        await call(page)
+    return body, {
+        "cpu_ms_per_page": round((time.process_time() - started_cpu) / pages * 1000, 3),
+        "wall_ms_per_page": round((time.perf_counter() - started) / pages * 1000, 3)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--limits", default="100,1000")
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    prepare(args.rows)
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from fastapi_pagination import LimitOffsetParams, set_page
+    from sqlalchemy import select
+
+    from database_config import AsyncSessionLocal, Estate, EstateIn
+    from estate_paging import EstateCounter, EstatePage, paginate_counted
+
+    field = create_response_field(name="estate_page", type_=EstatePage[EstateIn])
+    counter = EstateCounter()
+
+    report = {"rows": args.rows, "pages": args.pages}
+    async with AsyncSessionLocal() as session:
+        for limit in map(int, args.limits.split(",")):
+            # у API limit не больше 100, здесь страницы собираются в обход проверки параметров
+            def params(page):
+                return LimitOffsetParams.construct(limit=limit, offset=page * limit % args.rows)
+
+            async def pydantic_page(page):
+                with set_page(EstatePage[EstateIn]):
+                    estates = await paginate_counted(
+                        session, select(Estate), counter, "none", ("bench",), params=params(page)
+                    )
+                return JSONResponse(await serialize_response(field=field, response_content=estates)).body
+
+            async def fast_page(page):
+                return (await paginate_counted(
+                    session, select(Estate), counter, "none", ("bench",), params=params(page), rows=True
+                )).body
+
+            pydantic_body, pydantic_timing = await measure(pydantic_page, args.pages)
+            fast_body, fast_timing = await measure(fast_page, args.pages)
+
+            report[f"limit_{limit}"] = {
+                "pydantic": pydantic_timing,
+                "fast": fast_timing,
+                "speedup": round(pydantic_timing["cpu_ms_per_page"] / fast_timing["cpu_ms_per_page"], 2),
+                "same_bytes": pydantic_body == fast_body,
+                "page_bytes": len(fast_body)
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# сколько стоит строка лога в обработчике: прежний LoggingRest (DEBUG, FileHandler, f-строка с repr
+# всей страницы EstateIn прямо в потоке запроса) против очереди debug_console с JSON-строкой на запрос
+# и против нее же с выборкой 10%. Время меряется в вызывающем потоке — это то, что добавляется к запросу
+#   python benchmark/bench_rest_log.py [--calls 20000] [--page-size 10]
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import time as estate_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("REST_LOG_PATH", os.path.join(tempfile.mkdtemp(), "rest.log"))
+
+from database_config import EstateIn
+from debug_console import LoggingRest, _request_entry
+from estate_paging import EstatePage
+
+
+# debug_console до очереди
+class LegacyLoggingRest:
+
+    def __init__(self, path):
+        self.logger = logging.getLogger("bench.legacy")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.logger.addHandler(logging.FileHandler(path, mode="w"))
+
+    def get(self, link: str, func, response):
+        self.logger.debug(f"GET (\"{link}\"), func({func}): {response}")
+
+
+def page(size):
+    items = [
+        EstateIn(
+            estate_id=i, price=5.5, year=2023, month=1, day=1 + i % 28, time=estate_time(10), latitude=55.75,
+            longitude=37.61, region=None, building_type=2, level=3, levels=9, rooms=2, area=50.5, kitchen_area=9.0,
+            object_type=1, address="Москва", region_name=None, user_id=1
+        )
+        for i in range(size)
+    ]
+    return EstatePage[EstateIn](items=items, total=size * 100, limit=size, offset=0)
+
+
+def measure(call, calls):
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "mean_us": round(statistics.fmean(timings) * 1e6, 2),
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 2),
+        "p99_us": round(timings[int(len(timings) * 0.99) - 1] * 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    estates = page(args.page_size)
+    directory = tempfile.mkdtemp()
+
+    legacy = LegacyLoggingRest(os.path.join(directory, "legacy.log"))
+    queued = LoggingRest(path=os.path.join(directory, "queued.log"), name="bench.queued", capture_root=False)
+    sampled = LoggingRest(
+        path=os.path.join(directory, "sampled.log"), route_sample_rates={"/api/estate/all": 0.1},
+        name="bench.sampled", capture_root=False
+    )
+    queued.start()
+    sampled.start()
+
+    # как в запросе: обработчик дополняет запись, RestLogMiddleware отдает ее в очередь
+    def request(log):
+        def call():
+            entry = {}
+            token = _request_entry.set(entry)
+            log.get(link="/api/estate/all", func="get_estates", response=estates.__dict__)
+            _request_entry.reset(token)
+            log.access("GET", "/api/estate/all", 200, 0.004, entry)
+        return call
+
+    report = {"calls": args.calls, "page_size": args.page_size}
+    report["legacy"] = measure(
+        lambda: legacy.get(link="/api/estate/all", func="get_estates", response=estates.__dict__), args.calls
+    )
+    report["queued"] = measure(request(queued), args.calls)
+    report["queued_sampled_10pct"] = measure(request(sampled), args.calls)
+
+    started = time.perf_counter()
+    queued.stop()
+    sampled.stop()
+    report["drain_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    report["log_bytes"] = {
+        name: os.path.getsize(os.path.join(directory, f"{name}.log")) for name in ("legacy", "queued", "sampled")
+    }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
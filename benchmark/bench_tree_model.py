@@ -0,0 +1,95 @@
+# сравнение бэкендов предсказания: время импорта+загрузки, RSS и задержка predict
+#   python benchmark/bench_tree_model.py [--rounds 200]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tree_model import PREDICT_BACKENDS, load_predict_model
+
+MODEL_PATH = os.path.join(ROOT, "xgb_model.json")
+BATCH_SIZES = (1, 2, 64, 1024)
+
+LOAD_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from tree_model import load_predict_model
+model = load_predict_model({path!r}, backend={backend!r})
+model.predict([[55.75, 37.61, 4355, 2, 6, 11, 1, 52.78, 10.46, 0, 2019, 6, 16]])
+elapsed = time.perf_counter() - started
+# ru_maxrss наследуется от родителя через fork, поэтому пиковый RSS берем из /proc
+try:
+    with open("/proc/self/status") as status:
+        max_rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except OSError:
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"load_s": elapsed, "max_rss_mb": max_rss_kb / 1024}}))
+"""
+
+
+def random_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(43, 60, n),
+        rng.uniform(20, 135, n),
+        rng.integers(0, 10000, n),
+        rng.integers(0, 6, n),
+        rng.integers(1, 30, n),
+        rng.integers(1, 40, n),
+        rng.integers(-1, 6, n),
+        rng.uniform(10, 200, n),
+        rng.uniform(3, 30, n),
+        rng.integers(0, 3, n),
+        rng.integers(2018, 2022, n),
+        rng.integers(1, 13, n),
+        rng.integers(1, 29, n)
+    ]).astype(np.float32)
+
+
+def measure_load(backend):
+    output = subprocess.run(
+        [sys.executable, "-c", LOAD_SCRIPT.format(root=ROOT, path=MODEL_PATH, backend=backend)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_predict(model, feature_values, rounds):
+    model.predict(feature_values)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        model.predict(feature_values)
+    return (time.perf_counter() - started) / rounds * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    feature_values = random_features(max(BATCH_SIZES))
+    models = {backend: load_predict_model(MODEL_PATH, backend=backend) for backend in PREDICT_BACKENDS}
+
+    report = {}
+    for backend, model in models.items():
+        report[backend] = measure_load(backend)
+        report[backend]["predict_us"] = {
+            str(n): round(measure_predict(model, feature_values[:n], args.rounds), 1) for n in BATCH_SIZES
+        }
+
+    reference = models["xgboost"].predict(feature_values)
+    report["numpy"]["max_abs_diff"] = float(np.abs(models["numpy"].predict(feature_values) - reference).max())
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# синтетические User, Estate и Favourites по схеме database_config для проверок на объеме продакшена
+# (~800 тыс. объявлений и больше). Объявления группируются вокруг городов gazetteer.csv (чем крупнее
+# город, тем больше объявлений и дороже метр), комнаты, площадь, этажность и даты — по распределениям,
+# похожим на выгрузку объявлений 2018–2021. Пишет пачками executemany в базу --url (по умолчанию
+# DATABASE_URL) или CSV-файлами в --csv для LOAD DATA INFILE / .import
+#   python benchmark/generate_dataset.py --estates 1000000 [--users 20000] [--favourites 200000]
+#                                        [--url sqlite:///big.db] [--csv out/] [--seed 42]
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, event, func, insert, select
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database_config import Base, Estate, Favourites, SQLALCHEMY_DATABASE_URL, User
+from geo_index import GEO_CELL_COLUMNS, GEO_CELL_SIZE
+
+FIRST_DATE = datetime(2018, 1, 1)
+LAST_DATE = datetime(2021, 12, 31)
+
+# -1 — студия
+ROOMS = (-1, 1, 2, 3, 4, 5)
+ROOMS_WEIGHTS = (0.05, 0.35, 0.33, 0.19, 0.06, 0.02)
+ROOMS_AREA = {-1: 26.0, 1: 38.0, 2: 54.0, 3: 72.0, 4: 95.0, 5: 125.0}
+
+# 0 — другое, 1 — панель, 2 — монолит, 3 — кирпич, 4 — блоки, 5 — дерево
+BUILDING_TYPE_WEIGHTS = (0.05, 0.36, 0.28, 0.21, 0.08, 0.02)
+# 1 — вторичка, 11 — новостройка
+OBJECT_TYPES = (1, 11)
+OBJECT_TYPE_WEIGHTS = (0.7, 0.3)
+LEVELS = (2, 3, 4, 5, 9, 10, 12, 14, 16, 17, 19, 22, 25)
+LEVELS_WEIGHTS = (0.02, 0.03, 0.04, 0.17, 0.2, 0.1, 0.07, 0.07, 0.09, 0.08, 0.04, 0.05, 0.04)
+
+CHUNK = 50000
+
+
+# города gazetteer без дублей по координатам, в порядке файла (от крупных к мелким)
+def load_cities(path=os.path.join(ROOT, "gazetteer.csv")):
+    cities = {}
+    with open(path, encoding="utf-8", newline="") as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            location = (round(float(row["latitude"]), 2), round(float(row["longitude"]), 2))
+            cities.setdefault(location, row["city"])
+    return [(name, latitude, longitude) for (latitude, longitude), name in cities.items()]
+
+
+class EstateGenerator:
+
+    def __init__(self, users, seed=42):
+        self.users = users
+        self.rng = np.random.default_rng(seed)
+        self.cities = load_cities()
+
+        rank = np.arange(1, len(self.cities) + 1)
+        # доля объявлений ~ 1 / rank^1.2, цена метра (млн) падает от столиц к остальным городам
+        self.city_weights = rank ** -1.2 / (rank ** -1.2).sum()
+        self.price_per_m2 = np.where(
+            rank == 1, 0.24, np.where(rank == 2, 0.16, self.rng.uniform(0.07, 0.12, len(rank)))
+        )
+        self.regions = self.rng.choice(np.arange(1, 17000), size=len(self.cities), replace=False)
+
+    def chunk(self, size):
+        rng = self.rng
+        city = rng.choice(len(self.cities), size=size, p=self.city_weights)
+        centers = np.array([(latitude, longitude) for _, latitude, longitude in self.cities])[city]
+
+        # 85% в черте города, остальное — пригороды и область
+        spread = np.where(rng.random(size) < 0.85, 0.08, 0.45)
+        latitude = (centers[:, 0] + rng.normal(0, 1, size) * spread).round(6)
+        longitude = (centers[:, 1] + rng.normal(0, 1, size) * spread * 1.8).round(6)
+
+        rooms = rng.choice(ROOMS, size=size, p=ROOMS_WEIGHTS)
+        area = np.vectorize(ROOMS_AREA.get)(rooms) * rng.lognormal(0, 0.18, size)
+        kitchen_area = np.maximum(area * rng.uniform(0.12, 0.22, size), 4.0)
+        levels = rng.choice(LEVELS, size=size, p=LEVELS_WEIGHTS)
+        level = (rng.random(size) * levels).astype(np.int64) + 1
+        object_type = rng.choice(OBJECT_TYPES, size=size, p=OBJECT_TYPE_WEIGHTS)
+        building_type = rng.choice(len(BUILDING_TYPE_WEIGHTS), size=size, p=BUILDING_TYPE_WEIGHTS)
+
+        # пригород дешевле, новостройки немного дешевле вторички
+        price = (
+            area * self.price_per_m2[city] * rng.lognormal(0, 0.25, size)
+            * np.where(spread > 0.1, 0.6, 1.0) * np.where(object_type == 11, 0.9, 1.0)
+        )
+
+        # объявлений становится больше к концу периода, днем больше, чем ночью
+        span = (LAST_DATE - FIRST_DATE).total_seconds()
+        seconds = np.sqrt(rng.random(size)) * span
+        seconds = seconds - seconds % 86400 + rng.normal(14, 3.5, size).clip(0, 23.99) * 3600
+        listed_at = [FIRST_DATE + timedelta(seconds=int(value)) for value in seconds]
+
+        geo_cell = (
+            np.floor((latitude + 90) / GEO_CELL_SIZE).astype(np.int64) * GEO_CELL_COLUMNS
+            + np.floor((longitude + 180) / GEO_CELL_SIZE).astype(np.int64) % GEO_CELL_COLUMNS
+        )
+        # несколько агентств с тысячами объявлений и много частных с одним-двумя
+        user_id = (self.users * rng.random(size) ** 3).astype(np.int64) + 1
+
+        columns = {
+            "price": price.round(3), "latitude": latitude, "longitude": longitude,
+            "region": self.regions[city], "building_type": building_type, "level": level, "levels": levels,
+            "rooms": rooms, "area": area.round(1), "kitchen_area": kitchen_area.round(1),
+            "object_type": object_type, "geo_cell": geo_cell, "user_id": user_id
+        }
+        columns = {name: values.tolist() for name, values in columns.items()}
+        names = [self.cities[index][0] for index in city.tolist()]
+
+        return [
+            dict(
+                {name: values[i] for name, values in columns.items()},
+                year=moment.year, month=moment.month, day=moment.day, time=moment.time(),
+                listed_at=moment, address=names[i]
+            )
+            for i, moment in enumerate(listed_at)
+        ]
+
+
+def favourites_chunks(users, estates, count, rng):
+    # у части пользователей много закладок, свежие объявления сохраняют чаще
+    user_id = (users * rng.random(count) ** 2).astype(np.int64) + 1
+    estate_id = (estates * np.sqrt(rng.random(count))).astype(np.int64) + 1
+    pairs = np.unique(np.stack([user_id, estate_id], axis=1), axis=0)
+
+    for start in range(0, len(pairs), CHUNK):
+        yield [{"user_id": user, "estate_id": estate} for user, estate in pairs[start:start + CHUNK].tolist()]
+
+
+class DatabaseWriter:
+
+    def __init__(self, url):
+        self.engine = create_engine(url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", self._sqlite_pragmas)
+        Base.metadata.create_all(self.engine)
+
+        with self.engine.connect() as connection:
+            self.user_offset = connection.scalar(select(func.coalesce(func.max(User.user_id), 0)))
+            self.estate_offset = connection.scalar(select(func.coalesce(func.max(Estate.estate_id), 0)))
+
+        # в пустую таблицу быстрее залить без вторичных индексов и построить их один раз в конце
+        self.deferred_indexes = list(Estate.__table__.indexes) if self.estate_offset == 0 else []
+        for index in self.deferred_indexes:
+            index.drop(self.engine)
+
+    @staticmethod
+    def _sqlite_pragmas(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+
+    def write(self, table, rows):
+        with self.engine.begin() as connection:
+            connection.execute(insert(table), rows)
+
+    def close(self):
+        for index in self.deferred_indexes:
+            index.create(self.engine)
+
+
+# CSV для LOAD DATA LOCAL INFILE ... FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' IGNORE 1 LINES,
+# NULL записывается как \N
+class CsvWriter:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.user_offset = 0
+        self.estate_offset = 0
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, table, rows):
+        if table.name not in self.files:
+            file = open(os.path.join(self.directory, f"{table.name}.csv"), "w", encoding="utf-8", newline="")
+            writer = csv.writer(file)
+            writer.writerow([column.name for column in table.columns])
+            self.files[table.name] = (file, writer)
+        _, writer = self.files[table.name]
+        names = [column.name for column in table.columns]
+        writer.writerows([["\\N" if row.get(name) is None else row[name] for name in names] for row in rows])
+
+    def close(self):
+        for file, _ in self.files.values():
+            file.close()
+
+
+def generate(writer, users, estates, favourites, seed=42, log=print):
+    started = time.perf_counter()
+    user_offset, estate_offset = writer.user_offset, writer.estate_offset
+
+    for start in range(0, users, CHUNK):
+        writer.write(User.__table__, [
+            {"user_id": user_offset + i + 1, "user_mail": f"user{user_offset + i}@mail.ru"}
+            for i in range(start, min(start + CHUNK, users))
+        ])
+    log(f"User: {users} rows, {time.perf_counter() - started:.1f} s")
+
+    generator = EstateGenerator(users, seed=seed)
+    for start in range(0, estates, CHUNK):
+        rows = generator.chunk(min(CHUNK, estates - start))
+        for i, row in enumerate(rows):
+            row["estate_id"] = estate_offset + start + i + 1
+            row["user_id"] += user_offset
+        writer.write(Estate.__table__, rows)
+        log(f"Estate: {start + len(rows)}/{estates}, {time.perf_counter() - started:.1f} s")
+
+    written = 0
+    for rows in favourites_chunks(users, estates, favourites, generator.rng):
+        for row in rows:
+            row["user_id"] += user_offset
+            row["estate_id"] += estate_offset
+        writer.write(Favourites.__table__, rows)
+        written += len(rows)
+    log(f"Favourites: {written} rows, {time.perf_counter() - started:.1f} s")
+
+    writer.close()
+    elapsed = time.perf_counter() - started
+    log(f"done: {estates / elapsed:.0f} estates/s, {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estates", type=int, default=800_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--favourites", type=int, default=200_000)
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--csv", help="каталог для CSV вместо записи в базу")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate(
+        CsvWriter(args.csv) if args.csv else DatabaseWriter(args.url),
+        args.users, args.estates, args.favourites, seed=args.seed
+    )
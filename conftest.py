@@ -0,0 +1,39 @@
+# тесты идут на временной sqlite-базе: адреса задаются до импорта database_config,
+# test_geo.py и example/ — ручные скрипты, pytest их не собирает
+import os
+import tempfile
+
+import pytest
+
+collect_ignore = ["test_geo.py", "example"]
+
+TEST_DIR = tempfile.mkdtemp(prefix="estate_tests_")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'estate.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("ASYNC_REPLICA_DATABASE_URL", None)
+os.environ["REST_LOG_PATH"] = os.path.join(TEST_DIR, "rest.log")
+os.environ["PROFILE_DIR"] = os.path.join(TEST_DIR, "profiles")
+
+
+# отдельная sqlite-база с синтетическими объявлениями benchmark/generate_dataset.py,
+# общая для тестов, которые ее только читают
+@pytest.fixture(scope="session")
+def estate_db():
+    from benchmark.generate_dataset import DatabaseWriter, generate
+
+    path = os.path.join(TEST_DIR, "dataset.db")
+    generate(DatabaseWriter(f"sqlite:///{path}"), 300, 30000, 3000, seed=7, log=lambda message: None)
+    return f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+
+
+# приложение на тестовой базе: 50 пользователей user0@mail.ru..user49@mail.ru и 2000 объявлений без закладок
+@pytest.fixture(scope="session")
+def api_client():
+    from fastapi.testclient import TestClient
+
+    import diplom_server
+    from benchmark.generate_dataset import DatabaseWriter, generate
+
+    generate(DatabaseWriter(os.environ["DATABASE_URL"]), 50, 2000, 0, seed=3, log=lambda message: None)
+    return TestClient(diplom_server.app)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+# настройки пула из окружения, общие для основной базы и реплики
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# MySQL закрывает простаивающие соединения по wait_timeout, поэтому соединения пересоздаются заранее
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+
+# имя класса пула SQLAlchemy под оберткой MeasuredPool: QueuePool, NullPool, AsyncAdaptedQueuePool...
+def pool_class_name(pool):
+    return next(cls.__name__ for cls in type(pool).__mro__ if cls.__module__.startswith("sqlalchemy."))
+
+
+class PoolStats:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checkin(self, *args):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self, pool):
+        attempts = self.checkouts + self.timeouts
+        stats = {
+            "pool": pool_class_name(pool),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "wait_mean_ms": self.wait_total / attempts * 1000 if attempts else 0.0,
+            "wait_max_ms": self.wait_max * 1000
+        }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=pool.overflow())
+        return stats
+
+
+# время получения соединения: для очереди — ожидание свободного места и pre-ping,
+# для NullPool — само подключение
+class MeasuredPool:
+    stats = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.wait(time.perf_counter() - started)
+        return connection
+
+    # engine.dispose() пересоздает пул, счетчики переезжают в новый
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def measured_pool_class(url):
+    pool_class = url.get_dialect().get_pool_class(url)
+    return type(f"Measured{pool_class.__name__}", (MeasuredPool, pool_class), {})
+
+
+def create_measured_engine(url, is_async=False):
+    url = make_url(url)
+    pool_class = measured_pool_class(url)
+
+    options = {"poolclass": pool_class, "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+    if issubclass(pool_class, QueuePool):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+
+    engine = create_async_engine(url, **options) if is_async else create_engine(url, **options)
+
+    pool = getattr(engine, "sync_engine", engine).pool
+    pool.stats = PoolStats()
+    event.listen(pool, "checkout", pool.stats.checkout)
+    event.listen(pool, "checkin", pool.stats.checkin)
+
+    return engine
+
+
+def pool_stats(engine):
+    pool = getattr(engine, "sync_engine", engine).pool
+    return pool.stats.snapshot(pool)
@@ -1,23 +1,196 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-logging.basicConfig(level=logging.DEBUG, filename="py_log.log",filemode="w")
+from metrics import route_template
 
+# logs/ в .gitignore
+REST_LOG_PATH = os.environ.get("REST_LOG_PATH", os.path.join("logs", "rest.log"))
+REST_LOG_MAX_BYTES = int(os.environ.get("REST_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+REST_LOG_BACKUP_COUNT = int(os.environ.get("REST_LOG_BACKUP_COUNT", "5"))
+# доля запросов, попадающих в лог; ответы с ошибкой пишутся всегда
+REST_LOG_SAMPLE_RATE = float(os.environ.get("REST_LOG_SAMPLE_RATE", "1"))
+# доли по маршрутам: "/api/estate/all=0.01,/api/prediction=0.1"
+REST_LOG_ROUTE_SAMPLE_RATES = os.environ.get("REST_LOG_ROUTE_SAMPLE_RATES", "")
+
+# запись текущего запроса, ее дополняют вызовы rest_log из обработчика
+_request_entry = contextvars.ContextVar("rest_request_entry", default=None)
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in value.split(","):
+        if item.strip():
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+# вместо repr всего ответа — число строк страницы, total и сообщение об ошибке
+def summarize(response):
+    if isinstance(response, (list, tuple)):
+        return {"rows": len(response)}
+    if not isinstance(response, dict):
+        return {}
+
+    summary = {}
+    if isinstance(response.get("items"), (list, tuple)):
+        summary["rows"] = len(response["items"])
+        if response.get("total") is not None:
+            summary["total"] = response["total"]
+    if isinstance(response.get("message"), str):
+        summary["message"] = response["message"]
+    return summary
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = getattr(record, "rest", None)
+        if entry is None:
+            entry = {"level": record.levelname, "logger": record.name, "message": record.getMessage()}
+            if record.exc_info:
+                entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(dict(ts=round(record.created, 3), **entry), ensure_ascii=False, default=str)
+
+
+# запись уходит в очередь как есть, форматирует и пишет ее поток QueueListener
+class RecordQueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        return record
+
+
+# записи копятся в очереди с создания, а поток записи в файл и перехват корневого логгера
+# появляются только в start() — его зовет запуск приложения, импорт модуля ничего не запускает
 class LoggingRest:
 
-    def __init__(self):
-        pass
+    def __init__(self, path=REST_LOG_PATH, max_bytes=REST_LOG_MAX_BYTES, backup_count=REST_LOG_BACKUP_COUNT,
+                 sample_rate=REST_LOG_SAMPLE_RATE, route_sample_rates=None, name="rest", capture_root=True):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.route_sample_rates = parse_sample_rates(REST_LOG_ROUTE_SAMPLE_RATES) \
+            if route_sample_rates is None else route_sample_rates
+        self.dropped = 0
+        self.capture_root = capture_root
+        self.running = False
+        self._root_level = None
+
+        self.queue = queue.SimpleQueue()
+        # delay: файл открывается первой записью, а не конструктором
+        file_handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, file_handler)
 
-    def get(self, link: str, func,response):
-        logging.debug(f"GET (\"{link}\"), func({func}): {response}")
+        self.handler = RecordQueueHandler(self.queue)
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.listener.start()
+        self.running = True
+        atexit.register(self.stop)
+
+        # предупреждения и ошибки библиотек идут в тот же файл через ту же очередь
+        if self.capture_root:
+            root = logging.getLogger()
+            self._root_level = root.level
+            root.addHandler(self.handler)
+            root.setLevel(logging.WARNING)
+
+    def stop(self):
+        if not self.running:
+            return
+        if self.capture_root:
+            root = logging.getLogger()
+            root.removeHandler(self.handler)
+            root.setLevel(self._root_level)
+        self.listener.stop()
+        self.running = False
+        atexit.unregister(self.stop)
+
+    def sampled(self, route, status_code=None):
+        if status_code is not None and status_code >= 400:
+            return True
+        rate = self.route_sample_rates.get(route, self.sample_rate)
+        if rate >= 1 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+    def emit(self, entry):
+        self.logger.info("", extra={"rest": entry})
+
+    # одна строка на запрос: маршрут, статус, время и то, что записал обработчик
+    def access(self, method, route, status_code, latency, entry):
+        if self.sampled(route, status_code):
+            self.emit(dict(
+                method=method, route=route, status=status_code, latency_ms=round(latency * 1000, 3), **entry
+            ))
+
+    def log(self, method, link, func, response):
+        summary = summarize(response)
+        entry = _request_entry.get()
+        if entry is not None:
+            entry.update(summary, link=link, func=func)
+        elif self.sampled(link):
+            self.emit(dict(method=method, link=link, func=func, **summary))
+
+    def get(self, link: str, func, response):
+        self.log("GET", link, func, response)
 
     def post(self, link: str, func, response):
-        logging.debug(f"POST (\"{link}\"), func({func}): {response}")
+        self.log("POST", link, func, response)
 
     def put(self, link: str, func, response):
-        logging.debug(f"PUT (\"{link}\"), func({func}): {response}")
+        self.log("PUT", link, func, response)
 
     def delete(self, link: str, func, response):
-        logging.debug(f"DELETE (\"{link}\"), func({func}): {response}")
+        self.log("DELETE", link, func, response)
+
+
+# ASGI-обертка приложения: меряет запрос до отправки последнего байта ответа
+# и пишет строку лога уже после него, маршрут берется шаблоном (/api/users/{user_mail})
+class RestLogMiddleware:
+
+    def __init__(self, app, log=None):
+        self.app = app
+        self.log = log if log is not None else rest_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        entry = {}
+        token = _request_entry.set(entry)
+
+        async def send_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _request_entry.reset(token)
+            self.log.access(scope["method"], route_template(scope), status_code, time.perf_counter() - started, entry)
 
 
-rest_log = LoggingRest()
\ No newline at end of file
+rest_log = LoggingRest()
@@ -1,26 +1,53 @@
-import random
+import asyncio
+import logging
+import os
 
 import numpy as np
-from xgboost import XGBRegressor
 import uvicorn
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
-from fastapi_pagination import LimitOffsetPage, add_pagination, Page
-from fastapi_pagination.ext.sqlalchemy import paginate
-from geopandas.tools import geocode, reverse_geocode
+from fastapi_pagination import add_pagination
+from fastapi_pagination.cursor import CursorPage
 from database_config import *
-from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc, and_
-from fastapi import Depends, FastAPI, Body
-from fastapi.responses import JSONResponse, FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, insert, select
+from fastapi import Depends, FastAPI, Body, Query, Request
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 import starlette.status as status
 import re
-from debug_console import rest_log
-import pandas as pd
+from typing import List
+from debug_console import RestLogMiddleware, rest_log
+from metrics import MetricsMiddleware, TimedJSONResponse, instrument_engine, metrics
+from profiler import ProfileStore, RestProfiler, profiling_enabled, request_authorized, sampling_without_secret
+from geo_cache import GeoCache, AsyncGeocoder
+from predict_batcher import PredictBatcher
+from predict_cache import PredictCache
+from tree_model import load_predict_model
+from feature_vector import FeatureSchema, model_feature_names
+from estate_paging import (ESTATE_IN_FIELDS, ESTATE_ORDER, EstateCounter, EstatePage, filter_signature,
+                           paginate_columns, paginate_counted, paginate_keyset, parse_estate_fields)
+from estate_columns import EstateColumnStore
+from starlette.concurrency import run_in_threadpool
+from db_pool import pool_stats
+from estate_facets import FACET_COLUMNS, EstateFacets, columns_facets, query_facets
+from geo_index import distance_km, geo_cell, radius_filters
+from estate_ingest import INGEST_FORMATS, ingest_estates, iter_lines
+from estate_export import EXPORT_COLUMNS, EXPORT_FORMATS, EXPORT_MEDIA_TYPES, export_estates
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+app = FastAPI(default_response_class=TimedJSONResponse)
+
+profile_store = ProfileStore()
+if profiling_enabled():
+    app.add_middleware(RestProfiler, store=profile_store)
+app.add_middleware(RestLogMiddleware, log=rest_log)
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+instrument_engine(engine)
+instrument_engine(async_engine)
+if async_replica_engine is not async_engine:
+    instrument_engine(async_replica_engine)
 add_pagination(app)
 user_router = InferringRouter()
 admin_router = InferringRouter()
@@ -29,16 +56,142 @@ estate_router = InferringRouter()
 favourites_router = InferringRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# сессия для выдачи и поиска: SELECT читают реплику, если она задана
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-xgb_model = XGBRegressor()
-xgb_model.load_model("xgb_model.json")
+class EstateFieldsError(Exception):
+    pass
+
+
+# ?fields= страниц объявлений: поля EstateIn в порядке модели, None — все поля;
+# неизвестное или пустое поле — 400 еще до обработчика
+def get_estate_fields(fields: Optional[str] = None):
+    try:
+        return parse_estate_fields(fields)
+    except ValueError:
+        raise EstateFieldsError(fields)
+
+
+@app.exception_handler(EstateFieldsError)
+async def estate_fields_error(request: Request, error: EstateFieldsError):
+    resp_json = {"message": f"Поля должны быть из: {', '.join(ESTATE_IN_FIELDS)}"}
+    response = JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content=resp_json
+    )
+    rest_log.log(
+        request.method, request.url.path, func=getattr(request.scope.get("endpoint"), "__name__", None),
+        response=resp_json
+    )
+    return response
+
+
+class ProfileTokenError(Exception):
+    pass
+
+
+# служебные маршруты (профили, метрики, пулы соединений) отдаются по тому же подписанному токену,
+# что включает профилирование: заголовок X-Profile или ?profile= (его умеет передать scrape-конфиг Prometheus)
+def require_profile_token(request: Request):
+    if not request_authorized(request):
+        raise ProfileTokenError()
+
+
+@app.exception_handler(ProfileTokenError)
+async def profile_token_error(request: Request, error: ProfileTokenError):
+    resp_json = {"message": "Нужен токен X-Profile"}
+    response = JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content=resp_json
+    )
+    rest_log.log(
+        request.method, request.url.path, func=getattr(request.scope.get("endpoint"), "__name__", None),
+        response=resp_json
+    )
+    return response
+
+
+MODEL_PATH = "xgb_model.json"
+PREDICT_BACKEND = os.environ.get("PREDICT_BACKEND", "xgboost")
+
+xgb_model = load_predict_model(MODEL_PATH, backend=PREDICT_BACKEND)
+feature_schema = FeatureSchema(model_feature_names(xgb_model))
+
+predict_batcher = PredictBatcher(
+    xgb_model.predict,
+    window=float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "2")) / 1000,
+    max_batch_size=int(os.environ.get("PREDICT_BATCH_MAX_SIZE", "64"))
+)
+
+predict_cache = PredictCache(
+    MODEL_PATH,
+    maxsize=int(os.environ.get("PREDICT_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("PREDICT_CACHE_TTL", "3600"))
+)
+
+
+# total по умолчанию точный: сброс кэша EstateCounter виден только своему процессу,
+# поэтому cached и estimate — по ?count= или ESTATE_COUNT_MODE, когда запаздывание на ttl допустимо
+ESTATE_COUNT_MODE = os.environ.get("ESTATE_COUNT_MODE", "exact")
+
+estate_counter = EstateCounter(ttl=float(os.environ.get("ESTATE_COUNT_TTL", "60")))
+
+estate_facets = EstateFacets(ttl=float(os.environ.get("ESTATE_FACETS_TTL", "60")))
+
+# fast — страницы объявлений собираются из кортежей колонок и кодируются orjson,
+# pydantic — ORM-объекты проверяются EstateIn и кодируются FastAPI; ответ одинаковый
+ESTATE_FAST_PAGES = os.environ.get("ESTATE_SERIALIZER", "fast") == "fast"
+
+# sql — фильтры /api/estate/where считает база, memory — колонки numpy в памяти процесса
+ESTATE_SEARCH_ENGINE = os.environ.get("ESTATE_SEARCH_ENGINE", "sql")
+
+estate_columns = None
+if ESTATE_SEARCH_ENGINE == "memory":
+    estate_columns = EstateColumnStore(
+        engine,
+        refresh_interval=float(os.environ.get("ESTATE_COLUMNS_REFRESH", "1"))
+    )
+
+
+logger = logging.getLogger(__name__)
+
+model_reload_lock = asyncio.Lock()
+
+
+# перечитываем модель, если файл на диске поменялся; кэш предсказаний при этом сбрасывается.
+# Разбор файла идет в пуле потоков, пока он грузится, запросы считаются прежней моделью;
+# недописанный или битый файл оставляет прежнюю модель, ошибка уходит в лог
+async def refresh_model():
+    global xgb_model
+
+    if model_reload_lock.locked() or not predict_cache.model_changed():
+        return
+
+    async with model_reload_lock:
+        # версия файла до чтения: если файл сменится во время загрузки, следующая проверка увидит это
+        version = predict_cache.read_version()
+        try:
+            model = await run_in_threadpool(load_predict_model, MODEL_PATH, backend=PREDICT_BACKEND)
+        except Exception:
+            predict_cache.model_failed(version)
+            logger.exception("Не удалось перечитать модель %s, остается прежняя", MODEL_PATH)
+            return
+
+        xgb_model = model
+        predict_batcher.predict_rows = model.predict
+        predict_cache.reset(version)
+
+geo_cache = GeoCache()
+geo_cache.warm()
+geocoder = AsyncGeocoder(geo_cache, not_found_ttl=float(os.environ.get("GEOCODE_NOT_FOUND_TTL", "60")))
 
 
 # user rest
@@ -54,10 +207,10 @@ class UserAPI:
 
     # выбор пользователя
     @user_router.get("/api/users/{user_mail}", response_class=JSONResponse)
-    async def get_user(self, user_mail: str, db: Session = Depends(get_db)):
+    async def get_user(self, user_mail: str, db: AsyncSession = Depends(get_db)):
         link = f"/api/users/{user_mail}"
 
-        user = db.query(User).filter(User.user_mail == user_mail).first()
+        user = await db.scalar(select(User).where(User.user_mail == user_mail))
 
         if user is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -77,14 +230,14 @@ class UserAPI:
 
     # добавляем пользователя
     @user_router.post("/api/users", response_class=JSONResponse)
-    async def create_user(self, data=Body(), db: Session = Depends(get_db)):
+    async def create_user(self, data=Body(), db: AsyncSession = Depends(get_db)):
         link = "/api/users"
 
         user = User(
             user_mail=data["user_mail"]
         )
 
-        existed_user = db.query(User).filter(User.user_mail == user.user_mail).first()
+        existed_user = await db.scalar(select(User).where(User.user_mail == user.user_mail))
 
         if existed_user is not None:
             resp_json = {"message": "Пользователь с такой почтой или с номером телефона уже существует"}
@@ -99,8 +252,8 @@ class UserAPI:
             return response
 
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         rest_log.post(link=link, func=self.create_user.__name__, response=user.__dict__)
 
@@ -108,10 +261,10 @@ class UserAPI:
 
     # изменение пользователя
     @user_router.put("/api/users", response_class=JSONResponse)
-    async def edit_user(self, data=Body(), db: Session = Depends(get_db)):
+    async def edit_user(self, data=Body(), db: AsyncSession = Depends(get_db)):
         link = "/api/users"
 
-        user = db.query(User).filter(User.user_mail == data["user_mail"]).first()
+        user = await db.scalar(select(User).where(User.user_mail == data["user_mail"]))
 
         if user is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -134,8 +287,8 @@ class UserAPI:
         user.user_mail = data["user_mail"]
         user.user_login = edited_user.user_login
 
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         rest_log.put(link=link, func=self.edit_user.__name__, response=user.__dict__)
 
@@ -143,10 +296,10 @@ class UserAPI:
 
     # удаление пользователя
     @user_router.delete("/api/users/{user_mail}", response_class=JSONResponse)
-    async def delete_user(self, user_mail: str, db: Session = Depends(get_db)):
+    async def delete_user(self, user_mail: str, db: AsyncSession = Depends(get_db)):
         link = f"/api/users/{user_mail}"
 
-        user = db.query(User).filter(User.user_mail == user_mail).first()
+        user = await db.scalar(select(User).where(User.user_mail == user_mail))
 
         if user is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -160,8 +313,12 @@ class UserAPI:
 
             return response
 
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        estate_counter.invalidate()
+        estate_facets.invalidate()
+        if estate_columns is not None:
+            estate_columns.invalidate()
 
         rest_log.delete(link=link, func=self.delete_user.__name__, response=user.__dict__)
 
@@ -200,15 +357,16 @@ class PredictAPI:
         self.mean_month = 6.628343097815816
         self.mean_day = 16.179484811442926
         self.MILLION_VALUE = 1_000_000
+        self.MAX_BATCH_SIZE = 100
 
     # предсказание цены
     @predict_router.post("/api/prediction", response_class=JSONResponse)
     async def get_prediction(self, data=Body()):
         link = "/api/prediction"
 
-        predict_model1, predict_model2 = self.get_predict_model(data)
+        location = await self.get_location(data)
 
-        if predict_model1 == None or predict_model2 == None:
+        if location is None:
             resp_json = {"message": "Не правильно введен город"}
             response = JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -217,137 +375,141 @@ class PredictAPI:
             rest_log.post(link=link, func=self.get_prediction.__name__, response=resp_json)
             return response
 
-        df1 = pd.DataFrame(
-            np.array(
-                [
-                    [float(predict_model1.latitude)],
-                    [float(predict_model1.longitude)],
-                    [int(predict_model1.region)],
-                    [int(predict_model1.building_type)],
-                    [int(predict_model1.level)],
-                    [int(predict_model1.levels)],
-                    [int(predict_model1.rooms)],
-                    [float(predict_model1.area)],
-                    [float(predict_model1.kitchen_area)],
-                    [int(predict_model1.object_type)],
-                    [int(predict_model1.year)],
-                    [int(predict_model1.month)],
-                    [int(predict_model1.day)]
-                ]
-            ).transpose(),
-            columns=[
-                "latitude",
-                "longitude",
-                "region",
-                "building_type",
-                "level",
-                "levels",
-                "rooms",
-                "area",
-                "kitchen_area",
-                "object_type",
-                "year",
-                "month",
-                "day"
-            ]
-        )
+        await refresh_model()
 
-        df2 = pd.DataFrame(
-            np.array(
-                [
-                    [float(predict_model2.latitude)],
-                    [float(predict_model2.longitude)],
-                    [int(predict_model2.region)],
-                    [int(predict_model2.building_type)],
-                    [int(predict_model2.level)],
-                    [int(predict_model2.levels)],
-                    [int(predict_model2.rooms)],
-                    [float(predict_model2.area)],
-                    [float(predict_model2.kitchen_area)],
-                    [int(predict_model2.object_type)],
-                    [int(predict_model2.year)],
-                    [int(predict_model2.month)],
-                    [int(predict_model2.day)]
-                ]
-            ).transpose(),
-            columns=[
-                "latitude",
-                "longitude",
-                "region",
-                "building_type",
-                "level",
-                "levels",
-                "rooms",
-                "area",
-                "kitchen_area",
-                "object_type",
-                "year",
-                "month",
-                "day"
-            ]
-        )
+        feature_values = self.get_feature_values(data, location)
+        key = predict_cache.key(feature_values)
 
-        feature_values1 = df1.values
-        feature_values2 = df2.values
+        costs = predict_cache.get(key)
+        if costs is None:
+            with metrics.stage("predict"):
+                cost_predicted1, cost_predicted2 = await predict_batcher.predict(feature_values)
 
-        cost_predicted1 = xgb_model.predict(feature_values1)
-        cost_predicted2 = xgb_model.predict(feature_values2)
+            if cost_predicted1 > cost_predicted2:
+                cost_predicted1, cost_predicted2 = cost_predicted2, cost_predicted1
 
-        if cost_predicted1 > cost_predicted2:
-            cost_predicted1, cost_predicted2 = cost_predicted2, cost_predicted1
+            costs = (cost_predicted1, cost_predicted2)
+            predict_cache.put(key, costs)
 
-        response = {"cost1": f"{int(cost_predicted1[0] * self.MILLION_VALUE)}",
-                    "cost2": f"{int(cost_predicted2[0] * self.MILLION_VALUE)}"}
+        cost_predicted1, cost_predicted2 = costs
+
+        response = {"cost1": f"{int(cost_predicted1 * self.MILLION_VALUE)}",
+                    "cost2": f"{int(cost_predicted2 * self.MILLION_VALUE)}"}
 
         rest_log.post(link=link, func=self.get_prediction.__name__, response=response)
 
         return response
 
-    def get_predict_model(self, data):
+    # предсказание цены для списка запросов одним вызовом модели
+    @predict_router.post("/api/prediction/batch", response_class=JSONResponse)
+    async def get_prediction_batch(self, data=Body()):
+        link = "/api/prediction/batch"
 
-        if ' ' in data['city'] and data['city'][-1] == ' ':
-            data['city'] = data['city'][:-1]
-        try:
-            location = geocode(data['city'], provider="nominatim", user_agent='my_request')
-        except:
-            return None
-        point = location.geometry.iloc[0]
-        longitude = point.x
-        latitude = point.y
-
-        first_model = PredictModel(
-            day=self.mean_day,
-            month=self.mean_month,
-            year=self.mean_year,
-            area=self.get_feature(feature_string="totalAreaFrom", data=data),
-            kitchen_area=self.get_feature(feature_string="kitchenAreaFrom", data=data),
-            levels=self.get_feature(feature_string="levelsFrom", data=data),
-            level=self.get_feature(feature_string="levelFrom", data=data),
-            rooms=self.get_feature(feature_string="numberOfRoomsFrom", data=data),
-            building_type=self.get_feature(feature_string="houseType", data=data),
-            object_type=self.get_feature(feature_string="objectType", data=data),
-            region=self.mean_region,
-            latitude=latitude,
-            longitude=longitude
-        )
+        if not isinstance(data, list):
+            resp_json = {"message": "Ожидается список запросов"}
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.post(link=link, func=self.get_prediction_batch.__name__, response=resp_json)
+            return response
 
-        second_model = PredictModel(
-            day=self.mean_day,
-            month=self.mean_month,
-            year=self.mean_year,
-            area=self.get_feature(feature_string="totalAreaTo", data=data),
-            kitchen_area=self.get_feature(feature_string="kitchenAreaTo", data=data),
-            levels=self.get_feature(feature_string="levelsTo", data=data),
-            level=self.get_feature(feature_string="levelTo", data=data),
-            rooms=self.get_feature(feature_string="numberOfRoomsTo", data=data),
-            building_type=self.get_feature(feature_string="houseType", data=data),
-            object_type=self.get_feature(feature_string="objectType", data=data),
-            region=self.mean_region,
-            latitude=latitude,
-            longitude=longitude
-        )
+        if len(data) > self.MAX_BATCH_SIZE:
+            resp_json = {"message": f"За один запрос можно предсказать не больше {self.MAX_BATCH_SIZE} цен"}
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.post(link=link, func=self.get_prediction_batch.__name__, response=resp_json)
+            return response
 
-        return first_model, second_model
+        # ошибки отдаются по месту запроса в списке, остальные элементы все равно считаются
+        response = [None] * len(data)
+        with_city = []
+        for i, item in enumerate(data):
+            if isinstance(item, dict) and isinstance(item.get("city"), str):
+                with_city.append(i)
+            else:
+                response[i] = {"message": "Не указан город"}
+
+        locations = await asyncio.gather(*[self.get_location(data[i]) for i in with_city])
+
+        await refresh_model()
+
+        feature_values = feature_schema.empty(2 * len(with_city))
+        found = []
+        for i, location in zip(with_city, locations):
+            if location is None:
+                response[i] = {"message": "Не правильно введен город"}
+                continue
+            rows = feature_values[2 * len(found):2 * len(found) + 2]
+            try:
+                self.get_feature_values(data[i], location, out=rows)
+            except (KeyError, TypeError, ValueError):
+                response[i] = {"message": "Неверные параметры запроса"}
+                continue
+            found.append(i)
+        feature_values = feature_values[:2 * len(found)]
+
+        keys = [predict_cache.key(feature_values[2 * j:2 * j + 2]) for j in range(len(found))]
+        costs = [predict_cache.get(key) for key in keys]
+        missed = [j for j, cost in enumerate(costs) if cost is None]
+
+        if missed:
+            rows = np.array([(2 * j, 2 * j + 1) for j in missed]).ravel()
+            with metrics.stage("predict"):
+                cost_pairs = (await predict_batcher.predict(feature_values[rows])).reshape(-1, 2)
+            for j, cost_pair in zip(missed, cost_pairs):
+                costs[j] = (cost_pair.min(), cost_pair.max())
+                predict_cache.put(keys[j], costs[j])
+
+        for i, (cost_predicted1, cost_predicted2) in zip(found, costs):
+            response[i] = {"cost1": f"{int(cost_predicted1 * self.MILLION_VALUE)}",
+                           "cost2": f"{int(cost_predicted2 * self.MILLION_VALUE)}"}
+
+        rest_log.post(link=link, func=self.get_prediction_batch.__name__, response=response)
+
+        return response
+
+    async def get_location(self, data):
+
+        if ' ' in data['city'] and data['city'][-1] == ' ':
+            data['city'] = data['city'][:-1]
+        return await geocoder.geocode(data['city'])
+
+    # две строки признаков: нижняя и верхняя граница диапазона из запроса
+    def get_feature_values(self, data, location, out=None):
+        latitude, longitude = location
+
+        common_features = {
+            "day": self.mean_day,
+            "month": self.mean_month,
+            "year": self.mean_year,
+            "building_type": self.get_feature(feature_string="houseType", data=data),
+            "object_type": self.get_feature(feature_string="objectType", data=data),
+            "region": self.mean_region,
+            "latitude": latitude,
+            "longitude": longitude
+        }
+
+        return feature_schema.build([
+            dict(
+                common_features,
+                area=self.get_feature(feature_string="totalAreaFrom", data=data),
+                kitchen_area=self.get_feature(feature_string="kitchenAreaFrom", data=data),
+                levels=self.get_feature(feature_string="levelsFrom", data=data),
+                level=self.get_feature(feature_string="levelFrom", data=data),
+                rooms=self.get_feature(feature_string="numberOfRoomsFrom", data=data)
+            ),
+            dict(
+                common_features,
+                area=self.get_feature(feature_string="totalAreaTo", data=data),
+                kitchen_area=self.get_feature(feature_string="kitchenAreaTo", data=data),
+                levels=self.get_feature(feature_string="levelsTo", data=data),
+                level=self.get_feature(feature_string="levelTo", data=data),
+                rooms=self.get_feature(feature_string="numberOfRoomsTo", data=data)
+            )
+        ], out=out)
 
     def get_feature(self, feature_string, data):
         if data[feature_string] == '':
@@ -383,15 +545,27 @@ class PredictAPI:
 @cbv(estate_router)
 class EstateAPI:
     def __init__(self):
-        self.geo_delta = 0.4
+        # радиус поиска вокруг города по умолчанию, км (примерно прежние ±0.4° по широте)
+        self.geo_radius = 45.0
         self.MILLION_VALUE = 1_000_000
+        # ключи тела /api/estate/where, в выгрузке они же приходят параметрами запроса
+        self.FILTER_FIELDS = (
+            "city", "radius", "priceFrom", "priceTo", "totalAreaFrom", "totalAreaTo", "kitchenAreaFrom",
+            "kitchenAreaTo", "levelsFrom", "levelsTo", "levelFrom", "levelTo", "numberOfRoomsFrom",
+            "numberOfRoomsTo", "houseType", "objectType"
+        )
+        self.INTEGER_FILTER_FIELDS = (
+            "levelsFrom", "levelsTo", "levelFrom", "levelTo", "numberOfRoomsFrom", "numberOfRoomsTo",
+            "houseType", "objectType"
+        )
 
     # выбрать всю недвижимость
-    @estate_router.get("/api/estate/all", response_model=LimitOffsetPage[EstateIn])
-    async def get_estates(self, db: Session = Depends(get_db)):
+    @estate_router.get("/api/estate/all", response_model=EstatePage[EstateIn])
+    async def get_estates(self, count: Optional[str] = None, fields: Optional[tuple] = Depends(get_estate_fields),
+                          db: AsyncSession = Depends(get_read_db)):
         link = "/api/estate/all"
 
-        estates = self._paginate_(db.query(Estate))
+        estates = await self._paginate_(db, select(Estate), count=count, signature=("all",), fields=fields)
 
         if estates is None:
             resp_json = {"message": "Недвижимость не найдена"}
@@ -410,13 +584,44 @@ class EstateAPI:
         return estates
 
     # выбрать недвижимость где
-    @estate_router.post("/api/estate/where", response_model=LimitOffsetPage[EstateIn])
-    async def get_estates_where(self, data=Body(), db: Session = Depends(get_db)):
+    @estate_router.post("/api/estate/where", response_model=EstatePage[EstateIn])
+    async def get_estates_where(self, data=Body(), count: Optional[str] = None, sort: Optional[str] = None,
+                                fields: Optional[tuple] = Depends(get_estate_fields),
+                                db: AsyncSession = Depends(get_read_db)):
         link = "/api/estates/all/where"
 
-        est = self.get_estates_from_to(data)
+        est = await self.get_estates_from_to(data)
+
+        order = ESTATE_ORDER
+        if sort == "distance" and est is not None:
+            if est.latitude is None:
+                resp_json = {"message": "Для сортировки по расстоянию нужно указать город"}
+                response = JSONResponse(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    content=resp_json
+                )
+                rest_log.post(link=link, func=self.get_estates_where.__name__, response=resp_json)
+                return response
+            order = (distance_km(est.latitude, est.longitude), Estate.estate_id)
+        elif sort not in (None, "date"):
+            resp_json = {"message": "Сортировка возможна только по date или distance"}
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.post(link=link, func=self.get_estates_where.__name__, response=resp_json)
+            return response
 
-        estate_from_to = self.create_condition(est, db.query(Estate))
+        estate_from_to = None
+        if est is not None and estate_columns is not None:
+            estate_from_to = await paginate_columns(
+                db, estate_columns, est, est.radius if est.radius is not None else self.geo_radius, order=sort,
+                rows=ESTATE_FAST_PAGES, fields=fields
+            )
+        elif est is not None:
+            estate_from_to = await self.create_condition(
+                est, db, select(Estate), count=count, order=order, fields=fields
+            )
 
         if estate_from_to == None:
             resp_json = {"message": "Не правильно введен город"}
@@ -440,14 +645,64 @@ class EstateAPI:
 
         return estate_from_to
 
+    # распределения цены и площади, счетчики комнат и типов для фильтров /api/estate/where
+    @estate_router.post("/api/estate/facets", response_class=JSONResponse)
+    async def get_estates_facets(self, data=Body(), db: AsyncSession = Depends(get_read_db)):
+        link = "/api/estate/facets"
+
+        est = await self.get_estates_from_to(data)
+
+        if est is None:
+            resp_json = {"message": "Не правильно введен город"}
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.post(link=link, func=self.get_estates_facets.__name__, response=resp_json)
+            return response
+
+        if estate_columns is not None:
+            radius = est.radius if est.radius is not None else self.geo_radius
+            compute = lambda: run_in_threadpool(
+                lambda: columns_facets(estate_columns.select(est, radius, FACET_COLUMNS))
+            )
+        else:
+            compute = lambda: query_facets(db, self.filter_query(est, select(Estate)))
+
+        facets = await estate_facets.get(filter_signature(est), compute)
+
+        rest_log.post(link=link, func=self.get_estates_facets.__name__, response=facets)
+
+        return facets
+
     # выбрать недвижимость пользователя
-    @estate_router.get("/api/estate/user", response_model=LimitOffsetPage[EstateIn])
-    async def get_user_estate(self, mail: str, db: Session = Depends(get_db)):
+    @estate_router.get("/api/estate/user", response_model=EstatePage[EstateIn])
+    async def get_user_estate(self, mail: str, count: Optional[str] = None,
+                              fields: Optional[tuple] = Depends(get_estate_fields),
+                              db: AsyncSession = Depends(get_read_db)):
         link = f"api/estate/user/{mail}"
 
-        user = db.query(User).filter(User.user_mail == mail).first()
+        user = await db.scalar(select(User).where(User.user_mail == mail))
 
-        user_estates = self._paginate_(db.query(Estate).filter(Estate.user_id == user.user_id))
+        if user is None:
+            resp_json = {"message": "Пользователь не найден"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+
+            rest_log.get(link=link, func=self.get_user_estate.__name__, response=resp_json)
+
+            return response
+
+        user_estates = await self._paginate_(
+            db,
+            select(Estate).where(Estate.user_id == user.user_id),
+            count=count,
+            signature=("user", user.user_id),
+            fields=fields
+        )
 
         if user_estates is None:
             resp_json = {"message": "Недвижимость не найдена"}
@@ -465,23 +720,78 @@ class EstateAPI:
 
         return user_estates
 
+    # выбрать всю недвижимость, постранично по курсору
+    @estate_router.get("/api/estate/all/cursor", response_model=CursorPage[EstateIn])
+    async def get_estates_cursor(self, db: AsyncSession = Depends(get_read_db)):
+        link = "/api/estate/all/cursor"
+
+        estates = await paginate_keyset(db, select(Estate))
+
+        rest_log.get(link=link, func=self.get_estates_cursor.__name__, response=estates.__dict__)
+
+        return estates
+
+    # выбрать недвижимость где, постранично по курсору
+    @estate_router.post("/api/estate/where/cursor", response_model=CursorPage[EstateIn])
+    async def get_estates_where_cursor(self, data=Body(), db: AsyncSession = Depends(get_read_db)):
+        link = "/api/estate/where/cursor"
+
+        est = await self.get_estates_from_to(data)
+
+        if est is None:
+            resp_json = {"message": "Не правильно введен город"}
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.post(link=link, func=self.get_estates_where_cursor.__name__, response=resp_json)
+            return response
+
+        estate_from_to = await paginate_keyset(db, self.filter_query(est, select(Estate)))
+
+        rest_log.post(link=link, func=self.get_estates_where_cursor.__name__, response=estate_from_to.__dict__)
+
+        return estate_from_to
+
+    # выбрать недвижимость пользователя, постранично по курсору
+    @estate_router.get("/api/estate/user/cursor", response_model=CursorPage[EstateIn])
+    async def get_user_estate_cursor(self, mail: str, db: AsyncSession = Depends(get_read_db)):
+        link = f"api/estate/user/cursor/{mail}"
+
+        user = await db.scalar(select(User).where(User.user_mail == mail))
+
+        if user is None:
+            resp_json = {"message": "Пользователь не найден"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+
+            rest_log.get(link=link, func=self.get_user_estate_cursor.__name__, response=resp_json)
+
+            return response
+
+        user_estates = await paginate_keyset(db, select(Estate).where(Estate.user_id == user.user_id))
+
+        rest_log.get(link=link, func=self.get_user_estate_cursor.__name__, response=user_estates.__dict__)
+
+        return user_estates
+
     # добавить недвижимость
     @estate_router.post("/api/estate/user", response_class=JSONResponse)
-    async def create_estate(self, data=Body(), db: Session = Depends(get_db)):
+    async def create_estate(self, data=Body(), db: AsyncSession = Depends(get_db)):
         link = "/api/estate"
 
 
         if ' ' in data['city'] and data['city'][-1] == ' ':
             data['city'] = data['city'][:-1]
-        try:
-            location = geocode(data['city'], provider="nominatim", user_agent='my_request')
-        except:
+        location = await geocoder.geocode(data['city'])
+        if location is None:
             return None
-        point = location.geometry.iloc[0]
-        longitude = point.x
-        latitude = point.y
+        latitude, longitude = location
 
-        user = db.query(User).filter(User.user_mail == data["user_mail"]).first()
+        user = await db.scalar(select(User).where(User.user_mail == data["user_mail"]))
 
         if user is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -495,15 +805,19 @@ class EstateAPI:
 
             return response
 
+        estate_time = datetime.strptime(data["time"], '%H:%M:%S').time()
+
         estate = Estate(
             price=float(data["price"]) / self.MILLION_VALUE,
             address=data["city"],
             year=data["year"],
             month=data["month"],
             day=data["day"],
-            time=datetime.strptime(data["time"], '%H:%M:%S').time(),
+            time=estate_time,
+            listed_at=estate_listed_at(data["year"], data["month"], data["day"], estate_time),
             latitude=float(latitude),
             longitude=float(longitude),
+            geo_cell=geo_cell(latitude, longitude),
             building_type=data["houseType"],
             object_type=data["objectType"],
             levels=data["levels"],
@@ -515,14 +829,111 @@ class EstateAPI:
         )
 
         db.add(estate)
-        db.commit()
-        db.refresh(estate)
+        await db.commit()
+        await db.refresh(estate)
+        estate_counter.invalidate()
+        estate_facets.invalidate()
+        if estate_columns is not None:
+            await run_in_threadpool(estate_columns.refresh, True)
 
         rest_log.post(link=link, func=self.create_estate.__name__, response=estate.__dict__)
 
         return 1
 
-    def create_condition(self, estate_from_to: EstateFomTo, db_query):
+    # массовая загрузка объявлений: тело запроса — CSV с заголовком или NDJSON, читается потоком
+    @estate_router.post("/api/estate/bulk", response_class=JSONResponse)
+    async def create_estates_bulk(self, request: Request, user_mail: Optional[str] = None,
+                                  format: Optional[str] = None, batch_size: int = Query(1000, ge=1, le=10000),
+                                  transaction_size: int = Query(10000, ge=1),
+                                  db: AsyncSession = Depends(get_db)):
+        link = "/api/estate/bulk"
+
+        if format is None:
+            content_type = request.headers.get("content-type", "")
+            format = "ndjson" if "json" in content_type else "csv"
+
+        if format not in INGEST_FORMATS:
+            resp_json = {"message": f"Формат должен быть одним из: {', '.join(INGEST_FORMATS)}"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+
+            rest_log.post(link=link, func=self.create_estates_bulk.__name__, response=resp_json)
+
+            return response
+
+        try:
+            report = await ingest_estates(
+                db, iter_lines(request.stream()), geocoder, user_mail=user_mail, fmt=format,
+                batch_size=batch_size, transaction_size=transaction_size
+            )
+        finally:
+            # часть пачек могла закоммититься и до ошибки
+            estate_counter.invalidate()
+            estate_facets.invalidate()
+            if estate_columns is not None:
+                await run_in_threadpool(estate_columns.refresh, True)
+
+        rest_log.post(link=link, func=self.create_estates_bulk.__name__, response={
+            key: value for key, value in report.items() if key != "errors"
+        })
+
+        return report
+
+    # выгрузка всей таблицы или выборки по фильтрам /api/estate/where потоком NDJSON или CSV
+    @estate_router.get("/api/estate/export")
+    async def get_estates_export(self, request: Request, format: str = "ndjson",
+                                 batch_size: int = Query(1000, ge=1, le=10000)):
+        link = "/api/estate/export"
+
+        data = {name: request.query_params.get(name, "") for name in self.FILTER_FIELDS}
+        try:
+            for name in self.INTEGER_FILTER_FIELDS:
+                if data[name] != "":
+                    data[name] = int(data[name])
+            est = await self.get_estates_from_to(data)
+        except ValueError:
+            est = None
+            resp_json = {"message": "Не правильно заданы фильтры"}
+        else:
+            resp_json = {"message": "Не правильно введен город"}
+
+        if format not in EXPORT_FORMATS:
+            resp_json = {"message": f"Формат должен быть одним из: {', '.join(EXPORT_FORMATS)}"}
+            est = None
+
+        if est is None:
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+            rest_log.get(link=link, func=self.get_estates_export.__name__, response=resp_json)
+            return response
+
+        statement = self.filter_query(est, select(*EXPORT_COLUMNS)).order_by(Estate.estate_id)
+
+        rest_log.get(link=link, func=self.get_estates_export.__name__, response=dict(data, format=format))
+
+        return StreamingResponse(
+            export_estates(AsyncReadSessionLocal, statement, fmt=format, batch_size=batch_size),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f"attachment; filename=estates.{format}"}
+        )
+
+    async def create_condition(self, estate_from_to: EstateFomTo, db, db_query, count=None, order=ESTATE_ORDER,
+                               fields=None):
+        return await self._paginate_(
+            db,
+            self.filter_query(estate_from_to, db_query),
+            count=count,
+            signature=filter_signature(estate_from_to),
+            order=order,
+            fields=fields
+        )
+
+    def filter_query(self, estate_from_to: EstateFomTo, db_query):
 
         all_filters = []
         if estate_from_to.price_from is not None:
@@ -572,33 +983,26 @@ class EstateAPI:
             all_filters.append(Estate.object_type == estate_from_to.object_type)
             # db_query.filter(Estate.object_type == estate_from_to.object_type)
 
-        if estate_from_to.latitude is not None:
-            all_filters.append(Estate.latitude >= (estate_from_to.latitude - self.geo_delta))
-            # db_query.where(Estate.latitude >= (estate_from_to.latitude - self.geo_delta))
-            all_filters.append(Estate.latitude <= (estate_from_to.latitude + self.geo_delta))
-            # db_query.where(Estate.latitude <= (estate_from_to.latitude + self.geo_delta))
-        if estate_from_to.longitude is not None:
-            all_filters.append(Estate.longitude >= (estate_from_to.longitude - self.geo_delta))
-            # db_query.where(Estate.longitude >= (estate_from_to.longitude - self.geo_delta))
-            all_filters.append(Estate.longitude <= (estate_from_to.longitude + self.geo_delta))
-            # db_query.where(Estate.longitude <= (estate_from_to.longitude + self.geo_delta))
-        return self._paginate_(db_query.filter(
+        if estate_from_to.latitude is not None and estate_from_to.longitude is not None:
+            all_filters.extend(radius_filters(
+                estate_from_to.latitude,
+                estate_from_to.longitude,
+                estate_from_to.radius if estate_from_to.radius is not None else self.geo_radius
+            ))
+        return db_query.filter(
             *all_filters
-        ))
+        )
 
-    def get_estates_from_to(self, data):
+    async def get_estates_from_to(self, data):
         longitude = None
         latitude = None
         if self.get_feature(feature_string="city", data=data) is not None:
             if ' ' in data['city'] and data['city'][-1] == ' ':
                 data['city'] = data['city'][:-1]
-            try:
-                location = geocode(data['city'], provider="nominatim", user_agent='my_request')
-            except:
+            location = await geocoder.geocode(data['city'])
+            if location is None:
                 return None
-            point = location.geometry.iloc[0]
-            longitude = point.x
-            latitude = point.y
+            latitude, longitude = location
 
         return EstateFomTo(
             area_from=float(self.get_feature(feature_string="totalAreaFrom", data=data))
@@ -629,7 +1033,8 @@ class EstateAPI:
             building_type=self.get_feature(feature_string="houseType", data=data),
             object_type=self.get_feature(feature_string="objectType", data=data),
             latitude=float(latitude) if latitude is not None else None,
-            longitude=float(longitude) if longitude is not None else None
+            longitude=float(longitude) if longitude is not None else None,
+            radius=float(data["radius"]) if data.get("radius") not in (None, "") else None
         )
 
     def get_feature(self, feature_string, data):
@@ -638,25 +1043,25 @@ class EstateAPI:
         else:
             return data[feature_string]
 
-    def _paginate_(self, db_query):
-        return paginate(db_query
-                        .order_by(asc(Estate.year))
-                        .order_by(asc(Estate.month))
-                        .order_by(asc(Estate.day))
-                        .order_by(asc(Estate.time))
-                        )
+    async def _paginate_(self, db, db_query, count, signature, order=ESTATE_ORDER, fields=None):
+        return await paginate_counted(
+            db, db_query, estate_counter, count or ESTATE_COUNT_MODE, signature, order=order, rows=ESTATE_FAST_PAGES,
+            fields=fields
+        )
 
 
 # favourites rest
 @cbv(favourites_router)
 class FavouritesAPI:
+    def __init__(self):
+        self.MAX_BULK_SIZE = 1000
 
     # Добавить в закладки
     @favourites_router.post("/api/favourites", response_class=JSONResponse)
-    async def create_favourite(self, user_mail: str, estate_id: int, db: Session = Depends(get_db)):
+    async def create_favourite(self, user_mail: str, estate_id: int, db: AsyncSession = Depends(get_db)):
         link = "/api/favourites"
 
-        user_favourite = db.query(User).filter(User.user_mail == user_mail).first()
+        user_favourite = await db.scalar(select(User).where(User.user_mail == user_mail))
 
         if user_favourite is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -676,8 +1081,9 @@ class FavouritesAPI:
         )
 
         db.add(favourite)
-        db.commit()
-        db.refresh(favourite)
+        await db.commit()
+        await db.refresh(favourite)
+        estate_counter.forget(("favourites", user_favourite.user_id))
 
         rest_log.post(link=link, func=self.create_favourite.__name__, response=favourite.__dict__)
 
@@ -685,10 +1091,10 @@ class FavouritesAPI:
 
     # Удалить закладку
     @favourites_router.delete("/api/favourites", response_class=JSONResponse)
-    async def delete_favourite(self, user_mail: str, estate_id: int, db: Session = Depends(get_db)):
+    async def delete_favourite(self, user_mail: str, estate_id: int, db: AsyncSession = Depends(get_db)):
         link = "/api/favourites"
 
-        user_favourite = db.query(User).filter(User.user_mail == user_mail).first()
+        user_favourite = await db.scalar(select(User).where(User.user_mail == user_mail))
 
         if user_favourite is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -702,23 +1108,39 @@ class FavouritesAPI:
 
             return response
 
-        favourite = db.query(Favourites).filter(and_(
+        favourite = await db.scalar(select(Favourites).where(and_(
             Favourites.user_id == user_favourite.user_id,
             Favourites.estate_id == estate_id
-        )).first()
-        db.delete(favourite)
-        db.commit()
+        )))
+
+        if favourite is None:
+            resp_json = {"message": "Закладка не найдена"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+
+            rest_log.delete(link=link, func=self.delete_favourite.__name__, response=resp_json)
+
+            return response
+
+        await db.delete(favourite)
+        await db.commit()
+        estate_counter.forget(("favourites", user_favourite.user_id))
 
         rest_log.delete(link=link, func=self.delete_favourite.__name__, response=favourite.__dict__)
 
         return favourite
 
-    # Выбрать из закладок
-    @favourites_router.get("/api/favourites", response_class=JSONResponse)
-    async def get_favourites_estate(self, mail: str, db: Session = Depends(get_db)):
+    # Выбрать из закладок: одна выборка Estate JOIN Favourites, постранично
+    @favourites_router.get("/api/favourites", response_model=EstatePage[EstateIn])
+    async def get_favourites_estate(self, mail: str, count: Optional[str] = None,
+                                    fields: Optional[tuple] = Depends(get_estate_fields),
+                                    db: AsyncSession = Depends(get_db)):
         link = f"/api/favourites/{mail}"
 
-        user_favourite = db.query(User).filter(User.user_mail == mail).first()
+        user_favourite = await db.scalar(select(User).where(User.user_mail == mail))
 
         if user_favourite is None:
             resp_json = {"message": "Пользователь не найден"}
@@ -732,18 +1154,225 @@ class FavouritesAPI:
 
             return response
 
-        favourites = db.query(Favourites).filter(Favourites.user_id == user_favourite.user_id)
-
-        favourite_estates = []
-        for favourite in favourites:
-            estate_id = favourite.estate_id
-            favourite_estate = db.query(Estate).filter(Estate.estate_id == estate_id).first()
-            favourite_estates.append(favourite_estate)
+        favourite_estates = await paginate_counted(
+            db,
+            select(Estate)
+            .join(Favourites, Favourites.estate_id == Estate.estate_id)
+            .where(Favourites.user_id == user_favourite.user_id),
+            estate_counter,
+            count or "exact",
+            ("favourites", user_favourite.user_id),
+            rows=ESTATE_FAST_PAGES,
+            fields=fields
+        )
 
-        rest_log.get(link=link, func=self.get_favourites_estate.__name__, response=favourite_estates)
+        rest_log.get(link=link, func=self.get_favourites_estate.__name__, response=favourite_estates.__dict__)
 
         return favourite_estates
 
+    # Добавить и удалить много закладок одной транзакцией
+    @favourites_router.post("/api/favourites/bulk", response_class=JSONResponse)
+    async def update_favourites(self, data=Body(), db: AsyncSession = Depends(get_db)):
+        link = "/api/favourites/bulk"
+
+        add_ids = set(data.get("add") or [])
+        remove_ids = set(data.get("remove") or [])
+
+        if len(add_ids) + len(remove_ids) > self.MAX_BULK_SIZE:
+            resp_json = {"message": f"За один запрос можно изменить не больше {self.MAX_BULK_SIZE} закладок"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+
+            rest_log.post(link=link, func=self.update_favourites.__name__, response=resp_json)
+
+            return response
+
+        user_favourite = await db.scalar(select(User).where(User.user_mail == data["user_mail"]))
+
+        if user_favourite is None:
+            resp_json = {"message": "Пользователь не найден"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+
+            rest_log.post(link=link, func=self.update_favourites.__name__, response=resp_json)
+
+            return response
+
+        removed = 0
+        if remove_ids:
+            removed = (await db.execute(delete(Favourites).where(
+                Favourites.user_id == user_favourite.user_id,
+                Favourites.estate_id.in_(remove_ids)
+            ))).rowcount
+
+        added = []
+        add_ids -= remove_ids
+        if add_ids:
+            existing = set((await db.execute(
+                select(Estate.estate_id).where(Estate.estate_id.in_(add_ids))
+            )).scalars())
+            already = set((await db.execute(select(Favourites.estate_id).where(
+                Favourites.user_id == user_favourite.user_id,
+                Favourites.estate_id.in_(existing)
+            ))).scalars()) if existing else set()
+            added = sorted(existing - already)
+            if added:
+                await db.execute(insert(Favourites), [
+                    {"user_id": user_favourite.user_id, "estate_id": estate_id} for estate_id in added
+                ])
+
+        await db.commit()
+        estate_counter.forget(("favourites", user_favourite.user_id))
+
+        resp_json = {"added": len(added), "removed": removed}
+
+        rest_log.post(link=link, func=self.update_favourites.__name__, response=resp_json)
+
+        return resp_json
+
+    # Какие из объявлений страницы в закладках: список true/false в порядке estate_ids
+    @favourites_router.get("/api/favourites/is_favourite", response_class=JSONResponse)
+    async def is_favourite(self, mail: str, estate_ids: List[int] = Query(), db: AsyncSession = Depends(get_db)):
+        link = f"/api/favourites/is_favourite/{mail}"
+
+        if len(estate_ids) > self.MAX_BULK_SIZE:
+            resp_json = {"message": f"За один запрос можно проверить не больше {self.MAX_BULK_SIZE} объявлений"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content=resp_json
+            )
+
+            rest_log.get(link=link, func=self.is_favourite.__name__, response=resp_json)
+
+            return response
+
+        user_favourite = await db.scalar(select(User).where(User.user_mail == mail))
+
+        if user_favourite is None:
+            resp_json = {"message": "Пользователь не найден"}
+
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+
+            rest_log.get(link=link, func=self.is_favourite.__name__, response=resp_json)
+
+            return response
+
+        favourite_ids = set((await db.execute(select(Favourites.estate_id).where(
+            Favourites.user_id == user_favourite.user_id,
+            Favourites.estate_id.in_(set(estate_ids))
+        ))).scalars())
+
+        resp_json = {"is_favourite": [estate_id in favourite_ids for estate_id in estate_ids]}
+
+        rest_log.get(link=link, func=self.is_favourite.__name__, response=resp_json)
+
+        return resp_json
+
+
+# admin rest
+@cbv(admin_router)
+class AdminAPI:
+
+    # статистика микро-батчинга предсказаний
+    @admin_router.get("/api/admin/prediction/batcher", response_class=JSONResponse)
+    async def get_predict_batcher_stats(self):
+        return predict_batcher.stats()
+
+    # кэш total для постраничной выдачи недвижимости
+    @admin_router.get("/api/admin/estate/count", response_class=JSONResponse)
+    async def get_estate_count_stats(self):
+        return estate_counter.stats()
+
+    # попадания и промахи кэша предсказаний
+    @admin_router.get("/api/admin/prediction/cache", response_class=JSONResponse)
+    async def get_predict_cache_stats(self):
+        return predict_cache.stats()
+
+    # кэш фасетов поиска
+    @admin_router.get("/api/admin/estate/facets", response_class=JSONResponse)
+    async def get_estate_facets_stats(self):
+        return estate_facets.stats()
+
+    # пулы соединений: выдача соединений, ожидание, таймауты
+    @admin_router.get("/api/admin/db/pool", response_class=JSONResponse,
+                      dependencies=[Depends(require_profile_token)])
+    async def get_db_pool_stats(self):
+        stats = {"primary": pool_stats(async_engine), "sync": pool_stats(engine)}
+        if async_replica_engine is not async_engine:
+            stats["replica"] = pool_stats(async_replica_engine)
+        return stats
+
+    # состояние колонок объявлений в памяти
+    @admin_router.get("/api/admin/estate/columns", response_class=JSONResponse)
+    async def get_estate_columns_stats(self):
+        if estate_columns is None:
+            return {"engine": ESTATE_SEARCH_ENGINE}
+        return {"engine": ESTATE_SEARCH_ENGINE, **estate_columns.stats()}
+
+    # гистограммы времени по маршрутам и этапам в текстовом формате Prometheus
+    @admin_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_profile_token)])
+    async def get_metrics(self):
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    # сохраненные профили запросов, от новых к старым
+    @admin_router.get("/api/admin/profiles", response_class=JSONResponse,
+                      dependencies=[Depends(require_profile_token)])
+    async def get_profiles(self):
+        return {"enabled": profiling_enabled(), "profiles": await run_in_threadpool(profile_store.list)}
+
+    # профиль в формате collapsed stacks для flamegraph.pl или speedscope
+    @admin_router.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+    async def get_profile(self, profile_id: str):
+        path = profile_store.path(profile_id)
+
+        if path is None or not os.path.exists(path):
+            resp_json = {"message": "Профиль не найден"}
+            response = JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=resp_json
+            )
+            rest_log.get(link=f"/api/admin/profiles/{profile_id}", func=self.get_profile.__name__, response=resp_json)
+            return response
+
+        return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
+
+
+@app.on_event("startup")
+def start_rest_log():
+    rest_log.start()
+
+
+@app.on_event("startup")
+def warn_sampling_without_secret():
+    if sampling_without_secret():
+        logger.warning("PROFILE_SAMPLE_RATE задан без PROFILE_SECRET: профили не пишутся, их некому было бы отдать")
+
+
+@app.on_event("startup")
+def load_estate_columns():
+    if estate_columns is not None:
+        estate_columns.load()
+
+
+@app.on_event("shutdown")
+async def close_geocoder():
+    await geocoder.close()
+
+
+@app.on_event("shutdown")
+def stop_rest_log():
+    rest_log.stop()
+
 
 app.include_router(
     favourites_router,
@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from database_config import Estate
+from geo_index import EARTH_RADIUS_KM, bounding_box
+
+# Float в MySQL — одинарная точность, и float32 хранит значения без потерь; в sqlite и других базах
+# это double, там колонки держатся в float64, иначе границы фильтров режут иначе, чем SQL
+FLOAT_COLUMNS = ("price", "latitude", "longitude", "area", "kitchen_area")
+INT_COLUMNS = ("building_type", "level", "levels", "rooms", "object_type")
+LOADED_COLUMNS = ("estate_id", "listed_at") + FLOAT_COLUMNS + INT_COLUMNS
+# целые колонки хранятся в самом узком типе, вмещающем наблюдаемые min и max
+INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+# таблица Estate в памяти по колонкам numpy, упорядоченная как выдача (listed_at, estate_id).
+# фильтры EstateFomTo считаются булевыми масками, NULL ведет себя как в SQL — не проходит ни одно сравнение
+class EstateColumnStore:
+
+    def __init__(self, bind, refresh_interval=1.0, chunk=100000):
+        self.bind = bind
+        self.refresh_interval = refresh_interval
+        self.chunk = chunk
+        self.float_dtype = np.float32 if bind.dialect.name == "mysql" else np.float64
+        self.columns = {}
+        self.nulls = {}
+        self.max_estate_id = 0
+        self.loaded_at = None
+        self.refreshed_at = 0.0
+        self._stale = True
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.columns.get("estate_id", ()))
+
+    def load(self):
+        with self._lock:
+            self.columns = self._fetch(0)
+            self._split_nulls()
+            self._sort()
+            self.max_estate_id = int(self.columns["estate_id"].max()) if len(self) else 0
+            self.loaded_at = time.time()
+            self.refreshed_at = time.monotonic()
+            self._stale = False
+
+    # догружает строки, вставленные после последней загрузки
+    def refresh(self, force=False):
+        with self._lock:
+            if self._stale:
+                return self.load()
+            if not force and time.monotonic() - self.refreshed_at < self.refresh_interval:
+                return
+
+            self.refreshed_at = time.monotonic()
+            fetched = self._fetch(self.max_estate_id)
+            if not len(fetched["estate_id"]):
+                return
+
+            previous = len(self)
+            columns, nulls = {}, {}
+            for name, array in fetched.items():
+                column = self.columns[name]
+                if name in INT_COLUMNS:
+                    array, new_nulls = self._int_column(name, array)
+                    nulls[name] = np.concatenate([self._column_nulls(name, previous), new_nulls])
+                    # новые значения могут не влезть в прежний тип колонки — расширяем до общего
+                    dtype = np.promote_types(column.dtype, array.dtype)
+                    column, array = column.astype(dtype, copy=False), array.astype(dtype, copy=False)
+                columns[name] = np.concatenate([column, array])
+
+            self.columns, self.nulls = columns, nulls
+            self.max_estate_id = int(fetched["estate_id"].max())
+            self._sort()
+
+    # вставки подхватываются refresh, удаления — только полной перезагрузкой
+    def invalidate(self):
+        self._stale = True
+
+    # возвращает estate_id страницы в порядке выдачи и общее число подходящих объявлений
+    def search(self, estate_from_to, radius_km, order="date", offset=0, limit=50):
+        self.refresh()
+        with self._lock:
+            mask = self.mask(estate_from_to, radius_km)
+
+            matched = np.flatnonzero(mask)
+            if order == "distance":
+                distances = self.distance_km(estate_from_to.latitude, estate_from_to.longitude, matched)
+                matched = matched[np.lexsort((self.columns["estate_id"][matched], distances))]
+
+            page = self.columns["estate_id"][matched[offset:offset + limit]]
+        return page.tolist(), len(matched)
+
+    # значения колонок подходящих объявлений, NULL — nan: дробные в типе хранения (float32 для MySQL),
+    # целые в float64
+    def select(self, estate_from_to, radius_km, names):
+        self.refresh()
+        with self._lock:
+            rows = np.flatnonzero(self.mask(estate_from_to, radius_km))
+
+            selected = {}
+            for name in names:
+                values = self.columns[name][rows]
+                if name not in FLOAT_COLUMNS:
+                    values = values.astype(np.float64)
+                nulls = self.nulls.get(name)
+                if nulls is not None:
+                    values[nulls[rows]] = np.nan
+                selected[name] = values
+        return selected
+
+    def mask(self, estate_from_to, radius_km):
+        mask = np.ones(len(self), dtype=bool)
+
+        self._range(mask, "price", estate_from_to.price_from, estate_from_to.price_to)
+        self._range(mask, "area", estate_from_to.area_from, estate_from_to.area_to)
+        self._range(mask, "kitchen_area", estate_from_to.kitchen_area_from, estate_from_to.kitchen_area_to)
+        self._range(mask, "levels", estate_from_to.levels_from, estate_from_to.levels_to)
+        self._range(mask, "level", estate_from_to.level_from, estate_from_to.level_to)
+        self._range(mask, "rooms", estate_from_to.rooms_from, estate_from_to.rooms_to)
+
+        for name, value in (("building_type", estate_from_to.building_type),
+                            ("object_type", estate_from_to.object_type)):
+            if value is not None and value != -1 and value != -2:
+                self._range(mask, name, value, value)
+
+        if estate_from_to.latitude is not None and estate_from_to.longitude is not None:
+            self._radius(mask, estate_from_to.latitude, estate_from_to.longitude, radius_km)
+
+        return mask
+
+    def distance_km(self, latitude, longitude, rows):
+        row_latitude = np.radians(self.columns["latitude"][rows].astype(np.float64))
+        row_longitude = np.radians(self.columns["longitude"][rows].astype(np.float64))
+        latitude, longitude = math.radians(latitude), math.radians(longitude)
+
+        half_chord = (
+            np.sin((row_latitude - latitude) / 2) ** 2
+            + math.cos(latitude) * np.cos(row_latitude) * np.sin((row_longitude - longitude) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(half_chord, 1.0)))
+
+    def stats(self):
+        return {
+            "rows": len(self),
+            "max_estate_id": self.max_estate_id,
+            "loaded_at": self.loaded_at,
+            "memory_mb": sum(array.nbytes for array in self.columns.values()) / 2 ** 20
+        }
+
+    def _range(self, mask, name, value_from, value_to):
+        if value_from is None and value_to is None:
+            return
+
+        # границы сравниваются в float64, как это делает MySQL для колонок FLOAT и sqlite для REAL
+        column = self.columns[name]
+        if value_from is not None:
+            mask &= column >= np.float64(value_from)
+        if value_to is not None:
+            mask &= column <= np.float64(value_to)
+
+        nulls = self.nulls.get(name)
+        if nulls is not None:
+            mask &= ~nulls
+
+    def _radius(self, mask, latitude, longitude, radius_km):
+        delta_latitude, delta_longitude = bounding_box(latitude, longitude, radius_km)
+        mask &= np.abs(self.columns["latitude"] - latitude) <= delta_latitude
+        if delta_longitude < 180.0:
+            longitude_delta = np.abs(self.columns["longitude"] - longitude)
+            mask &= np.minimum(longitude_delta, 360 - longitude_delta) <= delta_longitude
+
+        candidates = np.flatnonzero(mask)
+        mask[candidates] = self.distance_km(latitude, longitude, candidates) <= radius_km
+
+    def _fetch(self, after_estate_id):
+        query = (
+            select(*[getattr(Estate, name) for name in LOADED_COLUMNS])
+            .where(Estate.estate_id > after_estate_id)
+            .order_by(Estate.estate_id)
+        )
+
+        parts = {name: [] for name in LOADED_COLUMNS}
+        with self.bind.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+            while True:
+                rows = result.fetchmany(self.chunk)
+                if not rows:
+                    break
+                for name, values in zip(LOADED_COLUMNS, zip(*rows)):
+                    parts[name].append(self._to_array(name, values))
+
+        return {
+            name: np.concatenate(arrays) if arrays else self._to_array(name, ())
+            for name, arrays in parts.items()
+        }
+
+    def _to_array(self, name, values):
+        if name == "estate_id":
+            return np.array(values, dtype=np.int64)
+        if name == "listed_at":
+            return np.array(values, dtype="datetime64[s]").astype(np.int64)
+        # NULL превращается в nan, для целых колонок он потом уходит в маску nulls
+        if name in FLOAT_COLUMNS:
+            return np.array(values, dtype=self.float_dtype)
+        # float64 хранит целые до 2**53 точно, float32 начал бы округлять уже после 2**24
+        return np.array(values, dtype=np.float64)
+
+    def _split_nulls(self):
+        self.nulls = {}
+        for name in INT_COLUMNS:
+            self.columns[name], nulls = self._int_column(name, self.columns[name])
+            if nulls.any():
+                self.nulls[name] = nulls
+
+    @staticmethod
+    def _int_column(name, array):
+        nulls = np.isnan(array)
+        values = array[~nulls]
+        low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+        for dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return np.where(nulls, 0, array).astype(dtype), nulls
+        raise ValueError(f"{name}: значения {low}..{high} не помещаются в int64")
+
+    def _column_nulls(self, name, size):
+        nulls = self.nulls.get(name)
+        return nulls if nulls is not None else np.zeros(size, dtype=bool)
+
+    def _sort(self):
+        order = np.lexsort((self.columns["estate_id"], self.columns["listed_at"]))
+        if np.all(order[1:] > order[:-1]):
+            return
+        self.columns = {name: array[order] for name, array in self.columns.items()}
+        self.nulls = {name: nulls[order] for name, nulls in self.nulls.items()}
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import date, time
+
+from database_config import Estate
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+EXPORT_COLUMNS = tuple(Estate.__table__.columns)
+
+
+def _plain(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+class NdjsonEncoder:
+    header = None
+
+    def __init__(self, names):
+        self.names = names
+
+    def encode(self, rows):
+        return "".join(
+            json.dumps(dict(zip(self.names, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows
+        ).encode()
+
+
+class CsvEncoder:
+
+    def __init__(self, names):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+        self.header = self.encode([names])
+
+    def encode(self, rows):
+        self.writer.writerows([["" if value is None else _plain(value) for value in row] for row in rows])
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+# строки выборки кусками по batch_size через курсор на стороне сервера (stream_results):
+# в памяти только текущий кусок, а следующий читается, когда предыдущий ушел клиенту,
+# так что медленный клиент тормозит чтение из базы, а не копит ответ в памяти
+async def export_estates(session_factory, statement, fmt="ndjson", batch_size=1000):
+    encoder = (CsvEncoder if fmt == "csv" else NdjsonEncoder)([column.name for column in EXPORT_COLUMNS])
+    if encoder.header is not None:
+        yield encoder.header
+
+    async with session_factory() as session:
+        result = await session.stream(statement.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            yield encoder.encode(rows)
@@ -0,0 +1,181 @@
+import numpy as np
+from sqlalchemy import and_, case, func, select
+
+from database_config import Estate
+from lru import LruCache
+
+FACET_COLUMNS = ("price", "area", "rooms", "building_type", "object_type")
+COUNTED_COLUMNS = ("rooms", "building_type", "object_type")
+
+# левые границы корзин гистограмм, последняя корзина открыта справа; цена в миллионах, как в Estate.price
+PRICE_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+AREA_BUCKETS = (0, 20, 30, 40, 50, 60, 80, 100, 120, 150, 200)
+
+
+# float32 из колонок MySQL — кратчайшей десятичной записью (3.7, а не 3.700000047683716),
+# так же, как значение отдает сама база
+def decimal_float(value):
+    return float(str(value))
+
+
+def median_of(lower, upper):
+    return (decimal_float(lower) + decimal_float(upper)) / 2
+
+
+def buckets(edges, counts):
+    return [
+        {"from": float(edges[i]), "to": float(edges[i + 1]) if i + 1 < len(edges) else None, "count": int(counts[i])}
+        for i in range(len(edges))
+    ]
+
+
+# условие i-й корзины: значения ниже первой границы попадают в первую, выше последней — в последнюю
+def bucket_condition(column, edges, i):
+    conditions = []
+    if i > 0:
+        conditions.append(column >= edges[i])
+    if i + 1 < len(edges):
+        conditions.append(column < edges[i + 1])
+    return and_(*conditions)
+
+
+# фасеты считает база за один проход по отфильтрованным строкам: выборка сгруппирована по
+# rooms, building_type и object_type (групп — десятки), в каждой группе COUNT, MIN/MAX(price) и корзины
+# через SUM(CASE ...); счетчики и корзины складываются из групп в Python. Медиане нужна сортировка,
+# ее дает вторая выборка — одна-две строки из корзин цены, в которые попала середина
+async def query_facets(session, statement):
+    rows = statement.with_only_columns(*[getattr(Estate, name) for name in FACET_COLUMNS]).order_by(None).subquery()
+    price, area = rows.c.price, rows.c.area
+    counted = [rows.c[name] for name in COUNTED_COLUMNS]
+
+    groups = (await session.execute(select(
+        *counted,
+        func.count(),
+        func.count(price),
+        func.min(price),
+        func.max(price),
+        *[func.sum(case((bucket_condition(price, PRICE_BUCKETS, i), 1), else_=0)) for i in range(len(PRICE_BUCKETS))],
+        *[func.sum(case((bucket_condition(area, AREA_BUCKETS, i), 1), else_=0)) for i in range(len(AREA_BUCKETS))]
+    ).group_by(*counted))).all()
+
+    total = priced = 0
+    price_min = price_max = None
+    price_counts = [0] * len(PRICE_BUCKETS)
+    area_counts = [0] * len(AREA_BUCKETS)
+    value_counts = {name: {} for name in COUNTED_COLUMNS}
+    keys = len(COUNTED_COLUMNS)
+    for group in groups:
+        count, count_priced, group_min, group_max = group[keys:keys + 4]
+        sums = group[keys + 4:]
+        total += count
+        if count_priced:
+            priced += count_priced
+            price_min = group_min if price_min is None else min(price_min, group_min)
+            price_max = group_max if price_max is None else max(price_max, group_max)
+        for i, bucket_count in enumerate(sums[:len(PRICE_BUCKETS)]):
+            price_counts[i] += bucket_count
+        for i, bucket_count in enumerate(sums[len(PRICE_BUCKETS):]):
+            area_counts[i] += bucket_count
+        for name, value in zip(COUNTED_COLUMNS, group[:keys]):
+            if value is not None:
+                value_counts[name][int(value)] = value_counts[name].get(int(value), 0) + count
+
+    median = None
+    if priced:
+        median = median_of(*await query_median(session, price, price_counts, priced))
+
+    facets = {
+        "total": total,
+        "price": {
+            "min": float(price_min) if priced else None,
+            "max": float(price_max) if priced else None,
+            "median": median,
+            "buckets": buckets(PRICE_BUCKETS, price_counts)
+        },
+        "area": {"buckets": buckets(AREA_BUCKETS, area_counts)}
+    }
+    for name in COUNTED_COLUMNS:
+        facets[name] = {str(value): count for value, count in sorted(value_counts[name].items())}
+
+    return facets
+
+
+# два средних значения цены (или одно, повторенное): сортируются только строки корзин,
+# в которые попали средние позиции, смещение считается внутри них
+async def query_median(session, price, price_counts, priced):
+    lower, upper = (priced - 1) // 2, priced // 2
+    starts = np.cumsum((0,) + tuple(price_counts))
+    first = int(np.searchsorted(starts, lower, side="right")) - 1
+    last = int(np.searchsorted(starts, upper, side="right")) - 1
+
+    conditions = [price.isnot(None)]
+    if first > 0:
+        conditions.append(price >= PRICE_BUCKETS[first])
+    if last + 1 < len(PRICE_BUCKETS):
+        conditions.append(price < PRICE_BUCKETS[last + 1])
+
+    middle = (await session.execute(
+        select(price).where(*conditions).order_by(price).offset(lower - int(starts[first])).limit(upper - lower + 1)
+    )).scalars().all()
+    return middle[0], middle[-1]
+
+
+def histogram(values, edges):
+    edges = np.asarray(edges, dtype=np.float64)
+    indexes = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 1)
+    return buckets(edges, np.bincount(indexes, minlength=len(edges)))
+
+
+def value_counts(values):
+    values, counts = np.unique(values, return_counts=True)
+    return {str(int(value)): int(count) for value, count in zip(values, counts)}
+
+
+# те же фасеты по колонкам EstateColumnStore.select, NULL — nan
+def columns_facets(columns):
+    present = {name: values[~np.isnan(values)] for name, values in columns.items()}
+    price = present["price"]
+
+    median = None
+    if len(price):
+        middle = np.partition(price, [(len(price) - 1) // 2, len(price) // 2])
+        median = median_of(middle[(len(price) - 1) // 2], middle[len(price) // 2])
+
+    facets = {
+        "total": len(columns["price"]),
+        "price": {
+            "min": decimal_float(price.min()) if len(price) else None,
+            "max": decimal_float(price.max()) if len(price) else None,
+            "median": median,
+            "buckets": histogram(price, PRICE_BUCKETS)
+        },
+        "area": {"buckets": histogram(present["area"], AREA_BUCKETS)}
+    }
+    for name in COUNTED_COLUMNS:
+        facets[name] = value_counts(present[name])
+
+    return facets
+
+
+# фасеты по сигнатуре фильтра, живут ttl секунд и сбрасываются при вставке;
+# compute — корутина, которая считает их на промахе
+class EstateFacets:
+
+    def __init__(self, ttl=60, maxsize=256):
+        self.cache = LruCache(maxsize=maxsize, ttl=ttl)
+        self.generation = 0
+
+    async def get(self, signature, compute):
+        key = (self.generation, signature)
+        facets = self.cache.get(key)
+        if facets is None:
+            facets = await compute()
+            self.cache.put(key, facets)
+        return facets
+
+    def invalidate(self):
+        self.generation += 1
+        self.cache.clear()
+
+    def stats(self):
+        return dict(self.cache.stats(), ttl=self.cache.ttl, generation=self.generation)
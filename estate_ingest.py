@@ -0,0 +1,325 @@
+# массовая загрузка объявлений из CSV или NDJSON (по объекту JSON в строке), поля те же, что у POST /api/estate/user
+#   python estate_ingest.py feed.csv --user-mail partner@mail.ru [--format csv] [--batch-size 1000] [--transaction-size 10000]
+# строки читаются потоком и проверяются пачками по batch_size, каждый город пачки геокодируется один раз,
+# пачка пишется одним executemany, commit — раз в transaction_size строк
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from database_config import Estate, User, estate_listed_at
+from geo_index import geo_cell
+
+MILLION_VALUE = 1000000
+
+ESTATE_FIELDS = (
+    "price", "city", "year", "month", "day", "time", "houseType", "objectType",
+    "levels", "level", "numberOfRooms", "totalArea", "kitchenArea"
+)
+
+INGEST_FORMATS = ("csv", "ndjson")
+
+# в отчет попадают только первые ошибки, остальные просто считаются
+MAX_REPORTED_ERRORS = 100
+
+
+class RowError(ValueError):
+    pass
+
+
+# строки текста из потока байтов, куски могут резать строку и символ utf-8 посередине
+async def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def file_chunks(file, size=1 << 16):
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+# остается ли открытой кавычка в конце строки CSV: кавычка открывает поле только в его начале,
+# закрывает — внутри поля, а сразу за закрывающей означает "" и поле продолжается
+def ends_in_quotes(line, in_quotes=False):
+    if '"' not in line:
+        return in_quotes
+
+    at_field_start = not in_quotes
+    just_closed = False
+    for char in line:
+        if char == '"' and (in_quotes or at_field_start or just_closed):
+            in_quotes = not in_quotes
+            just_closed = not in_quotes
+        else:
+            just_closed = False
+        at_field_start = not in_quotes and char == ","
+    return in_quotes
+
+
+# пачки (номер строки, dict или RowError) по batch_size строк; запись CSV может занимать несколько
+# строк файла (перевод строки в кавычках), номер — первой из них
+async def iter_batches(lines, fmt, batch_size):
+    header = None
+    batch = []
+    line_number = 0
+
+    # один csv.reader на весь поток: строки записи копятся в pending, и запись читается,
+    # только когда кавычки в ней закрыты, так что reader никогда не ждет следующую строку
+    pending = deque()
+    reader = csv.reader(iter(pending.popleft, None))
+    in_quotes = False
+    record_line = 0
+
+    async for line in lines:
+        line_number += 1
+
+        if fmt == "csv":
+            if not in_quotes:
+                if not line.strip():
+                    continue
+                record_line = line_number
+            pending.append(line + "\n")
+            in_quotes = ends_in_quotes(line, in_quotes)
+            if in_quotes:
+                continue
+
+            values = next(reader)
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                row = RowError(f"expected {len(header)} columns, got {len(values)}")
+            else:
+                row = dict(zip(header, values))
+            batch.append((record_line, row))
+        else:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = RowError(f"invalid json: {error}")
+            else:
+                if not isinstance(row, dict):
+                    row = RowError("expected json object")
+            batch.append((line_number, row))
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if in_quotes:
+        batch.append((record_line, RowError("unterminated quoted field")))
+    if batch:
+        yield batch
+
+
+def _integer(data, name):
+    try:
+        return int(data[name])
+    except (TypeError, ValueError):
+        raise RowError(f"{name}: expected integer, got {data[name]!r}")
+
+
+def _number(data, name):
+    try:
+        return float(data[name])
+    except (TypeError, ValueError):
+        raise RowError(f"{name}: expected number, got {data[name]!r}")
+
+
+def city_name(data):
+    return str(data.get("city") or "").strip()
+
+
+# значения для insert(Estate), как их записал бы create_estate
+def estate_values(data, location, user_id):
+    missing = [name for name in ESTATE_FIELDS if data.get(name) in (None, "")]
+    if missing:
+        raise RowError(f"missing fields: {', '.join(missing)}")
+
+    try:
+        estate_time = datetime.strptime(str(data["time"]).strip(), "%H:%M:%S").time()
+    except ValueError:
+        raise RowError(f"time: expected HH:MM:SS, got {data['time']!r}")
+
+    year, month, day = _integer(data, "year"), _integer(data, "month"), _integer(data, "day")
+    try:
+        listed_at = estate_listed_at(year, month, day, estate_time)
+    except ValueError as error:
+        raise RowError(f"date: {error}")
+
+    if location is None:
+        raise RowError(f"city not found: {city_name(data)!r}")
+    latitude, longitude = float(location[0]), float(location[1])
+
+    return {
+        "price": _number(data, "price") / MILLION_VALUE,
+        "address": city_name(data),
+        "year": year,
+        "month": month,
+        "day": day,
+        "time": estate_time,
+        "listed_at": listed_at,
+        "latitude": latitude,
+        "longitude": longitude,
+        "geo_cell": geo_cell(latitude, longitude),
+        "building_type": _integer(data, "houseType"),
+        "object_type": _integer(data, "objectType"),
+        "levels": _integer(data, "levels"),
+        "level": _integer(data, "level"),
+        "rooms": _integer(data, "numberOfRooms"),
+        "area": _number(data, "totalArea"),
+        "kitchen_area": _number(data, "kitchenArea"),
+        "user_id": user_id
+    }
+
+
+class IngestReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+        self.cities = 0
+        self.started = time.perf_counter()
+
+    def reject(self, line_number, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": str(error)})
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "cities": self.cities,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(self.inserted / seconds, 1) if seconds > 0 else 0.0,
+            "errors": sorted(self.errors, key=lambda error: error["line"])
+        }
+
+
+# города пачки без повторов, не больше concurrency запросов к геокодеру одновременно
+async def geocode_cities(geocoder, cities, concurrency=8):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(city):
+        async with semaphore:
+            return city, await geocoder.geocode(city)
+
+    return dict(await asyncio.gather(*[one(city) for city in cities]))
+
+
+async def ingest_estates(session, lines, geocoder, user_mail=None, fmt="csv",
+                         batch_size=1000, transaction_size=10000, geocode_concurrency=8):
+    if fmt not in INGEST_FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {', '.join(INGEST_FORMATS)}")
+
+    report = IngestReport()
+    user_ids = {}
+    known_cities = set()
+    uncommitted = 0
+
+    async for batch in iter_batches(lines, fmt, batch_size):
+        report.rows += len(batch)
+        rows = []
+        for line_number, data in batch:
+            if isinstance(data, RowError):
+                report.reject(line_number, data)
+            else:
+                rows.append((line_number, data))
+
+        # у строки может быть свой user_mail, иначе объявление достается user_mail загрузки
+        mails = {data.get("user_mail") or user_mail for _, data in rows} - set(user_ids) - {None}
+        if mails:
+            result = await session.execute(select(User.user_mail, User.user_id).where(User.user_mail.in_(mails)))
+            user_ids.update(dict.fromkeys(mails))
+            user_ids.update(dict(result.all()))
+
+        cities = {city_name(data) for _, data in rows} - {""}
+        locations = await geocode_cities(geocoder, cities, concurrency=geocode_concurrency)
+        report.cities += len(cities - known_cities)
+        known_cities |= cities
+
+        values = []
+        for line_number, data in rows:
+            mail = data.get("user_mail") or user_mail
+            try:
+                if user_ids.get(mail) is None:
+                    raise RowError(f"user not found: {mail!r}")
+                values.append(estate_values(data, locations.get(city_name(data)), user_ids[mail]))
+            except RowError as error:
+                report.reject(line_number, error)
+
+        if values:
+            await session.execute(insert(Estate), values)
+            report.inserted += len(values)
+            uncommitted += len(values)
+
+        if uncommitted >= transaction_size:
+            await session.commit()
+            uncommitted = 0
+
+    await session.commit()
+    return report.as_dict()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="файл CSV или NDJSON, - для stdin")
+    parser.add_argument("--user-mail", help="владелец строк без своего user_mail")
+    parser.add_argument("--format", choices=INGEST_FORMATS, help="по умолчанию по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--transaction-size", type=int, default=10000)
+    parser.add_argument("--geocode-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    from database_config import AsyncSessionLocal
+    from geo_cache import AsyncGeocoder, GeoCache
+
+    geo_cache = GeoCache()
+    geo_cache.warm()
+    geocoder = AsyncGeocoder(geo_cache)
+
+    file = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        async with AsyncSessionLocal() as session:
+            report = await ingest_estates(
+                session, iter_lines(file_chunks(file)), geocoder,
+                user_mail=args.user_mail, fmt=fmt, batch_size=args.batch_size,
+                transaction_size=args.transaction_size, geocode_concurrency=args.geocode_concurrency
+            )
+    finally:
+        if file is not sys.stdin.buffer:
+            file.close()
+        await geocoder.close()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
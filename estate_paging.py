@@ -0,0 +1,259 @@
+import binascii
+import json
+from datetime import datetime
+from typing import Generic, Optional, TypeVar
+
+import orjson
+from fastapi import HTTPException
+from fastapi_pagination import LimitOffsetPage, create_page
+from fastapi_pagination.types import GreaterEqualZero
+from fastapi_pagination.utils import verify_params
+from sqlalchemy import func, select, text, tuple_
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+import starlette.status as status
+
+from database_config import Estate, EstateIn
+from lru import LruCache
+from metrics import metrics
+
+T = TypeVar("T")
+
+COUNT_MODES = ("exact", "cached", "estimate", "none")
+
+# порядок выдачи объявлений; estate_id делает его однозначным
+ESTATE_ORDER = (Estate.listed_at, Estate.estate_id)
+
+
+def encode_estate_cursor(estate):
+    return json.dumps([estate.listed_at.isoformat(), estate.estate_id])
+
+
+def decode_estate_cursor(cursor):
+    try:
+        listed_at, estate_id = json.loads(cursor)
+        return datetime.fromisoformat(listed_at), int(estate_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# keyset-пагинация: следующая страница начинается строго после последней строки
+# предыдущей, поэтому страница N стоит столько же, сколько первая
+async def paginate_keyset(session, statement, params=None):
+    try:
+        params, raw_params = verify_params(params, "cursor")
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if raw_params.cursor:
+        statement = statement.filter(tuple_(*ESTATE_ORDER) > tuple_(*decode_estate_cursor(raw_params.cursor)))
+
+    items = (await session.execute(statement.order_by(*ESTATE_ORDER).limit(raw_params.size + 1))).scalars().all()
+
+    has_next = len(items) > raw_params.size
+    items = items[:raw_params.size]
+    next_ = encode_estate_cursor(items[-1]) if has_next and items else None
+
+    return create_page(items, params=params, next_=next_)
+
+
+# страница limit/offset, у которой total может отсутствовать (count=none)
+class EstatePage(LimitOffsetPage[T], Generic[T]):
+    total: Optional[GreaterEqualZero]
+
+
+# поля EstateIn в порядке модели: быстрая страница выбирает только их колонки
+ESTATE_IN_FIELDS = tuple(EstateIn.__fields__)
+
+
+# ?fields=price,rooms,area,address — проекция страницы: поля EstateIn в порядке модели,
+# None — все поля; неизвестное или пустое поле — ValueError
+def parse_estate_fields(fields):
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",")}
+    if not names or not names <= set(ESTATE_IN_FIELDS):
+        raise ValueError(fields)
+    return tuple(name for name in ESTATE_IN_FIELDS if name in names)
+
+
+def estate_field_columns(fields):
+    return tuple(getattr(Estate, name) for name in fields)
+
+
+# готовый JSON страницы EstatePage[EstateIn] из кортежей строк: без ORM-объектов и проверки
+# каждой строки моделью, байт в байт как ответ FastAPI (компактный JSON, time в isoformat)
+class EstatePageResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, rows, total, limit, offset, fields=ESTATE_IN_FIELDS):
+        self.items = rows
+        self.total = total
+        with metrics.stage("encode"):
+            super().__init__(orjson.dumps({
+                "items": [dict(zip(fields, row)) for row in rows],
+                "total": total,
+                "limit": limit,
+                "offset": offset
+            }))
+
+
+def verify_count_mode(mode):
+    if mode not in COUNT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown count mode: {mode}, expected one of {COUNT_MODES}"
+        )
+
+
+def filter_signature(estate_from_to):
+    return tuple(sorted(
+        (name, round(value, 4) if isinstance(value, float) else value)
+        for name, value in vars(estate_from_to).items()
+    ))
+
+
+# как считать total для страницы:
+#   exact    — COUNT(*) на каждый запрос
+#   cached   — COUNT(*) по сигнатуре фильтра, живет ttl секунд и сбрасывается при вставке
+#   estimate — размер таблицы из статистики, для фильтров — доля совпадений в выборке по estate_id;
+#              выборки с JOIN (закладки) считаются точно: доля по окнам Estate для них не имеет смысла
+#   none     — total не считается вообще
+class EstateCounter:
+
+    def __init__(self, ttl=60, maxsize=1024, sample_size=20000, sample_windows=4):
+        self.cache = LruCache(maxsize=maxsize, ttl=ttl)
+        self.sample_size = sample_size
+        self.sample_windows = sample_windows
+        self.generation = 0
+
+    async def count(self, session, statement, mode, signature):
+        verify_count_mode(mode)
+
+        if mode == "none":
+            return None
+        if mode == "exact":
+            return await self.exact(session, statement)
+        if mode == "cached":
+            return await self._cached(("exact", self.generation, signature), lambda: self.exact(session, statement))
+        return await self._cached(("estimate", self.generation, signature), lambda: self.estimate(session, statement))
+
+    def invalidate(self):
+        self.generation += 1
+        self.cache.clear()
+
+    # сбросить total одной выборки (закладки пользователя), не трогая остальные
+    def forget(self, signature):
+        for mode in ("exact", "estimate"):
+            self.cache.pop((mode, self.generation, signature))
+
+    @staticmethod
+    async def exact(session, statement):
+        return await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+
+    async def estimate(self, session, statement):
+        if statement.get_final_froms() != [Estate.__table__]:
+            return await self.exact(session, statement)
+
+        table_rows = await self.table_rows(session)
+        if statement.whereclause is None:
+            return table_rows
+        if table_rows <= self.sample_size:
+            return await self.exact(session, statement)
+
+        min_id, max_id = (await session.execute(select(func.min(Estate.estate_id), func.max(Estate.estate_id)))).one()
+        window = self.sample_size // self.sample_windows
+        step = max(max_id - min_id - window, 0) // max(self.sample_windows - 1, 1)
+
+        sampled, matched = 0, 0
+        for i in range(self.sample_windows):
+            start = min_id + i * step
+            in_window = Estate.estate_id.between(start, start + window - 1)
+            sampled += await session.scalar(select(func.count()).select_from(Estate).where(in_window))
+            matched += await session.scalar(
+                select(func.count()).select_from(statement.order_by(None).where(in_window).subquery())
+            )
+
+        return round(matched / sampled * table_rows) if sampled else 0
+
+    async def table_rows(self, session):
+        if session.get_bind().dialect.name == "mysql":
+            table_rows = await session.scalar(text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name"
+            ), {"table_name": Estate.__tablename__})
+            if table_rows is not None:
+                return table_rows
+
+        return await session.scalar(select(func.max(Estate.estate_id))) or 0
+
+    def stats(self):
+        return dict(self.cache.stats(), ttl=self.cache.ttl, generation=self.generation)
+
+    async def _cached(self, key, count):
+        total = self.cache.get(key)
+        if total is None:
+            total = await count()
+            self.cache.put(key, total)
+        return total
+
+
+# rows=True — страница сразу EstatePageResponse из колонок EstateIn, иначе EstatePage с ORM-объектами;
+# fields — проекция из parse_estate_fields, с ней страница всегда из кортежей колонок
+async def paginate_counted(session, statement, counter, mode, signature, order=ESTATE_ORDER, params=None,
+                           rows=False, fields=None):
+    params, raw_params = verify_params(params, "limit-offset")
+    # режим проверяется до страницы: неполная страница total не считает, но ?count=bogus и ей — 400
+    verify_count_mode(mode)
+
+    rows = rows or fields is not None
+    fields = fields or ESTATE_IN_FIELDS
+    page_statement = statement.with_only_columns(*estate_field_columns(fields)) if rows else statement
+    with metrics.stage("page"):
+        result = await session.execute(
+            page_statement.order_by(*order).limit(raw_params.limit).offset(raw_params.offset)
+        )
+        items = result.all() if rows else result.scalars().all()
+
+    # неполная страница сама говорит, сколько всего строк
+    if len(items) < raw_params.limit and (items or raw_params.offset == 0):
+        total = raw_params.offset + len(items)
+    else:
+        with metrics.stage("count"):
+            total = await counter.count(session, statement, mode, signature)
+
+    if rows:
+        return EstatePageResponse(items, total, raw_params.limit, raw_params.offset, fields)
+    return create_page(items, total, params)
+
+
+# страница по номерам из EstateColumnStore: фильтр и порядок уже посчитаны в памяти,
+# из базы достаем только строки страницы по первичному ключу
+async def paginate_columns(session, store, estate_from_to, radius_km, order="date", params=None, rows=False,
+                           fields=None):
+    params, raw_params = verify_params(params, "limit-offset")
+
+    # маски считаются в пуле потоков: numpy отпускает GIL, а refresh ходит в базу синхронно
+    estate_ids, total = await run_in_threadpool(
+        store.search, estate_from_to, radius_km, order=order, offset=raw_params.offset, limit=raw_params.limit
+    )
+
+    if rows or fields is not None:
+        fields = fields or ESTATE_IN_FIELDS
+        # estate_id первой колонкой нужен для порядка страницы, в ответ он идет, только если есть в fields
+        found = {
+            row[0]: row[1:]
+            for row in await session.execute(
+                select(Estate.estate_id, *estate_field_columns(fields)).where(Estate.estate_id.in_(estate_ids))
+            )
+        }
+        items = [found[estate_id] for estate_id in estate_ids if estate_id in found]
+        return EstatePageResponse(items, total, raw_params.limit, raw_params.offset, fields)
+
+    found = {
+        estate.estate_id: estate
+        for estate in (await session.execute(select(Estate).where(Estate.estate_id.in_(estate_ids)))).scalars()
+    }
+    items = [found[estate_id] for estate_id in estate_ids if estate_id in found]
+
+    return create_page(items, total, params)
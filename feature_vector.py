@@ -0,0 +1,65 @@
+import numpy as np
+
+# порядок колонок, на которых обучалась xgb_model.json (в самом файле имена не сохранены)
+DEFAULT_FEATURE_NAMES = (
+    "latitude",
+    "longitude",
+    "region",
+    "building_type",
+    "level",
+    "levels",
+    "rooms",
+    "area",
+    "kitchen_area",
+    "object_type",
+    "year",
+    "month",
+    "day"
+)
+
+# эти признаки модель видела целыми, дробные значения (например, средние) отбрасываются
+INTEGER_FEATURES = frozenset((
+    "region",
+    "building_type",
+    "level",
+    "levels",
+    "rooms",
+    "object_type",
+    "year",
+    "month",
+    "day"
+))
+
+
+def model_feature_names(model):
+    feature_names = getattr(model, "feature_names", None)
+    if feature_names is None and hasattr(model, "get_booster"):
+        feature_names = model.get_booster().feature_names
+    return feature_names
+
+
+# строит float32-матрицу признаков в порядке колонок модели прямо из словарей
+class FeatureSchema:
+
+    def __init__(self, feature_names=None):
+        self.names = tuple(feature_names or DEFAULT_FEATURE_NAMES)
+
+        unknown = set(self.names) - set(DEFAULT_FEATURE_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown model features: {sorted(unknown)}")
+
+        self.size = len(self.names)
+        self.integer = np.array([name in INTEGER_FEATURES for name in self.names])
+
+    def empty(self, rows):
+        return np.empty((rows, self.size), dtype=np.float32)
+
+    def build(self, rows, out=None):
+        if out is None:
+            out = self.empty(len(rows))
+
+        for i, row in enumerate(rows):
+            out[i] = [float(row[name]) for name in self.names]
+
+        np.trunc(out, out=out, where=self.integer)
+        return out
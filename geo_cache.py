@@ -0,0 +1,180 @@
+import asyncio
+import csv
+import os
+import sqlite3
+import threading
+
+import aiohttp
+from starlette.concurrency import run_in_threadpool
+
+from lru import LruCache
+from metrics import metrics
+
+GEO_CACHE_PATH = "geo_cache.db"
+GAZETTEER_PATH = "gazetteer.csv"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+
+
+def normalize_city(city):
+    return " ".join(city.split()).casefold().replace("ё", "е")
+
+
+# координаты городов: LRU в памяти поверх sqlite-файла, который переживает рестарт
+class GeoCache:
+
+    def __init__(self, path=GEO_CACHE_PATH, maxsize=4096):
+        self.memory = LruCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            "city TEXT PRIMARY KEY, "
+            "latitude REAL NOT NULL, "
+            "longitude REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, city):
+        location = self.memory.get(normalize_city(city))
+        if location is not None:
+            return location
+        return self.load(city)
+
+    # только sqlite-файл, без LRU: для тех, кто уже сам посмотрел память и посчитал промах
+    def load(self, city):
+        key = normalize_city(city)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT latitude, longitude FROM geocode WHERE city = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        self.memory.put(key, row)
+        return row
+
+    def put(self, city, latitude, longitude):
+        key = normalize_city(city)
+        location = (float(latitude), float(longitude))
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode (city, latitude, longitude) VALUES (?, ?, ?)",
+                (key, location[0], location[1])
+            )
+            self._db.commit()
+
+        self.memory.put(key, location)
+        return location
+
+    def warm(self, gazetteer_path=GAZETTEER_PATH):
+        if gazetteer_path is not None and os.path.exists(gazetteer_path):
+            with open(gazetteer_path, encoding="utf-8", newline="") as gazetteer:
+                rows = [
+                    (normalize_city(row["city"]), float(row["latitude"]), float(row["longitude"]))
+                    for row in csv.DictReader(gazetteer)
+                ]
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO geocode (city, latitude, longitude) VALUES (?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT city, latitude, longitude FROM geocode LIMIT ?", (self.memory.maxsize,)
+            ).fetchall()
+
+        for city, latitude, longitude in rows:
+            self.memory.put(city, (latitude, longitude))
+
+        return len(rows)
+
+
+# неблокирующий клиент nominatim: одна keep-alive сессия на event loop,
+# одновременные запросы одного и того же города сливаются в один запрос наружу;
+# город, который не нашелся (или на котором nominatim не ответил), not_found_ttl секунд
+# отвечает None из памяти, не повторяя запрос наружу
+class AsyncGeocoder:
+
+    def __init__(self, cache, base_url=NOMINATIM_URL, user_agent="my_request", timeout=5.0, pool_size=8,
+                 not_found_ttl=60, not_found_maxsize=4096):
+        self.cache = cache
+        self.not_found = LruCache(maxsize=not_found_maxsize, ttl=not_found_ttl)
+        self.base_url = base_url.rstrip("/")
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.upstream_requests = 0
+        self._session = None
+        self._loop = None
+        self._inflight = {}
+
+    # (latitude, longitude) или None, если город не нашелся; sqlite-часть кэша читается
+    # и пишется в пуле потоков, чтобы не держать event loop
+    async def geocode(self, city):
+        with metrics.stage("geocode"):
+            name = normalize_city(city)
+            location = self.cache.memory.get(name)
+            if location is not None:
+                return location
+            if self.not_found.get(name):
+                return None
+
+            location = await run_in_threadpool(self.cache.load, city)
+            if location is not None:
+                return location
+
+            loop = asyncio.get_running_loop()
+            key = (loop, name)
+
+            task = self._inflight.get(key)
+            if task is None:
+                task = loop.create_task(self._fetch(city))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+            return await asyncio.shield(task)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    async def _fetch(self, city):
+        session = await self._get_session()
+        self.upstream_requests += 1
+
+        try:
+            async with session.get(
+                    f"{self.base_url}/search",
+                    params={"q": city.strip(), "format": "json", "limit": "1"}
+            ) as response:
+                response.raise_for_status()
+                results = await response.json(content_type=None)
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError):
+            results = None
+
+        if not results:
+            self.not_found.put(normalize_city(city), True)
+            return None
+
+        return await run_in_threadpool(self.cache.put, city, results[0]["lat"], results[0]["lon"])
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # сессия прошлого event loop: закрываем ее соединения, иначе коннектор утечет
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": self.user_agent}
+            )
+            self._loop = loop
+        return self._session
@@ -0,0 +1,83 @@
+import math
+
+from sqlalchemy import func
+
+from database_config import Estate
+
+# сетка 0.1° x 0.1°: номер ячейки = строка по широте * число колонок + колонка по долготе
+GEO_CELL_SIZE = 0.1
+GEO_CELL_COLUMNS = round(360 / GEO_CELL_SIZE)
+EARTH_RADIUS_KM = 6371.0088
+# больше ячеек в IN (...) не перечисляем, хватает рамки по широте/долготе
+MAX_COVERING_CELLS = 2500
+
+
+def geo_cell(latitude, longitude):
+    row = math.floor((latitude + 90) / GEO_CELL_SIZE)
+    column = math.floor((longitude + 180) / GEO_CELL_SIZE) % GEO_CELL_COLUMNS
+    return row * GEO_CELL_COLUMNS + column
+
+
+# полуразмеры рамки вокруг круга в градусах; по долготе 180, если круг накрывает полюс
+def bounding_box(latitude, longitude, radius_km):
+    angle = radius_km / EARTH_RADIUS_KM
+    delta_latitude = math.degrees(angle)
+
+    cos_latitude = math.cos(math.radians(latitude))
+    if math.sin(angle) >= cos_latitude:
+        return delta_latitude, 180.0
+
+    return delta_latitude, math.degrees(math.asin(math.sin(angle) / cos_latitude))
+
+
+# ячейки, покрывающие рамку круга, с запасом в одну ячейку на границах
+def covering_cells(latitude, longitude, radius_km):
+    delta_latitude, delta_longitude = bounding_box(latitude, longitude, radius_km)
+    if delta_longitude >= 180.0:
+        return None
+
+    rows = range(
+        max(math.floor((latitude - delta_latitude + 90) / GEO_CELL_SIZE) - 1, 0),
+        math.floor((latitude + delta_latitude + 90) / GEO_CELL_SIZE) + 2
+    )
+    columns = {
+        column % GEO_CELL_COLUMNS for column in range(
+            math.floor((longitude - delta_longitude + 180) / GEO_CELL_SIZE) - 1,
+            math.floor((longitude + delta_longitude + 180) / GEO_CELL_SIZE) + 2
+        )
+    }
+
+    if len(rows) * len(columns) > MAX_COVERING_CELLS:
+        return None
+
+    return sorted(row * GEO_CELL_COLUMNS + column for row in rows for column in columns)
+
+
+# расстояние по гаверсинусу от точки до объявления, км
+def distance_km(latitude, longitude):
+    latitude_radians = math.radians(latitude)
+    half_chord = (
+        func.pow(func.sin((func.radians(Estate.latitude) - latitude_radians) / 2), 2)
+        + math.cos(latitude_radians) * func.cos(func.radians(Estate.latitude))
+        * func.pow(func.sin((func.radians(Estate.longitude) - math.radians(longitude)) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(half_chord))
+
+
+# условия "не дальше radius_km": ячейки и рамка режут выборку по индексу,
+# гаверсинус оставляет только то, что действительно попало в круг
+def radius_filters(latitude, longitude, radius_km):
+    delta_latitude, delta_longitude = bounding_box(latitude, longitude, radius_km)
+
+    filters = [Estate.latitude.between(latitude - delta_latitude, latitude + delta_latitude)]
+
+    if -180 <= longitude - delta_longitude and longitude + delta_longitude <= 180:
+        filters.append(Estate.longitude.between(longitude - delta_longitude, longitude + delta_longitude))
+
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells is not None:
+        filters.append(Estate.geo_cell.in_(cells))
+
+    filters.append(distance_km(latitude, longitude) <= radius_km)
+
+    return filters
@@ -0,0 +1,180 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+
+# верхние границы корзин, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# scope текущего запроса: маршрут становится известен только после роутинга,
+# поэтому этапы берут его из scope в момент замера
+_request_scope = contextvars.ContextVar("metrics_request_scope", default=None)
+
+_route_templates = {}
+
+
+# шаблон маршрута (/api/users/{user_mail}) вместо пути, чтобы метки не плодились по значениям
+def route_template(scope):
+    app = scope.get("app")
+    if app is None or "endpoint" not in scope:
+        return scope.get("path", "")
+
+    routes = _route_templates.get(id(app))
+    if routes is None:
+        routes = {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+        _route_templates[id(app)] = routes
+    return routes.get(scope["endpoint"], scope["path"])
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+class Metrics:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.requests = {}
+        self.responses = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, method, route, status_code, seconds):
+        with self._lock:
+            histogram = self.requests.get((method, route))
+            if histogram is None:
+                histogram = self.requests[(method, route)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            key = (method, route, status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    # вне запроса (фоновые задачи, загрузка при старте) метод и маршрут пустые
+    def observe_stage(self, stage, seconds):
+        scope = _request_scope.get()
+        key = (scope["method"], route_template(scope), stage) if scope is not None else ("", "", stage)
+        with self._lock:
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - started)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            self._render_histograms(
+                lines, "http_request_duration_seconds", "Время запроса до отправки ответа целиком",
+                {_labels(method=method, route=route): histogram for (method, route), histogram in self.requests.items()}
+            )
+            lines += [
+                "# HELP http_responses_total Ответы по маршрутам и статусам",
+                "# TYPE http_responses_total counter"
+            ]
+            lines += [
+                f"http_responses_total{{{_labels(method=method, route=route, status=status_code)}}} {count}"
+                for (method, route, status_code), count in sorted(self.responses.items())
+            ]
+            self._render_histograms(
+                lines, "stage_duration_seconds", "Время этапов запроса: geocode, db, count, page, predict, encode",
+                {
+                    _labels(method=method, route=route, stage=stage): histogram
+                    for (method, route, stage), histogram in self.stages.items()
+                }
+            )
+        return "\n".join(lines) + "\n"
+
+    def _render_histograms(self, lines, name, description, histograms):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for labels, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+# ASGI-обертка приложения: время запроса по маршруту и методу, scope для этапов
+class MetricsMiddleware:
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.metrics = registry if registry is not None else metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        token = _request_scope.set(scope)
+
+        async def send_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _request_scope.reset(token)
+            self.metrics.observe_request(
+                scope["method"], route_template(scope), status_code, time.perf_counter() - started
+            )
+
+
+# время выполнения каждого запроса к базе (без чтения результата) — этап db
+def instrument_engine(engine, registry=None):
+    registry = registry if registry is not None else metrics
+    engine = getattr(engine, "sync_engine", engine)
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        registry.observe_stage("db", time.perf_counter() - context._metrics_started)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+# JSON ответа с response_model: время json.dumps — этап encode
+class TimedJSONResponse(JSONResponse):
+
+    def render(self, content):
+        with metrics.stage("encode"):
+            return super().render(content)
+
+
+metrics = Metrics()
@@ -0,0 +1,41 @@
+# добавляет Estate.geo_cell (ячейка сетки geo_index) и индекс по ней вместо индекса по широте/долготе
+#   python migrations/add_geo_cell.py [--chunk 50000]
+# повторный запуск безопасен: дозаполняются только строки с пустым geo_cell
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_config import Estate, engine
+from geo_index import GEO_CELL_COLUMNS, GEO_CELL_SIZE
+from migrations.helpers import add_column, backfill, create_indexes, drop_index
+
+# то же, что geo_index.geo_cell, но на стороне базы
+GEO_CELL_EXPRESSION = (
+    f"FLOOR((latitude + 90) / {GEO_CELL_SIZE}) * {GEO_CELL_COLUMNS} "
+    f"+ (CAST(FLOOR((longitude + 180) / {GEO_CELL_SIZE}) AS INTEGER) % {GEO_CELL_COLUMNS})"
+)
+
+
+def migrate(bind=engine, chunk=50000, log=print):
+    table = Estate.__tablename__
+    expression = GEO_CELL_EXPRESSION
+    if bind.dialect.name == "mysql":
+        expression = expression.replace("AS INTEGER", "AS SIGNED")
+
+    add_column(bind, table, "geo_cell", "INTEGER NULL", log=log)
+    updated = backfill(bind, table, f"geo_cell = {expression}", "geo_cell IS NULL", chunk=chunk, log=log)
+
+    drop_index(bind, table, "ix_estate_latitude_longitude", log=log)
+    create_indexes(bind, Estate.__table__, log=log)
+
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk", type=int, default=50000)
+    args = parser.parse_args()
+
+    migrate(chunk=args.chunk)
@@ -0,0 +1,48 @@
+# добавляет Estate.listed_at, заполняет его из year/month/day/time и строит составные индексы
+#   python migrations/add_listed_at.py [--chunk 50000]
+# повторный запуск безопасен: дозаполняются только строки с пустым listed_at
+import argparse
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_config import Estate, engine
+from migrations.helpers import add_column, backfill, create_indexes
+
+LISTED_AT_EXPRESSIONS = {
+    "mysql": "STR_TO_DATE(CONCAT(year, '-', month, '-', day, ' ', COALESCE(time, '00:00:00')), '%Y-%c-%e %H:%i:%s')",
+    # sqlalchemy хранит DateTime в sqlite строкой 'YYYY-MM-DD HH:MM:SS.ffffff'
+    "sqlite": "printf('%04d-%02d-%02d ', year, month, day) || COALESCE(substr(time, 1, 8), '00:00:00') || '.000000'"
+}
+
+
+def migrate(bind=engine, chunk=50000, log=print):
+    dialect = bind.dialect.name
+    if dialect not in LISTED_AT_EXPRESSIONS:
+        raise ValueError(f"Unsupported dialect: {dialect}")
+
+    table = Estate.__tablename__
+
+    add_column(bind, table, "listed_at", "DATETIME NULL", log=log)
+    updated = backfill(
+        bind, table, f"listed_at = {LISTED_AT_EXPRESSIONS[dialect]}", "listed_at IS NULL", chunk=chunk, log=log
+    )
+
+    if dialect == "mysql":
+        with bind.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table} MODIFY COLUMN listed_at DATETIME NOT NULL"))
+
+    create_indexes(bind, Estate.__table__, log=log)
+
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk", type=int, default=50000)
+    args = parser.parse_args()
+
+    migrate(chunk=args.chunk)
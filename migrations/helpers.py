@@ -0,0 +1,53 @@
+from sqlalchemy import inspect, text
+
+
+def add_column(bind, table, name, ddl, log=print):
+    columns = {column["name"] for column in inspect(bind).get_columns(table)}
+    if name in columns:
+        return False
+
+    log(f"{table}: add column {name}")
+    with bind.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return True
+
+
+# UPDATE кусками по estate_id, чтобы не держать одну транзакцию на всю таблицу
+def backfill(bind, table, assignment, where, chunk=50000, log=print):
+    with bind.connect() as connection:
+        min_id, max_id = connection.execute(text(f"SELECT MIN(estate_id), MAX(estate_id) FROM {table}")).one()
+
+    updated = 0
+    if min_id is not None:
+        for start in range(min_id, max_id + 1, chunk):
+            with bind.begin() as connection:
+                updated += connection.execute(text(
+                    f"UPDATE {table} SET {assignment} "
+                    f"WHERE estate_id BETWEEN :start AND :end AND {where}"
+                ), {"start": start, "end": start + chunk - 1}).rowcount
+
+    log(f"{table}: backfilled {updated} rows ({assignment.split('=')[0].strip()})")
+    return updated
+
+
+# создает индексы модели, которых еще нет в базе и все колонки которых уже есть
+def create_indexes(bind, model_table, log=print):
+    inspector = inspect(bind)
+    columns = {column["name"] for column in inspector.get_columns(model_table.name)}
+    existing_indexes = {index["name"] for index in inspector.get_indexes(model_table.name)}
+
+    for index in model_table.indexes:
+        if index.name in existing_indexes or not {column.name for column in index.columns} <= columns:
+            continue
+        log(f"{model_table.name}: create index {index.name}")
+        index.create(bind)
+
+
+def drop_index(bind, table, name, log=print):
+    if name not in {index["name"] for index in inspect(bind).get_indexes(table)}:
+        return
+
+    log(f"{table}: drop index {name}")
+    statement = f"DROP INDEX {name} ON {table}" if bind.dialect.name == "mysql" else f"DROP INDEX {name}"
+    with bind.begin() as connection:
+        connection.execute(text(statement))
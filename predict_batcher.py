@@ -0,0 +1,121 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+# собирает строки признаков из одновременных запросов в одну матрицу:
+# запросы, пришедшие в течение window секунд (но не больше max_batch_size строк),
+# предсказываются одним вызовом predict в отдельном потоке
+class PredictBatcher:
+
+    def __init__(self, predict, window=0.002, max_batch_size=64):
+        self.predict_rows = predict
+        self.window = window
+        self.max_batch_size = max_batch_size
+
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_rows = 0
+        self.batch_size_counts = dict.fromkeys(BATCH_SIZE_BUCKETS + (float("inf"),), 0)
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.predict_time_total = 0.0
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self._pending = []
+        self._pending_rows = 0
+        self._flush_handle = None
+        # цикл событий держит задачи слабыми ссылками — без своей ссылки батч в работе может собрать GC
+        self._tasks = set()
+
+    async def predict(self, feature_values):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._pending.append((feature_values, future, time.perf_counter()))
+        self._pending_rows += len(feature_values)
+
+        if self._pending_rows >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_requests": self.requests / self.batches if self.batches else 0.0,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "max_batch_rows": self.max_batch_rows,
+            "batch_rows_histogram": {
+                ("+Inf" if bucket == float("inf") else str(bucket)): count
+                for bucket, count in self.batch_size_counts.items()
+            },
+            "mean_queue_wait_ms": self.queue_wait_total / self.requests * 1000 if self.requests else 0.0,
+            "max_queue_wait_ms": self.queue_wait_max * 1000,
+            "mean_predict_ms": self.predict_time_total / self.batches * 1000 if self.batches else 0.0
+        }
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = self._pending
+        self._pending = []
+        self._pending_rows = 0
+
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        feature_values = np.concatenate([rows for rows, _, _ in batch]).astype(np.float32, copy=False)
+
+        self._record(batch, feature_values, started)
+
+        try:
+            costs = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.predict_rows, feature_values
+            )
+        except Exception as error:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self.predict_time_total += time.perf_counter() - started
+
+        offset = 0
+        for rows, future, _ in batch:
+            if not future.done():
+                future.set_result(costs[offset:offset + len(rows)])
+            offset += len(rows)
+
+    def _record(self, batch, feature_values, started):
+        self.requests += len(batch)
+        self.batches += 1
+        self.rows += len(feature_values)
+        self.max_batch_rows = max(self.max_batch_rows, len(feature_values))
+
+        for bucket in self.batch_size_counts:
+            if len(feature_values) <= bucket:
+                self.batch_size_counts[bucket] += 1
+                break
+
+        for _, _, enqueued in batch:
+            wait = started - enqueued
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
@@ -0,0 +1,62 @@
+import os
+import time
+
+import numpy as np
+
+from lru import LruCache
+
+
+# готовые пары цен по квантованному вектору признаков и версии файла модели;
+# версия — (mtime, size) файла, он проверяется не чаще раза в check_interval секунд;
+# версия, которую не удалось загрузить, не считается изменением, пока файл не поменяется снова.
+# Версию читают до загрузки и передают в reset/model_failed: файл мог смениться, пока модель грузилась
+class PredictCache:
+
+    def __init__(self, model_path, maxsize=10000, ttl=3600, decimals=4, check_interval=1.0):
+        self.model_path = model_path
+        self.memory = LruCache(maxsize=maxsize, ttl=ttl)
+        self.decimals = decimals
+        self.check_interval = check_interval
+        self.invalidations = 0
+        self.model_version = self.read_version()
+        self.failed_version = None
+        self._checked_at = time.monotonic()
+
+    def key(self, feature_values):
+        return self.model_version, np.round(feature_values, self.decimals).tobytes()
+
+    def get(self, key):
+        return self.memory.get(key)
+
+    def put(self, key, costs):
+        self.memory.put(key, costs)
+
+    def model_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        return self.read_version() not in (self.model_version, self.failed_version)
+
+    def model_failed(self, version):
+        self.failed_version = version
+
+    def reset(self, version):
+        self.model_version = version
+        self.memory.clear()
+        self.invalidations += 1
+
+    def stats(self):
+        return dict(
+            self.memory.stats(),
+            ttl=self.memory.ttl,
+            model_version=f"{self.model_version[0]}-{self.model_version[1]}",
+            invalidations=self.invalidations
+        )
+
+    def read_version(self):
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return 0, 0
+        return stat.st_mtime_ns, stat.st_size
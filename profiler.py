@@ -0,0 +1,262 @@
+# профилирование отдельных запросов: по подписанному токену (заголовок X-Profile или ?profile=)
+# и/или случайной доле запросов. Пока запрос идет, поток раз в interval снимает его стек:
+# если корутина запроса выполняется — стек потока цикла событий над RestProfiler,
+# если ждет (база, геокодер, очередь предсказаний) — цепочку cr_await с пометкой [await].
+# Результат — collapsed stacks (flamegraph.pl, speedscope), последние max_profiles файлов на диске.
+#   python profiler.py token [--ttl 3600]    — токен для заголовка X-Profile
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import route_template
+
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+
+PROFILE_ID_REGEX = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+# сами профили не профилируются
+PROFILES_PATH = "/api/admin/profiles"
+
+
+# токен: срок действия и HMAC-SHA256 от него на PROFILE_SECRET
+def profile_token(secret, ttl=3600):
+    expires = str(int(time.time() + ttl))
+    return f"{expires}.{hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()}"
+
+
+def verify_token(secret, token):
+    expires, _, signature = token.partition(".")
+    if not secret or not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+# в стеках профилей есть пути запросов с почтой пользователей, поэтому список и файлы
+# отдаются по тому же токену, что включает профилирование; без PROFILE_SECRET — никому
+def request_authorized(request, secret=None):
+    token = request.headers.get("x-profile") or request.query_params.get("profile")
+    return token is not None and verify_token(PROFILE_SECRET if secret is None else secret, token)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# кадры ожидающей корутины от внешней к самой глубокой
+def await_frames(coroutine):
+    frames = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return frames
+
+
+class StackSampler:
+
+    def __init__(self, coroutine, thread_id, interval):
+        self.coroutine = coroutine
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = 0
+        self.waiting = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        if getattr(self.coroutine, "cr_frame", None) is None:
+            return
+
+        if self.coroutine.cr_running:
+            frames = []
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None and frame is not self.coroutine.cr_frame:
+                frames.append(frame)
+                frame = frame.f_back
+            if frame is None:
+                return
+            frames.append(frame)
+            labels = [frame_label(frame) for frame in reversed(frames)]
+            self.running += 1
+        else:
+            labels = [frame_label(frame) for frame in await_frames(self.coroutine)] + ["[await]"]
+            self.waiting += 1
+
+        self.stacks[";".join(labels)] += 1
+
+
+class ProfileStore:
+
+    def __init__(self, directory=PROFILE_DIR, max_profiles=PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+    def path(self, profile_id, suffix=".collapsed"):
+        if not PROFILE_ID_REGEX.match(profile_id):
+            return None
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, profile_id, stacks, info):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(profile_id), "w", encoding="utf-8") as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            with open(self.path(profile_id, ".json"), "w", encoding="utf-8") as file:
+                json.dump(info, file, ensure_ascii=False)
+
+            # кольцо: самые старые профили удаляются, id начинается со времени в мс
+            for old_id in self.ids()[self.max_profiles:]:
+                for suffix in (".collapsed", ".json"):
+                    try:
+                        os.remove(self.path(old_id, suffix))
+                    except FileNotFoundError:
+                        pass
+
+    # от новых к старым
+    def ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        ids = [name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted((profile_id for profile_id in ids if PROFILE_ID_REGEX.match(profile_id)), reverse=True)
+
+    def list(self):
+        profiles = []
+        for profile_id in self.ids():
+            try:
+                with open(self.path(profile_id, ".json"), encoding="utf-8") as file:
+                    profiles.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+
+# ASGI-обертка: подключается к приложению, только если профилирование включено,
+# иначе запросы через нее не проходят вовсе
+class RestProfiler:
+
+    def __init__(self, app, secret=PROFILE_SECRET, sample_rate=PROFILE_SAMPLE_RATE, store=None,
+                 interval=PROFILE_INTERVAL_MS / 1000):
+        self.app = app
+        self.secret = secret
+        # без секрета профили некому отдать (см. request_authorized), поэтому и случайная доля не пишется
+        self.sample_rate = sample_rate if secret else 0
+        self.store = store if store is not None else ProfileStore()
+        self.interval = interval
+
+    def requested(self, scope):
+        if scope["path"].startswith(PROFILES_PATH):
+            return None
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+                break
+        if token is None and b"profile=" in scope["query_string"]:
+            for item in scope["query_string"].decode("latin-1").split("&"):
+                if item.startswith("profile="):
+                    token = item[len("profile="):]
+        if token is not None and verify_token(self.secret, token):
+            return "token"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.requested(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.store.new_id()
+        status_code = 500
+
+        async def send_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode())
+                ])
+            await send(message)
+
+        coroutine = self.app(scope, receive, send_profile_id)
+        sampler = StackSampler(coroutine, threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await coroutine
+        finally:
+            info = {
+                "id": profile_id,
+                "created": time.time(),
+                "method": scope["method"],
+                "route": route_template(scope),
+                "path": scope["path"],
+                "status": status_code,
+                "trigger": trigger,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "interval_ms": self.interval * 1000
+            }
+            # остановка потока и запись файлов с ротацией — в пуле потоков, не в event loop
+            await run_in_threadpool(self._finish, sampler, profile_id, info)
+
+    def _finish(self, sampler, profile_id, info):
+        sampler.stop()
+        self.store.save(profile_id, sampler.stacks, dict(
+            info, samples_running=sampler.running, samples_waiting=sampler.waiting
+        ))
+
+
+def profiling_enabled():
+    return bool(PROFILE_SECRET)
+
+
+# PROFILE_SAMPLE_RATE задан, а PROFILE_SECRET нет — профилирование выключено, о чем пишется при запуске
+def sampling_without_secret():
+    return PROFILE_SAMPLE_RATE > 0 and not PROFILE_SECRET
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("token",))
+    parser.add_argument("--ttl", type=int, default=3600)
+    args = parser.parse_args()
+
+    if not PROFILE_SECRET:
+        sys.exit("PROFILE_SECRET не задан")
+    print(profile_token(PROFILE_SECRET, ttl=args.ttl))
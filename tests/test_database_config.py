@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from database_config import database_urls
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_async_url_is_derived_from_sync_one():
+    assert database_urls("mysql+mysqlconnector://root:secret@db:3306/dipl", None) == (
+        "mysql+mysqlconnector://root:secret@db:3306/dipl", "mysql+aiomysql://root:secret@db:3306/dipl"
+    )
+    assert database_urls("sqlite:///estate.db", None) == ("sqlite:///estate.db", "sqlite+aiosqlite:///estate.db")
+
+
+def test_sync_url_is_derived_from_async_one():
+    assert database_urls(None, "mysql+aiomysql://root@db/dipl") == (
+        "mysql+mysqlconnector://root@db/dipl", "mysql+aiomysql://root@db/dipl"
+    )
+
+
+def test_default_urls_point_to_one_database():
+    sync_url, async_url = database_urls()
+    assert sync_url.startswith("mysql+mysqlconnector://") and async_url.startswith("mysql+aiomysql://")
+
+
+@pytest.mark.parametrize("sync_url, async_url", [
+    ("sqlite:///estate.db", "sqlite+aiosqlite:///other.db"),
+    ("mysql+mysqlconnector://root@db/dipl", "mysql+aiomysql://root@db/dipl_test"),
+    ("mysql+mysqlconnector://root@db/dipl", "sqlite+aiosqlite:///dipl"),
+])
+def test_different_databases_are_rejected(sync_url, async_url):
+    with pytest.raises(ValueError):
+        database_urls(sync_url, async_url)
+
+
+def test_explicit_urls_of_one_database_are_kept():
+    assert database_urls("sqlite:///estate.db", "sqlite+aiosqlite:///./estate.db") == (
+        "sqlite:///estate.db", "sqlite+aiosqlite:///./estate.db"
+    )
+
+
+# движки создаются при импорте database_config, поэтому приложение с репликой запускается
+# в отдельном процессе; реплика — копия основной базы до второго объявления
+REPLICA_SCRIPT = """
+import json, shutil, sys
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+
+import diplom_server
+from database_config import Base, Estate, Favourites, User, engine
+
+primary, replica = sys.argv[1:3]
+estate = dict(price=5.0, year=2022, month=2, day=20, latitude=55.75, longitude=37.61, building_type=2, level=3,
+              levels=10, rooms=2, area=50.0, kitchen_area=9.0, object_type=1, user_id=1)
+with engine.begin() as connection:
+    connection.execute(insert(User), [dict(user_id=1, user_mail="a@b.ru")])
+    connection.execute(insert(Estate), [dict(estate, estate_id=1, listed_at=datetime(2022, 2, 20))])
+engine.dispose()
+shutil.copy(primary, replica)
+with engine.begin() as connection:
+    connection.execute(insert(Estate), [dict(estate, estate_id=2, listed_at=datetime(2022, 2, 21))])
+    connection.execute(insert(Favourites), [dict(user_id=1, estate_id=2)])
+
+client = TestClient(diplom_server.app)
+print(json.dumps({
+    "all": [item["estate_id"] for item in client.get("/api/estate/all").json()["items"]],
+    "user": [item["estate_id"] for item in client.get("/api/estate/user", params={"mail": "a@b.ru"}).json()["items"]],
+    "favourites": [item["estate_id"] for item in client.get("/api/favourites", params={"mail": "a@b.ru"}).json()["items"]],
+}))
+"""
+
+
+def test_reads_go_to_replica_and_user_endpoints_to_primary(tmp_path):
+    primary, replica = os.path.join(tmp_path, "primary.db"), os.path.join(tmp_path, "replica.db")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{primary}",
+        ASYNC_REPLICA_DATABASE_URL=f"sqlite+aiosqlite:///{replica}",
+        REST_LOG_PATH=os.path.join(tmp_path, "rest.log")
+    )
+    env.pop("ASYNC_DATABASE_URL", None)
+
+    result = subprocess.run(
+        [sys.executable, "-c", REPLICA_SCRIPT, primary, replica],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == {"all": [1], "user": [1], "favourites": [2]}
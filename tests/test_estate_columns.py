@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from database_config import Estate, EstateFomTo
+from diplom_server import EstateAPI
+from estate_columns import EstateColumnStore
+from estate_paging import ESTATE_ORDER
+
+RADIUS_KM = 45.0
+
+
+def estate_filter(**values):
+    fields = dict(
+        latitude=None, longitude=None, building_type=None, object_type=None, price_from=None, price_to=None,
+        level_from=None, level_to=None, levels_from=None, levels_to=None, rooms_from=None, rooms_to=None,
+        area_from=None, area_to=None, kitchen_area_from=None, kitchen_area_to=None
+    )
+    fields.update(values)
+    return EstateFomTo(**fields)
+
+
+@pytest.fixture(scope="module")
+def engine(estate_db):
+    sync_url, _ = estate_db
+    return create_engine(sync_url)
+
+
+@pytest.fixture(scope="module")
+def store(engine):
+    store = EstateColumnStore(engine)
+    store.load()
+    return store
+
+
+# дробные границы попадают между значениями колонок: float32 в памяти расходился тут с REAL в sqlite
+@pytest.mark.parametrize("values", [
+    dict(area_from=50.5, area_to=80.3),
+    dict(price_from=3.33),
+    dict(price_from=2.71, price_to=7.77, kitchen_area_from=8.15, kitchen_area_to=12.05),
+    dict(rooms_from=2, rooms_to=3, area_from=40.1, levels_from=9, object_type=11),
+    dict(latitude=55.7504461, longitude=37.6174943, price_to=12.345),
+])
+def test_memory_search_matches_sql(engine, store, values):
+    est = estate_filter(**values)
+    statement = EstateAPI().filter_query(est, select(Estate.estate_id)).order_by(*ESTATE_ORDER)
+    with engine.connect() as connection:
+        expected = connection.execute(statement).scalars().all()
+
+    page, total = store.search(est, RADIUS_KM, offset=0, limit=len(store))
+
+    assert 0 < total < len(store)
+    assert total == len(expected)
+    assert page == expected
+
+
+def test_selected_values_are_exact(engine, store):
+    est = estate_filter(area_from=50.5, area_to=80.3)
+    with engine.connect() as connection:
+        expected = sorted(connection.execute(EstateAPI().filter_query(est, select(Estate.price))).scalars())
+
+    assert sorted(store.select(est, RADIUS_KM, ("price",))["price"].tolist()) == expected
+
+
+# целые колонки не должны молча переполняться: тип выбирается по min и max и расширяется при refresh
+def test_large_integers_do_not_wrap(tmp_path):
+    from datetime import datetime
+
+    from benchmark.generate_dataset import DatabaseWriter, generate
+    from test_estate_counter import estate_row
+
+    url = f"sqlite:///{tmp_path / 'wide.db'}"
+    generate(DatabaseWriter(url), 5, 200, 0, seed=11, log=lambda message: None)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(Estate.__table__.insert(), [
+            dict(estate_row(1, datetime(2024, 1, 1)), levels=70000, level=-40000)
+        ])
+
+    store = EstateColumnStore(engine)
+    store.load()
+    assert store.columns["levels"].dtype == store.columns["level"].dtype == "int32"
+
+    with engine.begin() as connection:
+        connection.execute(Estate.__table__.insert(), [
+            dict(estate_row(1, datetime(2024, 1, 2)), levels=5_000_000_000)
+        ])
+    store.refresh(force=True)
+    assert store.columns["levels"].dtype == "int64"
+
+    for values in (dict(levels_from=60000), dict(levels_from=4_000_000_000), dict(level_to=-30000)):
+        est = estate_filter(**values)
+        statement = EstateAPI().filter_query(est, select(Estate.estate_id)).order_by(*ESTATE_ORDER)
+        with engine.connect() as connection:
+            expected = connection.execute(statement).scalars().all()
+        page, total = store.search(est, RADIUS_KM, offset=0, limit=len(store))
+        assert expected and page == expected and total == len(expected)
+
+    selected = store.select(estate_filter(levels_from=60000), RADIUS_KM, ("levels",))["levels"]
+    assert sorted(selected.tolist()) == [70000, 5_000_000_000]
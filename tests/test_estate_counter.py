@@ -0,0 +1,138 @@
+import asyncio
+import os
+import warnings
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, exc, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database_config import Estate, Favourites, User
+from estate_paging import EstateCounter
+
+
+def run_counts(async_url, statement, counter):
+    async def main():
+        engine = create_async_engine(async_url)
+        try:
+            async with AsyncSession(engine) as session:
+                return (
+                    await counter.exact(session, statement),
+                    await counter.estimate(session, statement),
+                    await counter.table_rows(session)
+                )
+        finally:
+            await engine.dispose()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", exc.SAWarning)
+        return asyncio.run(main())
+
+
+def favourites_user(async_url, bookmarks):
+    async def main():
+        engine = create_async_engine(async_url)
+        try:
+            async with AsyncSession(engine) as session:
+                return await session.scalar(
+                    select(Favourites.user_id).group_by(Favourites.user_id)
+                    .having(func.count() <= bookmarks).order_by(Favourites.user_id.desc()).limit(1)
+                )
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("bookmarks", [5, 100])
+def test_estimate_on_favourites_join_matches_exact(estate_db, bookmarks):
+    _, async_url = estate_db
+    user_id = favourites_user(async_url, bookmarks)
+    statement = (
+        select(Estate)
+        .join(Favourites, Favourites.estate_id == Estate.estate_id)
+        .where(Favourites.user_id == user_id)
+    )
+
+    exact, estimate, table_rows = run_counts(async_url, statement, EstateCounter(sample_size=2000))
+
+    assert 0 < exact <= bookmarks < table_rows
+    assert estimate == exact
+
+
+def test_estimate_of_filter_is_close_to_exact(estate_db):
+    _, async_url = estate_db
+    statement = select(Estate).where(Estate.rooms == 2, Estate.price < 10)
+
+    exact, estimate, table_rows = run_counts(async_url, statement, EstateCounter(sample_size=8000))
+
+    assert 0 < exact < table_rows
+    assert abs(estimate - exact) <= 0.1 * exact
+
+
+def test_estimate_without_filter_is_table_size(estate_db):
+    _, async_url = estate_db
+
+    exact, estimate, table_rows = run_counts(async_url, select(Estate), EstateCounter(sample_size=2000))
+
+    assert exact == estimate == table_rows == 30000
+
+
+# полная строка Estate, которую отдают и быстрые, и pydantic-страницы
+def estate_row(user_id, listed_at):
+    return {
+        "price": 5.0, "year": listed_at.year, "month": listed_at.month, "day": listed_at.day,
+        "time": listed_at.time(), "latitude": 55.75, "longitude": 37.61, "building_type": 2, "level": 3,
+        "levels": 9, "rooms": 2, "area": 50.0, "kitchen_area": 9.0, "object_type": 1, "user_id": user_id,
+        "listed_at": listed_at
+    }
+
+
+class RecordingCounter(EstateCounter):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.table_rows_calls = 0
+
+    async def table_rows(self, session):
+        self.table_rows_calls += 1
+        return await super().table_rows(session)
+
+
+def test_estimate_on_join_skips_table_size(estate_db):
+    _, async_url = estate_db
+    statement = select(Estate).join(Favourites, Favourites.estate_id == Estate.estate_id).where(Favourites.user_id == 1)
+    counter = RecordingCounter()
+
+    async def main():
+        engine = create_async_engine(async_url)
+        try:
+            async with AsyncSession(engine) as session:
+                return await counter.estimate(session, statement)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+    assert counter.table_rows_calls == 0
+
+
+@pytest.mark.parametrize("params", [{"limit": 1}, {"limit": 100, "offset": 1990}])
+def test_unknown_count_mode_is_rejected_for_any_page(api_client, params):
+    response = api_client.get("/api/estate/all", params=dict(params, count="bogus"))
+
+    assert response.status_code == 400
+
+
+# другой процесс приложения дописывает объявление: total по умолчанию видит его сразу
+def test_default_total_sees_rows_written_elsewhere(api_client):
+    params = {"mail": "user40@mail.ru", "limit": 1}
+    before = api_client.get("/api/estate/user", params=params).json()["total"]
+    assert before > 1
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.begin() as connection:
+        user_id = connection.scalar(select(User.user_id).where(User.user_mail == params["mail"]))
+        connection.execute(insert(Estate), [estate_row(user_id, datetime(2023, 1, 1))])
+
+    assert api_client.get("/api/estate/user", params=params).json()["total"] == before + 1
@@ -0,0 +1,102 @@
+import json
+import os
+from base64 import b64encode
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+import diplom_server
+from database_config import Estate, User
+from test_estate_counter import estate_row
+from test_estate_fields import WHERE
+from test_prediction_api import StubGeocoder
+
+MAIL = "user45@mail.ru"
+
+
+# у user45 три группы объявлений с одинаковым listed_at, estate_id внутри группы идут не по порядку вставки
+@pytest.fixture(scope="module")
+def tied_user(api_client):
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.begin() as connection:
+        user_id = connection.scalar(select(User.user_id).where(User.user_mail == MAIL))
+        connection.execute(insert(Estate), [estate_row(user_id, datetime(2021, 6, 1 + i % 3)) for i in range(25)])
+        return connection.execute(
+            select(Estate.estate_id).where(Estate.user_id == user_id).order_by(Estate.listed_at, Estate.estate_id)
+        ).scalars().all()
+
+
+def walk(api_client, method, path, params, size, body=None):
+    pages, cursor = [], None
+    while True:
+        response = api_client.request(
+            method, path, params=dict(params, size=size, **({"cursor": cursor} if cursor else {})), json=body
+        )
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([item["estate_id"] for item in page["items"]])
+        cursor = page["next_page"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("size", [1, 4, 7])
+def test_walk_over_ties_has_no_duplicates_or_gaps(api_client, tied_user, size):
+    pages = walk(api_client, "GET", "/api/estate/user/cursor", {"mail": MAIL}, size)
+
+    assert [estate_id for page in pages for estate_id in page] == tied_user
+    assert all(len(page) == size for page in pages[:-1]) and 0 < len(pages[-1]) <= size
+
+
+# последняя полная страница не оставляет курсор на пустую
+def test_last_page_has_no_next_cursor(api_client, tied_user):
+    pages = walk(api_client, "GET", "/api/estate/user/cursor", {"mail": MAIL}, len(tied_user))
+    assert pages == [tied_user]
+
+    size = len(tied_user) // 2 + 1
+    assert [len(page) for page in walk(api_client, "GET", "/api/estate/user/cursor", {"mail": MAIL}, size)] == [
+        size, len(tied_user) - size
+    ]
+
+
+def test_walk_all_and_where(api_client, tied_user, monkeypatch):
+    monkeypatch.setattr(diplom_server, "geocoder", StubGeocoder())
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.connect() as connection:
+        all_ids = connection.execute(
+            select(Estate.estate_id).order_by(Estate.listed_at, Estate.estate_id)
+        ).scalars().all()
+
+    walked = [estate_id for page in walk(api_client, "GET", "/api/estate/all/cursor", {}, 97) for estate_id in page]
+    assert walked == all_ids
+
+    where = [
+        estate_id for page in walk(api_client, "POST", "/api/estate/where/cursor", {}, 13, WHERE) for estate_id in page
+    ]
+    expected = [
+        item["estate_id"]
+        for item in api_client.post("/api/estate/where", params={"limit": 100}, json=WHERE).json()["items"]
+    ]
+    assert where[:len(expected)] == expected and len(set(where)) == len(where)
+
+
+def cursor_of(value):
+    return b64encode(value.encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    cursor_of("not json"),
+    cursor_of("7"),
+    cursor_of(json.dumps(["2021-06-01T00:00:00"])),
+    cursor_of(json.dumps(["yesterday", 5])),
+    cursor_of(json.dumps(["2021-06-01T00:00:00", "five"])),
+    # курсор прежнего формата: year, month, day, time, estate_id
+    cursor_of(json.dumps([2021, 6, 1, "00:00:00", 5])),
+    b64encode(b"\xff\xfe").decode(),
+])
+def test_tampered_or_old_cursor_is_400(api_client, cursor):
+    response = api_client.get("/api/estate/all/cursor", params={"cursor": cursor, "size": 5})
+
+    assert response.status_code == 400
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import io
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import diplom_server
+from database_config import Estate
+from diplom_server import EstateAPI
+from estate_export import EXPORT_COLUMNS, export_estates
+from test_estate_columns import estate_filter
+from test_prediction_api import CITIES, StubGeocoder
+
+NAMES = [column.name for column in EXPORT_COLUMNS]
+
+
+@pytest.fixture
+def client(api_client, monkeypatch):
+    monkeypatch.setattr(diplom_server, "geocoder", StubGeocoder())
+    return api_client
+
+
+def expected_ids(**values):
+    engine = create_engine(os.environ["DATABASE_URL"])
+    statement = EstateAPI().filter_query(estate_filter(**values), select(Estate.estate_id)).order_by(Estate.estate_id)
+    with engine.connect() as connection:
+        return connection.execute(statement).scalars().all()
+
+
+def export(client, **params):
+    response = client.get("/api/estate/export", params=params)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_csv(client):
+    response = export(client, format="csv", batch_size=300)
+    rows = list(csv.reader(io.StringIO(response.text)))
+
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == "attachment; filename=estates.csv"
+    assert rows[0] == NAMES
+    assert [int(row[NAMES.index("estate_id")]) for row in rows[1:]] == expected_ids()
+    assert all(len(row) == len(NAMES) for row in rows[1:])
+
+
+def test_ndjson(client):
+    response = export(client, batch_size=300)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert all(list(row) == NAMES for row in rows)
+    assert [row["estate_id"] for row in rows] == expected_ids()
+
+
+def test_filters_and_radius(client):
+    latitude, longitude = CITIES["Москва"]
+
+    def exported(radius):
+        response = export(client, city="Москва", radius=radius, numberOfRoomsFrom=2, priceTo=20000000)
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    near, far = exported(10), exported(45)
+
+    assert [row["estate_id"] for row in near] == expected_ids(
+        latitude=latitude, longitude=longitude, radius=10, rooms_from=2, price_to=20.0
+    )
+    assert [row["estate_id"] for row in far] == expected_ids(
+        latitude=latitude, longitude=longitude, radius=45, rooms_from=2, price_to=20.0
+    )
+    assert 0 < len(near) < len(far)
+    assert {row["estate_id"] for row in near} < {row["estate_id"] for row in far}
+    assert all(row["rooms"] >= 2 and row["price"] <= 20.0 for row in far)
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"numberOfRoomsFrom": "two"}, "Не правильно заданы фильтры"),
+    ({"priceFrom": "cheap"}, "Не правильно заданы фильтры"),
+    ({"radius": "far"}, "Не правильно заданы фильтры"),
+    ({"city": "Атлантида"}, "Не правильно введен город"),
+    ({"format": "xml"}, "Формат должен быть одним из: ndjson, csv"),
+])
+def test_bad_request_is_400(client, params, message):
+    response = client.get("/api/estate/export", params=params)
+
+    assert response.status_code == 400
+    assert response.json() == {"message": message}
+
+
+# выгрузка идет кусками по batch_size строк: больше строк, чем yield_per, — больше одного куска
+def test_stream_is_split_by_batch_size(api_client):
+    ids = expected_ids()
+    url = os.environ["DATABASE_URL"].replace("sqlite://", "sqlite+aiosqlite://")
+
+    async def main():
+        engine = create_async_engine(url)
+        try:
+            statement = select(*EXPORT_COLUMNS).order_by(Estate.estate_id)
+            return [chunk async for chunk in export_estates(lambda: AsyncSession(engine), statement, "csv", 7)]
+        finally:
+            await engine.dispose()
+
+    chunks = asyncio.run(main())
+
+    assert len(chunks) == 1 + -(-len(ids) // 7)
+    assert all(chunk.count(b"\n") == 7 for chunk in chunks[1:-1])
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert [int(row[NAMES.index("estate_id")]) for row in rows[1:]] == ids
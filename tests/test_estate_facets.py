@@ -0,0 +1,99 @@
+import asyncio
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database_config import Base, Estate
+from diplom_server import EstateAPI
+from estate_columns import EstateColumnStore
+from estate_facets import FACET_COLUMNS, columns_facets, query_facets
+from test_estate_columns import RADIUS_KM, estate_filter
+
+
+def sql_facets(async_url, est, statements=None):
+    async def main():
+        engine = create_async_engine(async_url)
+        if statements is not None:
+            event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        try:
+            async with AsyncSession(engine) as session:
+                return await query_facets(session, EstateAPI().filter_query(est, select(Estate)))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def memory_facets(estate_db, est, float_dtype=None):
+    store = EstateColumnStore(create_engine(estate_db[0]))
+    if float_dtype is not None:
+        store.float_dtype = float_dtype
+    store.load()
+    return columns_facets(store.select(est, RADIUS_KM, FACET_COLUMNS))
+
+
+@pytest.mark.parametrize("values", [
+    dict(),
+    dict(area_from=50.5, area_to=80.3),
+    dict(price_from=3.33, rooms_from=2),
+    dict(latitude=55.7504461, longitude=37.6174943, object_type=11),
+    dict(price_from=1000),
+])
+def test_sql_and_memory_facets_match(estate_db, values):
+    est = estate_filter(**values)
+    assert sql_facets(estate_db[1], est) == memory_facets(estate_db, est)
+
+
+def test_single_precision_store_reports_decimal_values(estate_db):
+    est = estate_filter(rooms_from=1, rooms_to=3)
+    expected = sql_facets(estate_db[1], est)
+    facets = memory_facets(estate_db, est, float_dtype=np.float32)
+
+    assert facets == expected
+    assert expected["price"]["median"] == round(expected["price"]["median"], 4)
+
+
+def test_empty_selection(estate_db):
+    facets = sql_facets(estate_db[1], estate_filter(price_from=1000))
+
+    assert facets["total"] == 0
+    assert facets["price"]["median"] is None and facets["rooms"] == {}
+    assert sum(bucket["count"] for bucket in facets["area"]["buckets"]) == 0
+
+
+def test_facets_take_one_aggregate_pass_and_a_median_lookup(estate_db):
+    statements = []
+    sql_facets(estate_db[1], estate_filter(area_from=50.5), statements)
+
+    assert len(statements) == 2
+    assert "GROUP BY" in statements[0] and "ORDER BY" in statements[1]
+
+
+# середина из двух цен в разных корзинах, строки без rooms не попадают в счетчик
+def test_median_between_buckets(tmp_path):
+    path = os.path.join(tmp_path, "facets.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    prices = [0.5, 0.7, 2.5, 9.0, 12.0, 40.0]
+    with engine.begin() as connection:
+        connection.execute(insert(Estate), [
+            {
+                "price": price, "year": 2023, "month": 1, "day": 1, "latitude": 55.75, "longitude": 37.61,
+                "rooms": None if i % 3 == 0 else i % 2 + 1, "building_type": 1, "object_type": 1, "area": 45.0,
+                "listed_at": datetime(2023, 1, 1)
+            }
+            for i, price in enumerate(prices)
+        ])
+
+    facets = sql_facets(f"sqlite+aiosqlite:///{path}", estate_filter())
+
+    assert facets["total"] == 6
+    assert facets["price"]["median"] == 5.75
+    assert facets["price"]["min"] == 0.5 and facets["price"]["max"] == 40.0
+    assert facets["rooms"] == {"1": 2, "2": 2}
+    assert facets["building_type"] == {"1": 6}
+    assert [bucket["count"] for bucket in facets["price"]["buckets"]][:3] == [2, 0, 1]
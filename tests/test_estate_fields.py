@@ -0,0 +1,78 @@
+import pytest
+
+import diplom_server
+from estate_columns import EstateColumnStore
+from test_prediction_api import StubGeocoder
+
+FIELDS = "rooms,price,estate_id"
+WHERE = {
+    "city": "Москва", "radius": "", "priceFrom": "", "priceTo": "", "totalAreaFrom": "30", "totalAreaTo": "",
+    "kitchenAreaFrom": "", "kitchenAreaTo": "", "levelsFrom": "", "levelsTo": "", "levelFrom": "", "levelTo": "",
+    "numberOfRoomsFrom": "", "numberOfRoomsTo": "", "houseType": "", "objectType": ""
+}
+
+
+@pytest.fixture(params=["fast", "pydantic"])
+def client(request, api_client, monkeypatch):
+    monkeypatch.setattr(diplom_server, "ESTATE_FAST_PAGES", request.param == "fast")
+    monkeypatch.setattr(diplom_server, "geocoder", StubGeocoder())
+    return api_client
+
+
+@pytest.fixture(params=["sql", "memory"])
+def engine_client(request, client, monkeypatch):
+    if request.param == "memory":
+        store = EstateColumnStore(diplom_server.engine, refresh_interval=float("inf"))
+        store.load()
+        monkeypatch.setattr(diplom_server, "estate_columns", store)
+    return client
+
+
+def get(client, method, path, params, body=None):
+    response = client.request(method, path, params={**params, "limit": 20}, json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+# проекция — те же строки страницы, только выбранные поля в порядке модели
+def assert_projection(client, method, path, params, body=None):
+    full = get(client, method, path, params, body)
+    projected = get(client, method, path, dict(params, fields=FIELDS), body)
+
+    assert full["items"] and projected["total"] == full["total"]
+    assert [list(item) for item in projected["items"]] == [["estate_id", "price", "rooms"]] * len(full["items"])
+    assert projected["items"] == [
+        {"estate_id": item["estate_id"], "price": item["price"], "rooms": item["rooms"]} for item in full["items"]
+    ]
+
+
+def test_all(client):
+    assert_projection(client, "GET", "/api/estate/all", {})
+
+
+def test_where(engine_client):
+    assert_projection(engine_client, "POST", "/api/estate/where", {}, WHERE)
+
+
+def test_user(client):
+    assert_projection(client, "GET", "/api/estate/user", {"mail": "user0@mail.ru"})
+
+
+def test_favourites(client):
+    client.post("/api/favourites/bulk", json={"user_mail": "user5@mail.ru", "add": [30, 31, 32]})
+
+    assert_projection(client, "GET", "/api/favourites", {"mail": "user5@mail.ru"})
+
+
+@pytest.mark.parametrize("fields", ["price,bogus", "", " , ", "price,"])
+@pytest.mark.parametrize("method, path, params, body", [
+    ("GET", "/api/estate/all", {}, None),
+    ("POST", "/api/estate/where", {}, WHERE),
+    ("GET", "/api/estate/user", {"mail": "user0@mail.ru"}, None),
+    ("GET", "/api/favourites", {"mail": "user5@mail.ru"}, None),
+])
+def test_unknown_or_empty_fields_are_rejected(client, fields, method, path, params, body):
+    response = client.request(method, path, params=dict(params, fields=fields), json=body)
+
+    assert response.status_code == 400
+    assert response.json()["message"].startswith("Поля должны быть из:")
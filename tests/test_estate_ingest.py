@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database_config import Base, Estate, User
+from estate_ingest import RowError, ingest_estates, iter_batches, iter_lines
+
+HEADER = "price,city,year,month,day,time,houseType,objectType,levels,level,numberOfRooms,totalArea,kitchenArea,comment\n"
+ROW = "5000000,{city},2023,1,15,10:00:00,2,1,9,3,2,50.5,9.1,{comment}\n"
+
+# строка 2 — запись на три строки файла с переводами строк и "" в кавычках, строка 5 — битая,
+# строка 6 — еще одна многострочная запись, строка 8 — обычная
+FEED = (
+    HEADER
+    + ROW.format(city="Москва", comment='"первая строка\nвторая, с запятой\nи ""кавычки"""')
+    + "5000000,Москва,2023,1,15\n"
+    + ROW.format(city="Казань", comment='"ремонт\n2020"')
+    + ROW.format(city="Москва", comment="без кавычек")
+)
+
+
+async def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def batches(data, chunk_size=7, batch_size=2):
+    async def main():
+        lines = iter_lines(chunks(data.encode("utf-8"), chunk_size))
+        return [row async for batch in iter_batches(lines, "csv", batch_size) for row in batch]
+
+    return asyncio.run(main())
+
+
+def test_quoted_newlines_stay_in_one_record():
+    rows = batches(FEED)
+
+    assert [line for line, _ in rows] == [2, 5, 6, 8]
+    assert rows[0][1]["comment"] == 'первая строка\nвторая, с запятой\nи "кавычки"'
+    assert rows[0][1]["kitchenArea"] == "9.1"
+    assert isinstance(rows[1][1], RowError)
+    assert rows[2][1]["comment"] == "ремонт\n2020" and rows[2][1]["city"] == "Казань"
+    assert rows[3][1]["comment"] == "без кавычек"
+
+
+def test_unterminated_quote_is_reported_at_its_first_line():
+    rows = batches(HEADER + ROW.format(city="Москва", comment="ok") + ROW.format(city="Москва", comment='"open\n'))
+
+    assert rows[0][0] == 2 and not isinstance(rows[0][1], RowError)
+    assert rows[1][0] == 3 and str(rows[1][1]) == "unterminated quoted field"
+
+
+class StubGeocoder:
+
+    async def geocode(self, city):
+        return {"Москва": (55.75, 37.61), "Казань": (55.79, 49.12)}.get(city)
+
+
+def test_ingest_reports_original_line_numbers(tmp_path):
+    path = os.path.join(tmp_path, "ingest.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"user_id": 1, "user_mail": "a@b.ru"}])
+
+    async def main():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with AsyncSession(async_engine) as session:
+                report = await ingest_estates(
+                    session, iter_lines(chunks(FEED.encode("utf-8"), 5)), StubGeocoder(), user_mail="a@b.ru",
+                    batch_size=2
+                )
+                return report, await session.scalar(select(func.count()).select_from(Estate))
+        finally:
+            await async_engine.dispose()
+
+    report, inserted = asyncio.run(main())
+
+    assert report["inserted"] == inserted == 3
+    assert [error["line"] for error in report["errors"]] == [5]
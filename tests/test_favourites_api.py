@@ -0,0 +1,44 @@
+# limit=1: при неполной странице total считается без EstateCounter, поэтому закладок всегда больше одной
+def total(api_client, mail, count="cached"):
+    response = api_client.get("/api/favourites", params={"mail": mail, "count": count, "limit": 1})
+    assert response.status_code == 200
+    return response.json()["total"]
+
+
+def add(api_client, mail, *estate_ids):
+    for estate_id in estate_ids:
+        assert api_client.post("/api/favourites", params={"user_mail": mail, "estate_id": estate_id}).json() == 1
+
+
+def test_cached_total_follows_favourites_writes(api_client):
+    mail = "user1@mail.ru"
+    add(api_client, mail, 10, 11)
+    assert total(api_client, mail) == 2
+
+    add(api_client, mail, 12)
+    assert total(api_client, mail) == 3
+
+    assert api_client.delete("/api/favourites", params={"user_mail": mail, "estate_id": 11}).status_code == 200
+    assert total(api_client, mail) == 2
+
+    response = api_client.post("/api/favourites/bulk", json={"user_mail": mail, "add": [20, 21], "remove": [10]})
+    assert response.json() == {"added": 2, "removed": 1}
+    assert total(api_client, mail) == total(api_client, mail, count="exact") == 3
+
+
+def test_writes_of_one_user_keep_cached_totals_of_others(api_client):
+    add(api_client, "user2@mail.ru", 5, 6)
+    assert total(api_client, "user2@mail.ru") == 2
+    hits = api_client.get("/api/admin/estate/count").json()["hits"]
+
+    add(api_client, "user3@mail.ru", 5)
+
+    assert total(api_client, "user2@mail.ru") == 2
+    assert api_client.get("/api/admin/estate/count").json()["hits"] == hits + 1
+
+
+def test_delete_missing_favourite_is_404(api_client):
+    response = api_client.delete("/api/favourites", params={"user_mail": "user4@mail.ru", "estate_id": 7})
+
+    assert response.status_code == 404
+    assert response.json() == {"message": "Закладка не найдена"}
@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from geo_cache import AsyncGeocoder, GeoCache
+
+CITIES = {"moscow": ("55.75", "37.61"), "kazan": ("55.79", "49.12")}
+
+
+# заглушка nominatim /search: считает запросы, город slow отвечает дольше таймаута клиента
+async def stub_nominatim(handler_calls):
+    async def search(request):
+        city = request.query["q"].casefold()
+        handler_calls.append(city)
+        if city == "slow":
+            await asyncio.sleep(1)
+        await asyncio.sleep(0.05)
+        if city not in CITIES:
+            return web.json_response([])
+        latitude, longitude = CITIES[city]
+        return web.json_response([{"lat": latitude, "lon": longitude}])
+
+    app = web.Application()
+    app.router.add_get("/search", search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def run_with_stub(tmp_path, scenario):
+    async def main():
+        calls = []
+        runner, base_url = await stub_nominatim(calls)
+        geocoder = AsyncGeocoder(GeoCache(os.path.join(tmp_path, "geo.db")), base_url=base_url, timeout=0.3)
+        try:
+            return await scenario(geocoder, calls)
+        finally:
+            await geocoder.close()
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_misses_share_one_upstream_request(tmp_path):
+    async def scenario(geocoder, calls):
+        return await asyncio.gather(*[geocoder.geocode("Moscow") for _ in range(20)]), calls
+
+    locations, calls = run_with_stub(tmp_path, scenario)
+
+    assert locations == [(55.75, 37.61)] * 20
+    assert calls == ["moscow"]
+
+
+def test_cache_hit_skips_upstream_and_survives_restart(tmp_path):
+    async def scenario(geocoder, calls):
+        first = await geocoder.geocode("Kazan")
+        second = await geocoder.geocode("  kazan ")
+        return first, second, calls, geocoder.upstream_requests
+
+    first, second, calls, upstream_requests = run_with_stub(tmp_path, scenario)
+
+    assert first == second == (55.79, 49.12)
+    assert calls == ["kazan"] and upstream_requests == 1
+    assert GeoCache(os.path.join(tmp_path, "geo.db")).get("KAZAN") == (55.79, 49.12)
+
+
+def test_timeout_and_unknown_city_return_none_and_are_not_cached(tmp_path):
+    async def scenario(geocoder, calls):
+        slow = await geocoder.geocode("slow")
+        unknown = await geocoder.geocode("Atlantis")
+        return slow, unknown, geocoder.cache.get("slow"), geocoder.cache.get("atlantis")
+
+    assert run_with_stub(tmp_path, scenario) == (None, None, None, None)
+
+
+def test_session_of_previous_loop_is_closed(tmp_path):
+    geocoder = AsyncGeocoder(GeoCache(os.path.join(tmp_path, "geo.db")))
+
+    async def open_session():
+        return await geocoder._get_session()
+
+    old_session = asyncio.run(open_session())
+    new_session = asyncio.run(open_session())
+
+    assert old_session.closed and not new_session.closed
+    asyncio.run(new_session.close())
+
+
+def test_memory_miss_is_counted_once(tmp_path):
+    path = os.path.join(tmp_path, "geo.db")
+    GeoCache(path).put("Kazan", 55.79, 49.12)
+    geocoder = AsyncGeocoder(GeoCache(path))
+
+    async def scenario():
+        return [await geocoder.geocode("Kazan") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [(55.79, 49.12)] * 3
+    assert geocoder.cache.memory.stats()["misses"] == 1
+    assert geocoder.cache.memory.stats()["hits"] == 2
+    assert geocoder.upstream_requests == 0
+
+
+def test_not_found_city_is_remembered_for_ttl(tmp_path):
+    async def scenario(geocoder, calls):
+        geocoder.not_found.ttl = 0.2
+        first = [await geocoder.geocode(city) for city in ("Atlantis", " atlantis", "slow", "slow")]
+        calls_before = list(calls)
+        await asyncio.sleep(0.25)
+        again = await geocoder.geocode("Atlantis")
+        return first, calls_before, again, calls
+
+    first, calls_before, again, calls = run_with_stub(tmp_path, scenario)
+
+    assert first == [None] * 4 and again is None
+    assert calls_before == ["atlantis", "slow"]
+    assert calls == ["atlantis", "slow", "atlantis"]
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import shutil
+
+import pytest
+
+import diplom_server
+from predict_cache import PredictCache
+
+
+@pytest.fixture
+def model_file(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "xgb_model.json")
+    shutil.copy(diplom_server.MODEL_PATH, path)
+    monkeypatch.setattr(diplom_server, "MODEL_PATH", path)
+    monkeypatch.setattr(diplom_server, "predict_cache", PredictCache(path, check_interval=0))
+    monkeypatch.setattr(diplom_server, "xgb_model", diplom_server.xgb_model)
+    monkeypatch.setattr(diplom_server.predict_batcher, "predict_rows", diplom_server.predict_batcher.predict_rows)
+    return path
+
+
+def rewrite(path, content):
+    stat = os.stat(path)
+    with open(path, "wb") as file:
+        file.write(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_half_written_model_keeps_previous_one(model_file, caplog):
+    model = diplom_server.xgb_model
+    with open(model_file, "rb") as file:
+        content = file.read()
+
+    rewrite(model_file, content[:len(content) // 2])
+    with caplog.at_level(logging.ERROR, logger="diplom_server"):
+        asyncio.run(diplom_server.refresh_model())
+        asyncio.run(diplom_server.refresh_model())
+
+    assert diplom_server.xgb_model is model
+    assert len([record for record in caplog.records if record.name == "diplom_server"]) == 1
+
+    rewrite(model_file, content)
+    asyncio.run(diplom_server.refresh_model())
+
+    assert diplom_server.xgb_model is not model
+    assert diplom_server.predict_batcher.predict_rows == diplom_server.xgb_model.predict
+    assert diplom_server.predict_cache.invalidations == 1
+
+
+def test_reload_does_not_block_event_loop(model_file):
+    with open(model_file, "rb") as file:
+        rewrite(model_file, file.read())
+
+    async def main():
+        ticks = 0
+        reload = asyncio.ensure_future(diplom_server.refresh_model())
+        while not reload.done():
+            ticks += 1
+            await asyncio.sleep(0)
+        return ticks
+
+    assert asyncio.run(main()) > 10
+    assert diplom_server.predict_cache.invalidations == 1
+
+
+# файл подменяется, пока модель грузится: кэш помнит версию, которую действительно прочитали
+def replace_during_load(monkeypatch, path, content):
+    load = diplom_server.load_predict_model
+
+    def load_and_replace(*args, **kwargs):
+        try:
+            return load(*args, **kwargs)
+        finally:
+            rewrite(path, content)
+
+    monkeypatch.setattr(diplom_server, "load_predict_model", load_and_replace)
+    return load
+
+
+def test_file_replaced_by_broken_one_during_reload(model_file, monkeypatch):
+    with open(model_file, "rb") as file:
+        content = file.read()
+    rewrite(model_file, content)
+    loaded_version = diplom_server.predict_cache.read_version()
+    load = replace_during_load(monkeypatch, model_file, content[:len(content) // 2])
+
+    asyncio.run(diplom_server.refresh_model())
+    assert diplom_server.predict_cache.model_version == loaded_version
+
+    monkeypatch.setattr(diplom_server, "load_predict_model", load)
+    model = diplom_server.xgb_model
+    asyncio.run(diplom_server.refresh_model())
+
+    assert diplom_server.xgb_model is model
+    assert diplom_server.predict_cache.failed_version == diplom_server.predict_cache.read_version()
+
+
+def test_good_file_written_during_failed_reload_is_loaded(model_file, monkeypatch):
+    with open(model_file, "rb") as file:
+        content = file.read()
+    rewrite(model_file, content[:len(content) // 2])
+    broken_version = diplom_server.predict_cache.read_version()
+    load = replace_during_load(monkeypatch, model_file, content)
+    model = diplom_server.xgb_model
+
+    asyncio.run(diplom_server.refresh_model())
+    assert diplom_server.xgb_model is model
+    assert diplom_server.predict_cache.failed_version == broken_version
+
+    monkeypatch.setattr(diplom_server, "load_predict_model", load)
+    asyncio.run(diplom_server.refresh_model())
+
+    assert diplom_server.xgb_model is not model
+    assert diplom_server.predict_cache.model_version == diplom_server.predict_cache.read_version()
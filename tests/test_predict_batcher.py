@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+
+from predict_batcher import PredictBatcher
+
+
+class Model:
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def predict(self, feature_values):
+        self.calls.append(feature_values.copy())
+        if self.error is not None:
+            raise self.error
+        return feature_values[:, 0] * 10
+
+
+def run_concurrently(batcher, requests):
+    async def main():
+        return await asyncio.gather(
+            *[batcher.predict(np.asarray(rows, dtype=np.float32)) for rows in requests], return_exceptions=True
+        )
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_model_call():
+    model = Model()
+    batcher = PredictBatcher(model.predict, window=0.05, max_batch_size=64)
+    requests = [[[i, 0.0]] * (i % 3 + 1) for i in range(10)]
+
+    results = run_concurrently(batcher, requests)
+
+    assert len(model.calls) == 1 and len(model.calls[0]) == sum(len(rows) for rows in requests)
+    assert [result.tolist() for result in results] == [[i * 10.0] * (i % 3 + 1) for i in range(10)]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["requests"] == 10
+    assert not batcher._tasks
+
+
+def test_full_batch_flushes_before_window():
+    model = Model()
+    batcher = PredictBatcher(model.predict, window=10, max_batch_size=4)
+
+    results = run_concurrently(batcher, [[[i, 0.0], [i, 1.0]] for i in range(4)])
+
+    assert [len(rows) for rows in model.calls] == [4, 4]
+    assert [result.tolist() for result in results] == [[i * 10.0] * 2 for i in range(4)]
+
+
+def test_model_error_reaches_every_waiter():
+    error = ValueError("broken model")
+    batcher = PredictBatcher(Model(error).predict, window=0.05)
+
+    results = run_concurrently(batcher, [[[i, 0.0]] for i in range(5)])
+
+    assert all(result is error for result in results)
@@ -0,0 +1,64 @@
+import pytest
+
+import diplom_server
+
+CITIES = {"Москва": (55.75, 37.61), "Казань": (55.79, 49.12)}
+
+
+class StubGeocoder:
+
+    def __init__(self):
+        self.calls = []
+
+    async def geocode(self, city):
+        self.calls.append(city)
+        return CITIES.get(city)
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    geocoder = StubGeocoder()
+    monkeypatch.setattr(diplom_server, "geocoder", geocoder)
+    return geocoder
+
+
+def item(city, rooms):
+    return {
+        "city": city, "houseType": 2, "objectType": 1, "totalAreaFrom": str(20 + rooms * 15), "totalAreaTo": "",
+        "kitchenAreaFrom": "", "kitchenAreaTo": "", "levelFrom": "", "levelTo": "", "levelsFrom": "",
+        "levelsTo": "", "numberOfRoomsFrom": str(rooms), "numberOfRoomsTo": str(rooms)
+    }
+
+
+def test_batch_keeps_input_order(api_client, geocoder):
+    data = [item("Москва", 1), item("Атлантида", 2), item("Казань", 3), item("Москва ", 4)]
+
+    response = api_client.post("/api/prediction/batch", json=data)
+
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch[1] == {"message": "Не правильно введен город"}
+    for i in (0, 2, 3):
+        assert batch[i] == api_client.post("/api/prediction", json=data[i]).json()
+    assert len({batch[i]["cost1"] for i in (0, 2, 3)}) == 3
+
+
+def test_invalid_items_get_their_own_errors(api_client, geocoder):
+    broken = item("Москва", 2)
+    del broken["houseType"]
+    data = ["Москва", {"rooms": 2}, {"city": 7}, broken, item("Казань", 2)]
+
+    batch = api_client.post("/api/prediction/batch", json=data).json()
+
+    assert batch[:3] == [{"message": "Не указан город"}] * 3
+    assert batch[3] == {"message": "Неверные параметры запроса"}
+    assert set(batch[4]) == {"cost1", "cost2"}
+    assert geocoder.calls == ["Москва", "Казань"]
+
+
+def test_batch_size_is_capped(api_client, geocoder):
+    response = api_client.post("/api/prediction/batch", json=[item("Москва", 2)] * 101)
+
+    assert response.status_code == 400
+    assert geocoder.calls == []
+    assert api_client.post("/api/prediction/batch", json=[]).json() == []
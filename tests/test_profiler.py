@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import Counter
+
+import httpx
+import pytest
+from sqlalchemy.pool import QueuePool
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import diplom_server
+import profiler
+from db_pool import MeasuredPool, pool_class_name
+from profiler import ProfileStore, RestProfiler, profile_token
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ProfileStore(os.path.join(tmp_path, "profiles"), max_profiles=3)
+    monkeypatch.setattr(profiler, "PROFILE_SECRET", SECRET)
+    monkeypatch.setattr(diplom_server, "profile_store", store)
+    return store
+
+
+def test_profiles_require_token(api_client, store):
+    profile_id = store.new_id()
+    store.save(profile_id, Counter({"handler (app.py:1)": 3}), {"id": profile_id, "path": "/api/users/a@b.ru"})
+    token = profile_token(SECRET)
+
+    assert api_client.get("/api/admin/profiles").status_code == 403
+    assert api_client.get(f"/api/admin/profiles/{profile_id}").status_code == 403
+    assert api_client.get("/api/admin/profiles", headers={"X-Profile": "1.forged"}).status_code == 403
+    assert api_client.get("/api/admin/profiles", headers={"X-Profile": profile_token("other")}).status_code == 403
+
+    listed = api_client.get("/api/admin/profiles", headers={"X-Profile": token})
+    assert listed.status_code == 200 and [profile["id"] for profile in listed.json()["profiles"]] == [profile_id]
+
+    downloaded = api_client.get(f"/api/admin/profiles/{profile_id}", params={"profile": token})
+    assert downloaded.status_code == 200 and downloaded.text == "handler (app.py:1) 3\n"
+
+
+def test_profile_is_saved_outside_event_loop_thread(store):
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return PlainTextResponse("ok")
+
+    app = RestProfiler(Starlette(routes=[Route("/slow", slow)]), secret=SECRET, store=store, interval=0.005)
+    save_threads = []
+    save = store.save
+    store.save = lambda *args: save_threads.append(threading.get_ident()) or save(*args)
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            profiled = await client.get("/slow", headers={"X-Profile": profile_token(SECRET)})
+            plain = await client.get("/slow")
+        return profiled, plain, threading.get_ident()
+
+    profiled, plain, loop_thread = asyncio.run(main())
+
+    assert "x-profile-id" in profiled.headers and "x-profile-id" not in plain.headers
+    assert save_threads and loop_thread not in save_threads
+    assert store.ids() == [profiled.headers["x-profile-id"]]
+    assert store.list()[0]["samples_waiting"] > 0
+
+
+def test_sampling_without_secret_stores_nothing(store, monkeypatch, caplog):
+    async def handler(request):
+        return PlainTextResponse("ok")
+
+    app = RestProfiler(Starlette(routes=[Route("/", handler)]), secret="", sample_rate=1.0, store=store)
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.get("/")
+
+    assert "x-profile-id" not in asyncio.run(main()).headers
+    assert store.ids() == []
+
+    monkeypatch.setattr(profiler, "PROFILE_SECRET", "")
+    monkeypatch.setattr(profiler, "PROFILE_SAMPLE_RATE", 0.5)
+    assert not profiler.profiling_enabled()
+    with caplog.at_level(logging.WARNING, logger="diplom_server"):
+        diplom_server.warn_sampling_without_secret()
+    assert [record.levelname for record in caplog.records if record.name == "diplom_server"] == ["WARNING"]
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/api/admin/db/pool"])
+def test_admin_stats_require_token(api_client, store, path):
+    assert api_client.get(path).status_code == 403
+    assert api_client.get(path, params={"profile": profile_token("other")}).status_code == 403
+
+    response = api_client.get(path, params={"profile": profile_token(SECRET)})
+    assert response.status_code == 200
+
+
+def test_pool_stats_name_sqlalchemy_pool_class(api_client, store):
+    stats = api_client.get("/api/admin/db/pool", headers={"X-Profile": profile_token(SECRET)}).json()
+    assert stats["primary"]["pool"] == stats["sync"]["pool"] == "NullPool"
+
+    class Mixin:
+        pass
+
+    reordered = type("Reordered", (Mixin, MeasuredPool, QueuePool), {})(creator=lambda: None)
+    assert pool_class_name(reordered) == "QueuePool"
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from debug_console import LoggingRest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# импорт приложения не запускает поток записи и не трогает корневой логгер, запуск и остановка — запускают и снимают
+LIFECYCLE_SCRIPT = """
+import json, logging, os, threading
+from fastapi.testclient import TestClient
+
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+
+import diplom_server
+from debug_console import rest_log
+
+def state():
+    return {
+        "running": rest_log.running,
+        "threads": sum(thread.name.endswith("(_monitor)") for thread in threading.enumerate()),
+        "captured": rest_log.handler in root.handlers,
+        "level": logging.getLevelName(root.level),
+        "file": os.path.exists(rest_log.path)
+    }
+
+states = [state()]
+with TestClient(diplom_server.app) as client:
+    client.get("/api/users/nobody@mail.ru")
+    states.append(state())
+states.append(state())
+print(json.dumps(states))
+"""
+
+
+def test_app_starts_and_stops_rest_log(tmp_path):
+    path = os.path.join(tmp_path, "nested", "rest.log")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp_path, 'estate.db')}", REST_LOG_PATH=path)
+    env.pop("ASYNC_DATABASE_URL", None)
+
+    result = subprocess.run(
+        [sys.executable, "-c", LIFECYCLE_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+
+    assert result.returncode == 0, result.stderr
+    imported, started, stopped = json.loads(result.stdout.strip().splitlines()[-1])
+    assert imported == {"running": False, "threads": 0, "captured": False, "level": "INFO", "file": False}
+    # файл пишет поток очереди, к моменту проверки строки в нем может еще не быть
+    started.pop("file")
+    assert started == {"running": True, "threads": 1, "captured": True, "level": "WARNING"}
+    assert stopped == {"running": False, "threads": 0, "captured": False, "level": "INFO", "file": True}
+    with open(path, encoding="utf-8") as file:
+        assert json.loads(file.readline())["route"] == "/api/users/{user_mail}"
+
+
+# записи до start() не теряются: они ждут в очереди и уходят в файл после запуска
+def test_records_before_start_are_written(tmp_path):
+    path = os.path.join(tmp_path, "rest.log")
+    log = LoggingRest(path=path, name="test.rest_log", capture_root=False)
+
+    log.emit({"link": "/early"})
+    assert not os.path.exists(path)
+
+    log.start()
+    log.start()
+    log.emit({"link": "/late"})
+    log.stop()
+    log.stop()
+
+    with open(path, encoding="utf-8") as file:
+        assert [json.loads(line)["link"] for line in file] == ["/early", "/late"]
+    assert logging.getLogger().handlers.count(log.handler) == 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from tree_model import TreeModel, load_predict_model
+
+MODEL_PATH = "xgb_model.json"
+
+
+@pytest.fixture(scope="module")
+def models():
+    return load_predict_model(MODEL_PATH, backend="xgboost"), TreeModel.load(MODEL_PATH)
+
+
+# значения вокруг порогов деревьев, чтобы строки расходились по разным веткам
+def random_rows(tree_model, count, missing, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.empty((count, tree_model.num_feature), dtype=np.float32)
+    for column in range(tree_model.num_feature):
+        thresholds = tree_model.threshold[(tree_model.feature == column) & np.isfinite(tree_model.threshold)]
+        if len(thresholds) == 0:
+            rows[:, column] = rng.normal(0, 10, count)
+            continue
+        spread = max(float(np.ptp(thresholds)), 1.0) * 0.05
+        rows[:, column] = rng.choice(thresholds, count) + rng.normal(0, spread, count)
+    rows[rng.random(rows.shape) < missing] = np.nan
+    return rows
+
+
+@pytest.mark.parametrize("missing", [0.0, 0.2])
+def test_numpy_backend_matches_xgboost(models, missing):
+    xgb_model, tree_model = models
+    rows = random_rows(tree_model, 5000, missing)
+
+    expected = xgb_model.predict(rows)
+    actual = tree_model.predict(rows)
+
+    assert actual.shape == expected.shape
+    assert np.allclose(actual, expected, rtol=1e-5, atol=1e-4)
+
+
+def test_single_row_and_infinity(models):
+    xgb_model, tree_model = models
+    row = random_rows(tree_model, 1, 0.0, seed=1)
+    row[0, 0] = np.inf
+
+    assert np.allclose(tree_model.predict(row[0]), xgb_model.predict(row), rtol=1e-5, atol=1e-4)
@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/estate/user", "/api/estate/user/cursor"])
+def test_unknown_user_is_404(api_client, path):
+    response = api_client.get(path, params={"mail": "nobody@mail.ru"})
+
+    assert response.status_code == 404
+    assert response.json() == {"message": "Пользователь не найден"}
+
+
+def test_known_user_listing(api_client):
+    response = api_client.get("/api/estate/user", params={"mail": "user0@mail.ru", "limit": 5})
+
+    items = response.json()["items"]
+    assert response.status_code == 200
+    assert items and all(estate["user_id"] == 1 for estate in items)
@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+
+PREDICT_BACKENDS = ("xgboost", "numpy")
+
+
+# деревья xgb_model.json, развернутые в плоские массивы numpy.
+# xgboost выделяет детей узла парой, поэтому правый ребенок всегда left + 1;
+# лист ссылается сам на себя с порогом +inf, так что за max_depth шагов
+# каждая строка доходит до листа в каждом дереве
+class TreeModel:
+
+    def __init__(self, roots, feature, threshold, left, default_left, value,
+                 max_depth, base_score, num_feature, feature_names=None):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.default_left = default_left
+        self.value = value
+        self.max_depth = max_depth
+        self.base_score = base_score
+        self.num_feature = num_feature
+        self.feature_names = feature_names
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as model_file:
+            learner = json.load(model_file)["learner"]
+
+        objective = learner["objective"]["name"]
+        if objective != "reg:squarederror":
+            raise ValueError(f"Unsupported objective: {objective}")
+
+        model_param = learner["learner_model_param"]
+        trees = learner["gradient_booster"]["model"]["trees"]
+
+        roots, feature, threshold, left, default_left, value = [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+
+            left_children = np.asarray(tree["left_children"], dtype=np.int32)
+            right_children = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = left_children == -1
+            if np.any(right_children[~is_leaf] != left_children[~is_leaf] + 1):
+                raise ValueError("Tree children are expected to be allocated in pairs")
+
+            split_conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+            threshold.append(np.where(is_leaf, np.inf, split_conditions))
+            left.append(np.where(is_leaf, np.arange(len(left_children)), left_children) + offset)
+            default_left.append(np.where(is_leaf, True, np.asarray(tree["default_left"], dtype=bool)))
+            value.append(np.where(is_leaf, split_conditions, 0.0))
+
+            max_depth = max(max_depth, cls._depth(left_children, right_children))
+            offset += len(left_children)
+
+        return cls(
+            roots=np.asarray(roots, dtype=np.intp),
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold).astype(np.float32),
+            left=np.concatenate(left).astype(np.intp),
+            default_left=np.concatenate(default_left),
+            value=np.concatenate(value).astype(np.float32),
+            max_depth=max_depth,
+            base_score=np.float32(model_param["base_score"]),
+            num_feature=int(model_param["num_feature"]),
+            feature_names=learner.get("feature_names") or None
+        )
+
+    def predict(self, feature_values):
+        feature_values = np.asarray(feature_values, dtype=np.float32).reshape(-1, self.num_feature)
+        # +inf не должен проходить мимо порога листа
+        flat = np.minimum(feature_values, np.finfo(np.float32).max).ravel()
+        has_missing = np.isnan(flat).any()
+
+        row_offsets = (np.arange(len(feature_values), dtype=np.intp) * self.num_feature)[:, None]
+        node = np.repeat(self.roots[None, :], len(feature_values), axis=0)
+
+        for _ in range(self.max_depth):
+            values = np.take(flat, row_offsets + np.take(self.feature, node))
+            go_left = values < np.take(self.threshold, node)
+            if has_missing:
+                go_left = np.where(np.isnan(values), np.take(self.default_left, node), go_left)
+            node = np.take(self.left, node) + ~go_left
+
+        return np.take(self.value, node).sum(axis=1, dtype=np.float32) + self.base_score
+
+    @staticmethod
+    def _depth(left_children, right_children):
+        depth = 0
+        level = [0]
+        while level:
+            children = [child for node in level for child in (left_children[node], right_children[node]) if child != -1]
+            if children:
+                depth += 1
+            level = children
+        return depth
+
+
+def load_predict_model(path, backend="xgboost"):
+    if backend == "numpy":
+        return TreeModel.load(path)
+
+    if backend == "xgboost":
+        from xgboost import XGBRegressor
+
+        model = XGBRegressor()
+        model.load_model(path)
+        return model
+
+    raise ValueError(f"Unknown predict backend: {backend}, expected one of {PREDICT_BACKENDS}")